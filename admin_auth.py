@@ -0,0 +1,46 @@
+import hmac
+import os
+
+import streamlit as st
+from dotenv import load_dotenv
+
+# Shared password for the admin pages; they stay disabled while it is unset
+load_dotenv()
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+
+
+def check_admin(page_name):
+    """Stop the page unless the admin password was entered in this session"""
+    if not ADMIN_PASSWORD:
+        st.error(f"The {page_name} page is disabled. Set ADMIN_PASSWORD in the server environment to enable it.")
+        st.stop()
+    if st.session_state.get("admin_ok"):
+        return
+    password = st.text_input("Admin password", type="password")
+    if not password:
+        st.stop()
+    if not hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
+        st.error("Wrong password")
+        st.stop()
+    st.session_state.admin_ok = True
+
+
+# Pages under admin_pages/, with the URL path each is served at
+ADMIN_PAGES = [
+    ("admin_pages/admin_performance.py", "Performance", "📈", "admin-performance"),
+    ("admin_pages/admin_memory.py", "Memory diagnostics", "🧠", "admin-memory"),
+]
+
+
+def navigation(main, title):
+    """Run the farmer page, adding the admin pages only for sessions that open the app with ?admin or signed in.
+
+    The admin pages run in the app's own server process, so memory
+    diagnostics see this app's sessions and memory. With a single page
+    Streamlit shows no navigation, so farmers never see a menu.
+    """
+    pages = [st.Page(main, title=title, default=True)]
+    if ADMIN_PASSWORD and ("admin" in st.query_params or st.session_state.get("admin_ok")):
+        pages += [st.Page(path, title=page_title, icon=icon, url_path=url_path)
+                  for path, page_title, icon, url_path in ADMIN_PAGES]
+    st.navigation(pages).run()
@@ -0,0 +1,99 @@
+import pandas as pd
+import streamlit as st
+
+import admin_auth
+import memory_diagnostics
+import session_store
+
+# Admin-only view of this server's memory: by subsystem, by session, and growth between snapshots
+
+
+def megabytes(nbytes):
+    return None if nbytes is None else round(nbytes / (1024 * 1024), 2)
+
+
+def main():
+    st.title("🧠 Memory diagnostics")
+    admin_auth.check_admin("memory diagnostics")
+
+    store = session_store.get_result_store()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("▶️ Start tracing", disabled=memory_diagnostics.tracemalloc.is_tracing()):
+            memory_diagnostics.start()
+    with col2:
+        label = st.text_input("Snapshot label", placeholder="e.g. after 100 requests", label_visibility="collapsed")
+    with col3:
+        if st.button("📸 Take snapshot"):
+            memory_diagnostics.take_snapshot(label or None)
+    with col4:
+        if st.button("⏹️ Stop tracing", disabled=not memory_diagnostics.tracemalloc.is_tracing()):
+            memory_diagnostics.stop()
+
+    report = memory_diagnostics.memory_report(store)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("RSS (MB)", megabytes(report["rss_bytes"]))
+    col2.metric("Traced (MB)", megabytes(report["traced_bytes"]) if report["tracing"] else "off")
+    col3.metric("Sessions", len(report["sessions"]))
+    col4.metric("Open temp files", len(report["temp_files"]["open"]))
+    if not report["tracing"]:
+        st.caption("Tracing is off. Allocations are only attributed from the moment tracing starts; "
+                   "set PYTHONTRACEMALLOC=12 when starting the server to trace from startup.")
+
+    snapshots = memory_diagnostics.snapshots()
+    if snapshots:
+        st.subheader("Memory by subsystem")
+        latest = snapshots[-1]
+        frame = pd.DataFrame(memory_diagnostics.by_subsystem(latest["snapshot"]))
+        frame["MB"] = frame.pop("bytes").map(megabytes)
+        st.caption(f"Snapshot '{latest['label']}': traced allocations grouped by the innermost app module on the stack")
+        st.dataframe(frame.head(25), hide_index=True, use_container_width=True)
+
+    if len(snapshots) > 1:
+        st.subheader("Growth between snapshots")
+        labels = [f"{i + 1}. {s['label']}" for i, s in enumerate(snapshots)]
+        col1, col2 = st.columns(2)
+        old = col1.selectbox("From", range(len(snapshots)), index=len(snapshots) - 2, format_func=labels.__getitem__)
+        new = col2.selectbox("To", range(len(snapshots)), index=len(snapshots) - 1, format_func=labels.__getitem__)
+        change = memory_diagnostics.diff(snapshots[old], snapshots[new])
+        st.write(f"In {change['seconds']:.0f} s: RSS {megabytes(change['rss_bytes']):+} MB, "
+                 f"traced {megabytes(change['traced_bytes']):+} MB")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**By subsystem**")
+            st.dataframe(pd.DataFrame(change["subsystems"]), hide_index=True, use_container_width=True)
+            st.markdown("**Object counts**")
+            st.dataframe(pd.DataFrame(change["objects"]), hide_index=True, use_container_width=True)
+        with col2:
+            st.markdown("**By source line**")
+            st.dataframe(pd.DataFrame(change["lines"]), hide_index=True, use_container_width=True)
+
+    st.subheader("Sessions")
+    if report["sessions"]:
+        st.dataframe(pd.DataFrame(report["sessions"]), hide_index=True, use_container_width=True)
+        st.caption("Rows without script runs are results still held for sessions Streamlit has already closed.")
+
+    st.subheader("Caches")
+    caches = pd.DataFrame(report["caches"])
+    caches["MB"] = caches.pop("bytes").map(megabytes)
+    st.dataframe(caches, hide_index=True, use_container_width=True)
+
+    st.subheader("Temp files")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Held open by this process**")
+        st.dataframe(pd.DataFrame(report["temp_files"]["open"], columns=["fd", "path", "bytes"]),
+                     hide_index=True, use_container_width=True)
+    with col2:
+        st.markdown("**Audio and temp files left in the temp folder**")
+        st.dataframe(pd.DataFrame(report["temp_files"]["left"], columns=["path", "bytes", "age_seconds"]),
+                     hide_index=True, use_container_width=True)
+
+    st.subheader("Live objects")
+    col1, col2 = st.columns(2)
+    col1.dataframe(pd.DataFrame(report["objects"], columns=["type", "count"]), hide_index=True, use_container_width=True)
+    col2.dataframe(pd.DataFrame(list(report["watched"].items()), columns=["watched type", "count"]),
+                   hide_index=True, use_container_width=True)
+
+
+main()
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import streamlit as st
+
+import admin_auth
+import telemetry_stats
+
+# Admin-only view of the telemetry log: latency, caches, tokens, errors and load, aggregated incrementally
+
+GROUPINGS = {
+    "Stage": ("stage",),
+    "Stage and language": ("stage", "language"),
+    "Stage and model / TTS engine": ("stage", "model"),
+    "Stage, language and model": ("stage", "language", "model"),
+}
+# Record kinds plotted in the hourly load chart
+LOAD_KINDS = ["api_request", "llm_call", "tts_full_track", "retrieval", "background_refresh", "cache", "fallback"]
+
+
+def main():
+    st.title("📈 Performance")
+    admin_auth.check_admin("performance")
+
+    st.button("🔄 Refresh")
+    stats = telemetry_stats.get_stats()
+    # Cheap when nothing was appended: only new bytes of the log are read
+    stats.refresh()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Records", f"{stats.records:,}")
+    col2.metric("Log read (MB)", round(stats.offset / (1024 * 1024), 1))
+    col3.metric("Last refresh (ms)", None if stats.last_refresh_ms is None else round(stats.last_refresh_ms, 1))
+    if stats.updated_at:
+        st.caption(f"{stats.log_path} · last new records read at {datetime.fromtimestamp(stats.updated_at):%d-%m-%Y %H:%M:%S}")
+    if not stats.records:
+        st.info("No telemetry recorded yet.")
+        return
+
+    st.subheader("Latency")
+    grouping = st.selectbox("Group by", list(GROUPINGS))
+    st.dataframe(stats.latency_percentiles(GROUPINGS[grouping]), hide_index=True, use_container_width=True)
+    st.caption(f"Percentiles from histograms with {telemetry_stats.BUCKET_GROWTH - 1:.0%} wide buckets, "
+               f"accurate to about ±{(telemetry_stats.BUCKET_GROWTH - 1) / 2:.1%}.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Cache hit rates")
+        st.dataframe(stats.cache_hit_rates(), hide_index=True, use_container_width=True)
+    with col2:
+        st.subheader("Tokens per request")
+        st.dataframe(stats.tokens_per_request(), hide_index=True, use_container_width=True)
+
+    st.subheader("Errors and fallbacks")
+    st.markdown("**Fallback card (\"Consult Local Expert\") and model timeouts**")
+    st.dataframe(stats.fallback_rates(), hide_index=True, use_container_width=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Errors by stage**")
+        st.dataframe(stats.error_rates(), hide_index=True, use_container_width=True)
+    with col2:
+        st.markdown("**Other events**")
+        st.dataframe(stats.event_counts(), hide_index=True, use_container_width=True)
+
+    st.subheader("Hourly load")
+    hours = st.slider("Hours", 6, 24 * 14, 48, step=6)
+    load = stats.hourly_load(LOAD_KINDS, hours)
+    if load.empty:
+        st.caption("No requests in this window.")
+    else:
+        st.bar_chart(load)
+
+
+main()
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+
+import knowledge_base
+
+ZONES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "agro_zones.json")
+
+with open(ZONES_PATH, encoding="utf-8") as f:
+    _data = json.load(f)
+
+ZONE_NAMES = {int(zone): name for zone, name in _data["zones"].items()}
+STATE_ZONES = _data["states"]
+DISTRICT_ZONES = _data["districts"]
+
+
+def district_of(location):
+    """District part of a free-text location, normalized the same way as the history store"""
+    return (location or "").split(",")[0].strip().lower()
+
+
+def zone_for(location):
+    """Agro-climatic zone number (1-15) for a location, or None if it cannot be placed.
+
+    The district is looked up first; districts whose name exists in more
+    than one state are told apart by the state in the location. Otherwise
+    the state's main zone is used.
+    """
+    state = knowledge_base.detect_state(location)
+    zone = DISTRICT_ZONES.get(district_of(location))
+    if isinstance(zone, dict):
+        zone = zone.get(state)
+    if zone is None and state:
+        zone = STATE_ZONES.get(state)
+    return zone
+
+
+def zone_name(zone):
+    return ZONE_NAMES.get(zone, "")
+
+
+if __name__ == "__main__":
+    # Look up zones: python agro_zones.py "Ludhiana, Punjab" "Hamirpur, Himachal Pradesh"
+    for location in sys.argv[1:] or ["Ludhiana, Punjab", "Cuttack, Odisha", "पटना, बिहार", "Unknown village"]:
+        zone = zone_for(location)
+        print(f"{location}: {zone} {zone_name(zone)}" if zone else f"{location}: no zone")
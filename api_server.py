@@ -0,0 +1,282 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
+
+import crop_core
+import history_store
+import model_router
+import prompts
+import refresh_jobs
+import scheduler
+import similar_requests
+import speech
+import telemetry
+
+# Run with any WSGI server, e.g. gunicorn -w 4 -b 0.0.0.0:8000 api_server:app,
+# or with the built-in pre-forking server: python api_server.py 8000 4
+MIN_GZIP_BYTES = 512
+MAX_BODY_BYTES = 64 * 1024
+# Longest free text /v1/audio will speak; a whole stored recommendation is read by request_key instead
+MAX_SPEECH_CHARS = int(os.getenv("CROP_API_MAX_SPEECH_CHARS", "1000"))
+# Same budget range the apps' form accepts
+MIN_BUDGET = 1000
+MAX_BUDGET = 10000000
+
+_model = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def get_model():
+    """Gemini model for this worker, set up on first use"""
+    global _model
+    if _model is None:
+        _model = crop_core.setup_model()
+    return _model
+
+
+def get_history():
+    """History store for this worker; the SQLite file is shared by all workers"""
+    return history_store.get_history_store()
+
+
+def _params(environ):
+    """Query string parameters merged with a JSON request body"""
+    params = {k: v[-1] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+    if environ.get("REQUEST_METHOD") == "POST":
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError("413 Payload Too Large", "Request body too large")
+        if length:
+            try:
+                body = json.loads(environ["wsgi.input"].read(length))
+            except ValueError:
+                raise HTTPError("400 Bad Request", "Body must be JSON")
+            if not isinstance(body, dict):
+                raise HTTPError("400 Bad Request", "Body must be a JSON object")
+            params.update(body)
+    return params
+
+
+def _language(params):
+    language = params.get("language", "en")
+    if language not in crop_core.LANGUAGES:
+        raise HTTPError("400 Bad Request", f"Unsupported language '{language}'")
+    return language
+
+
+def _request_inputs(params, language):
+    """Form inputs in the same shape the Streamlit apps pass them"""
+    config = crop_core.LANGUAGES[language]
+    location = str(params.get("location", "")).strip()
+    if not location:
+        raise HTTPError("400 Bad Request", "location is required")
+    month = str(params.get("month", time.strftime("%m")))
+    if month.isdigit() and 1 <= int(month) <= 12:
+        month = config["months"][int(month) - 1]
+    elif month not in config["months"]:
+        raise HTTPError("400 Bad Request", "month must be 1-12 or a month name in the chosen language")
+    try:
+        budget = int(params.get("budget", 50000))
+    except (TypeError, ValueError):
+        raise HTTPError("400 Bad Request", "budget must be a number")
+    if not MIN_BUDGET <= budget <= MAX_BUDGET:
+        raise HTTPError("400 Bad Request", f"budget must be between {MIN_BUDGET} and {MAX_BUDGET}")
+    experience = params.get("experience", config["experience_levels"][0])
+    if experience not in config["experience_levels"]:
+        raise HTTPError("400 Bad Request", f"experience must be one of: {', '.join(config['experience_levels'])}")
+    farm_size = params.get("farm_size", config["farm_sizes"][0])
+    if farm_size not in config["farm_sizes"]:
+        raise HTTPError("400 Bad Request", f"farm_size must be one of: {', '.join(config['farm_sizes'])}")
+    organic = str(params.get("organic", "false")).lower() in ("1", "true", "yes")
+    return {
+        "month": month,
+        "location": location,
+        "budget": budget,
+        "experience": experience,
+        "farm_size": farm_size,
+        "organic": organic,
+    }
+
+
+def recommendations_endpoint(params):
+    """Recommendations for the given inputs, served from history when possible"""
+    language = _language(params)
+    inputs = _request_inputs(params, language)
+    farmer_id = params.get("farmer_id")
+    history = get_history()
+    key = history_store.request_key(language, inputs["location"], inputs["month"], inputs["budget"],
+                                    inputs["experience"], inputs["farm_size"], inputs["organic"])
+
+    def generate():
+        model = get_model()
+        if not model:
+            return None
+        return crop_core.generate_recommendations(model, language, **inputs)
+
+    def store_result(result):
+        if crop_core.is_complete(result):
+            history.append(result, language, farmer_id=farmer_id, **inputs)
+
+    row = history.latest_for_request(key)
+    shared_from = None
+    if row is None:
+        row = similar_requests.find_similar(history, language, **inputs)
+        shared_from = row and {"district": row["district"], "budget": row["budget"]}
+    if row is not None:
+        stale = refresh_jobs.is_stale(time.time() - row["created_at"])
+        if stale:
+            refresh_jobs.schedule_refresh(key, generate, store_result)
+        result, generated_at = row["result"], row["created_at"]
+    else:
+        stale = False
+        result = generate()
+        if result is None:
+            raise HTTPError("503 Service Unavailable", "Recommendation model is unavailable")
+        store_result(result)
+        generated_at = time.time()
+
+    body = {
+        "request_key": key,
+        "language": language,
+        "prompt_version": prompts.version(language),
+        "generated_at": round(generated_at, 3),
+        "stale": stale,
+        "shared_from": shared_from,
+        "recommendations": result,
+    }
+    # Weak validator over the advice itself, so a refetch of an unchanged answer is a 304
+    etag = f'W/"{crop_core.result_key(result)[0][:20]}"'
+    return body, "application/json", [("Age", str(int(time.time() - generated_at))), ("ETag", etag)]
+
+
+def localization_endpoint(params):
+    """Month names, form options and field labels for a language"""
+    return crop_core.localization(_language(params)), "application/json", []
+
+
+def audio_endpoint(params):
+    """Spoken recommendation for a stored request key, or for arbitrary text"""
+    language = _language(params)
+    text = str(params.get("text") or "")
+    if len(text) > MAX_SPEECH_CHARS:
+        raise HTTPError("413 Payload Too Large", f"text must be at most {MAX_SPEECH_CHARS} characters")
+    if not text:
+        row = get_history().latest_for_request(params.get("request_key", ""))
+        if row is None:
+            raise HTTPError("404 Not Found", "Pass text or a known request_key")
+        result = row["result"]
+        if "crop" in params:
+            crops = result["recommendations"]
+            try:
+                index = int(params["crop"])
+            except (TypeError, ValueError):
+                index = -1
+            # A negative index would quietly speak a crop counted from the end
+            if not 0 <= index < len(crops):
+                raise HTTPError("400 Bad Request", f"crop must be a recommendation index from 0 to {len(crops) - 1}")
+            text = crop_core.crop_speech_text(language, crops[index])
+        else:
+            text = crop_core.speech_text(language, result)
+    job = speech.prepare(text, language)
+    audio = job.full_track()
+    if audio is None:
+        raise HTTPError("503 Service Unavailable", f"No speech engine available for '{language}'")
+    return audio, job.audio_format, []
+
+
+def health_endpoint(params):
+    return {"status": "ok"}, "application/json", []
+
+
+def metrics_endpoint(params):
+    """Scheduler queues per class and the router's moving averages per model"""
+    return {"scheduler": scheduler.get_scheduler().metrics(), "models": model_router.get_metrics()}, "application/json", []
+
+
+ROUTES = {
+    "/health": health_endpoint,
+    "/metrics": metrics_endpoint,
+    "/v1/recommendations": recommendations_endpoint,
+    "/v1/localization": localization_endpoint,
+    "/v1/audio": audio_endpoint,
+}
+
+
+def _respond(environ, start_response, status, body, content_type, extra_headers):
+    """Send a response with a validator ETag and gzip compression where it helps"""
+    if content_type == "application/json":
+        body = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    extra_headers = dict(extra_headers)
+    etag = extra_headers.pop("ETag", None) or f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+    headers = [("ETag", etag), ("Cache-Control", "no-cache"), ("Vary", "Accept-Encoding")] + list(extra_headers.items())
+
+    # Clients revalidate cached answers with If-None-Match and get an empty 304
+    if status.startswith("200") and etag in environ.get("HTTP_IF_NONE_MATCH", ""):
+        start_response("304 Not Modified", headers)
+        return [b""]
+
+    if (content_type.startswith("application/json") and len(body) >= MIN_GZIP_BYTES
+            and "gzip" in environ.get("HTTP_ACCEPT_ENCODING", "")):
+        body = gzip.compress(body, compresslevel=6)
+        headers.append(("Content-Encoding", "gzip"))
+    headers += [("Content-Type", content_type), ("Content-Length", str(len(body)))]
+    start_response(status, headers)
+    return [body]
+
+
+def app(environ, start_response):
+    """WSGI entry point"""
+    start = time.perf_counter()
+    path = environ.get("PATH_INFO", "/")
+    status = "200 OK"
+    try:
+        handler = ROUTES.get(path)
+        if handler is None:
+            raise HTTPError("404 Not Found", f"No route for {path}")
+        if environ.get("REQUEST_METHOD") not in ("GET", "POST"):
+            raise HTTPError("405 Method Not Allowed", "Use GET or POST")
+        body, content_type, extra_headers = handler(_params(environ))
+    except HTTPError as e:
+        status, body, content_type, extra_headers = e.status, {"error": e.message}, "application/json", []
+    except scheduler.QueueFull as e:
+        # Come back later rather than wait behind a backlog the workers cannot clear in time
+        status, body, content_type, extra_headers = ("503 Service Unavailable", {"error": str(e)}, "application/json",
+                                                     [("Retry-After", "30")])
+    except Exception:
+        # The details go to the server log; clients only learn that the request failed
+        traceback.print_exc()
+        status, body, content_type, extra_headers = "500 Internal Server Error", {"error": "Internal server error"}, "application/json", []
+    response = _respond(environ, start_response, status, body, content_type, extra_headers)
+    telemetry.record("stage", stage="api_request", path=path, status=int(status[:3]),
+                     duration_ms=round((time.perf_counter() - start) * 1000, 2), error=status[0] == "5")
+    return response
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    server = make_server("0.0.0.0", port, app, server_class=ThreadingWSGIServer)
+    # Pre-fork: every worker process accepts on the same listening socket
+    for _ in range(workers - 1):
+        if os.fork() == 0:
+            break
+    print(f"Worker {os.getpid()} serving on port {port}")
+    server.serve_forever()
@@ -0,0 +1,112 @@
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+import crop_core
+
+# Land is split in steps of 1/GRID_STEPS; 20 steps of 5% give 53,130 splits for five crops
+GRID_STEPS = 20
+# Acres assumed for each farm size option, in the order of crop_core's farm_sizes
+DEFAULT_ACRES = (2.5, 10.0, 50.0)
+DEFAULT_MAX_SHARE = 0.6
+# Worst-case loss (share of the budget) accepted unless the farmer changes it
+DEFAULT_MAX_LOSS_SHARE = 0.1
+SOLVE_CACHE_SIZE = 512
+# Splits grow as steps^crops (230,230 rows for six crops, 888,030 for eight), so only the most profitable are planned
+MAX_CROPS = 5
+
+
+def default_acres(language, farm_size):
+    """Planning area for a farm size option"""
+    sizes = crop_core.LANGUAGES[language]["farm_sizes"]
+    return DEFAULT_ACRES[sizes.index(farm_size)] if farm_size in sizes else DEFAULT_ACRES[0]
+
+
+@lru_cache(maxsize=8)
+def _splits(crops, steps=GRID_STEPS):
+    """Every split of the land into `crops` shares on the grid, leaving the rest fallow (rows sum to <= 1)"""
+    units = np.arange(steps + 1)[:, None]
+    for _ in range(crops - 1):
+        # Extend each partial split by every amount that still fits
+        counts = steps - units.sum(axis=1) + 1
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        units = np.column_stack([np.repeat(units, counts, axis=0), np.arange(counts.sum()) - starts])
+    return units / steps
+
+
+# Each entry holds five arrays over every split (about 4 MB for five crops); a session re-solves one crop set
+@lru_cache(maxsize=4)
+def _prepared(costs, profits, downsides, steps=GRID_STEPS):
+    """Per-split totals for one acre of land, computed once per crop set and reused by every re-solve"""
+    shares = _splits(len(costs), steps)
+    return shares, shares @ np.array(costs), shares @ np.array(profits), shares @ np.array(downsides), shares.max(axis=1)
+
+
+@lru_cache(maxsize=SOLVE_CACHE_SIZE)
+def _solve(costs, profits, downsides, budget, acres, max_share, max_loss):
+    shares, cost, profit, downside, largest = _prepared(costs, profits, downsides)
+    # Constraints scale linearly with the area, so only the limits change when a slider moves
+    feasible = ((cost * acres <= budget) & (largest <= max_share + 1e-9) & (downside * acres >= -max_loss))
+    if not feasible.any():
+        return None
+    best = np.flatnonzero(feasible)[np.argmax(profit[feasible])]
+    return tuple(shares[best] * acres)
+
+
+def optimize(risk, budget, acres, max_share=DEFAULT_MAX_SHARE, max_loss=None):
+    """Acres per crop that maximise expected profit, or None if no split satisfies the limits.
+
+    `risk` is roi_simulation.simulate()'s result. Each split must fit the
+    budget and the land, give no crop more than max_share of the land,
+    and keep the worst case (sum of each crop's 5th-percentile profit,
+    which assumes bad years coincide) above -max_loss rupees. Leaving
+    land unplanted is allowed, so the optimizer never forces a loss.
+    """
+    # Crops beyond the MAX_CROPS most profitable per acre get no land; the rest keep their card order
+    top = sorted(risk, key=lambda n: risk[n]["mean_profit_per_acre"], reverse=True)[:MAX_CROPS]
+    names = [n for n in risk if n in top]
+    if not names:
+        return None
+    if max_loss is None:
+        max_loss = DEFAULT_MAX_LOSS_SHARE * budget
+    costs = tuple(risk[n]["cost_per_acre"] for n in names)
+    profits = tuple(risk[n]["mean_profit_per_acre"] for n in names)
+    downsides = tuple(risk[n]["p5_profit_per_acre"] for n in names)
+    allocation = _solve(costs, profits, downsides, float(budget), float(acres), float(max_share), float(max_loss))
+    if allocation is None:
+        return None
+    crops = [{"crop": name, "acres": round(a, 2), "share": a / acres, "investment": round(a * c),
+              "expected_profit": round(a * p), "worst_case": round(a * d)}
+             for name, a, c, p, d in zip(names, allocation, costs, profits, downsides) if a > 0]
+    return {
+        "crops": crops,
+        "acres": round(sum(c["acres"] for c in crops), 2),
+        "investment": sum(c["investment"] for c in crops),
+        "expected_profit": sum(c["expected_profit"] for c in crops),
+        "worst_case": sum(c["worst_case"] for c in crops),
+    }
+
+
+if __name__ == "__main__":
+    # Solve times, first solve and slider re-solves: python budget_optimizer.py [crops]
+    crops = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_CROPS
+    rng = np.random.default_rng(0)
+    risk = {f"crop-{i}": {"cost_per_acre": int(rng.uniform(15000, 80000)),
+                          "mean_profit_per_acre": int(rng.uniform(2000, 40000)),
+                          "p5_profit_per_acre": int(rng.uniform(-30000, 5000))} for i in range(crops)}
+    start = time.perf_counter()
+    plan = optimize(risk, 300000, 10)
+    print(f"first solve ({crops} crops, {len(_splits(min(crops, MAX_CROPS))):,} splits): {(time.perf_counter() - start) * 1000:.1f} ms")
+    timings = []
+    for max_share in np.linspace(0.3, 1.0, 50):
+        start = time.perf_counter()
+        optimize(risk, 300000, 10, max_share=max_share, max_loss=rng.uniform(10000, 60000))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"slider re-solve: p50 {timings[25]:.2f} ms, max {timings[-1]:.2f} ms")
+    for crop in plan["crops"]:
+        print(f"{crop['crop']}: {crop['acres']} acres, ₹{crop['investment']:,} -> ₹{crop['expected_profit']:,} expected")
+    print(f"total ₹{plan['investment']:,} on {plan['acres']} acres, expected ₹{plan['expected_profit']:,}, "
+          f"worst case ₹{plan['worst_case']:,}")
@@ -0,0 +1,459 @@
+import atexit
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import telemetry
+
+# Bump to invalidate every cached entry after a change to what is stored
+CACHE_VERSION = 1
+COMPRESS_MIN_BYTES = 256
+MAX_VALUE_BYTES = int(os.getenv("CROP_CACHE_MAX_VALUE_BYTES", str(4 * 1024 * 1024)))
+MAX_TOTAL_BYTES = int(os.getenv("CROP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SQLITE_PATH = os.getenv("CROP_CACHE_DB", os.path.join(telemetry.RUNTIME_DIR, "cache.db"))
+# Lookups are logged as one record per namespace and outcome this often, not one per call
+LOOKUP_TELEMETRY_SECONDS = float(os.getenv("CROP_CACHE_TELEMETRY_SECONDS", "10"))
+# After a Redis error, requests use a local cache for this long instead of waiting on the socket timeout again
+REDIS_COOLDOWN_SECONDS = float(os.getenv("CROP_CACHE_REDIS_COOLDOWN_SECONDS", "30"))
+REDIS_FALLBACK_MAX_BYTES = int(os.getenv("CROP_CACHE_REDIS_FALLBACK_BYTES", str(32 * 1024 * 1024)))
+
+_RAW = b"r"
+_ZLIB = b"z"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def versioned_key(namespace, key):
+    """Backend key for a logical key, e.g. crop:v1:audio:<sha1>"""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return f"crop:v{CACHE_VERSION}:{namespace}:{digest}"
+
+
+def encode(value):
+    """Compress values large enough to benefit; one header byte marks the format"""
+    if len(value) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(value, 6)
+        if len(packed) < len(value):
+            return _ZLIB + packed
+    return _RAW + value
+
+
+def decode(blob):
+    return zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+
+
+class CacheBackend:
+    """Byte cache shared by the recommendation and audio paths.
+
+    Subclasses implement _get, _set and _delete on already-versioned keys and
+    encoded values. A failing backend behaves like an empty cache.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "rejected": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._lookups = {}
+        self._lookups_since = time.monotonic()
+        atexit.register(self.flush_telemetry)
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def get(self, namespace, key):
+        """Cached bytes for a key, or None"""
+        try:
+            blob = self._get(versioned_key(namespace, key))
+        except Exception as e:
+            self._error("get", e)
+            blob = None
+        outcome = "miss" if blob is None else "hit"
+        now = time.monotonic()
+        with self._stats_lock:
+            self.stats["misses" if blob is None else "hits"] += 1
+            self._lookups[namespace, outcome] = self._lookups.get((namespace, outcome), 0) + 1
+            due = now - self._lookups_since >= LOOKUP_TELEMETRY_SECONDS
+        if due:
+            self.flush_telemetry()
+        return None if blob is None else decode(blob)
+
+    def flush_telemetry(self):
+        """Log the lookups counted since the last flush, one record per namespace and outcome"""
+        with self._stats_lock:
+            lookups, self._lookups = self._lookups, {}
+            self._lookups_since = time.monotonic()
+        for (namespace, outcome), count in lookups.items():
+            telemetry.record("cache", layer=self.name, namespace=namespace, outcome=outcome, count=count)
+
+    def set(self, namespace, key, value, ttl=None):
+        """Store bytes for ttl seconds (forever if None); oversized values are skipped"""
+        blob = encode(value)
+        if len(blob) > MAX_VALUE_BYTES:
+            self._count("rejected")
+            telemetry.record("cache_rejected", layer=self.name, namespace=namespace, nbytes=len(blob))
+            return False
+        try:
+            self._set(versioned_key(namespace, key), blob, ttl)
+        except Exception as e:
+            self._error("set", e)
+            return False
+        self._count("sets")
+        return True
+
+    def delete(self, namespace, key):
+        try:
+            self._delete(versioned_key(namespace, key))
+        except Exception as e:
+            self._error("delete", e)
+
+    def get_json(self, namespace, key):
+        value = self.get(namespace, key)
+        return None if value is None else json.loads(value)
+
+    def set_json(self, namespace, key, value, ttl=None):
+        return self.set(namespace, key, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+
+    def _error(self, operation, error):
+        self._count("errors")
+        telemetry.record("cache_error", layer=self.name, operation=operation, error=str(error))
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, blob, ttl):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU bounded by total stored bytes"""
+    name = "memory"
+
+    def __init__(self, max_bytes=MAX_TOTAL_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            blob, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def _set(self, key, blob, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (blob, time.time() + ttl if ttl else None)
+            self.nbytes += len(blob)
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def _pop(self, key):
+        blob, _ = self._entries.pop(key)
+        self.nbytes -= len(blob)
+
+
+class SQLiteBackend(CacheBackend):
+    """On-disk cache shared by every process on one host.
+
+    Least recently used entries are deleted once the file holds more than
+    max_bytes of values.
+    """
+    name = "sqlite"
+    PRUNE_EVERY = 50
+    # Seconds before a hit records a newer access time for the entry
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path=SQLITE_PATH, max_bytes=MAX_TOTAL_BYTES):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] < now:
+            with conn:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        # LRU order only needs to be roughly right, and a write per hit would serialize readers on the WAL lock
+        if now - row[2] > self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key, blob, ttl):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl if ttl else None, now)
+            )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def _delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self):
+        """Drop expired entries, then the least recently used until under max_bytes"""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Keep the most recently used entries that fit in max_bytes
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                    "(ORDER BY accessed_at DESC) AS running FROM cache) WHERE running > ?)",
+                    (self.max_bytes,)
+                )
+
+
+class RedisBackend(CacheBackend):
+    """Minimal Redis (RESP2) client over a plain socket; one connection per thread.
+
+    Size the server with maxmemory and an LRU policy; this client only caps
+    single values. After a failed command the backend serves from a small
+    per-process MemoryBackend for REDIS_COOLDOWN_SECONDS, then tries Redis
+    again.
+    """
+    name = "redis"
+
+    def __init__(self, url="redis://localhost:6379/0", timeout=2.0, fallback=None):
+        super().__init__()
+        self.stats["fallbacks"] = 0
+        self.fallback = fallback if fallback is not None else MemoryBackend(max_bytes=REDIS_FALLBACK_MAX_BYTES)
+        self._down_until = 0.0
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = self._local.conn = (sock, sock.makefile("rb"))
+            if self.password:
+                self._command("AUTH", self.password)
+            if self.db:
+                self._command("SELECT", str(self.db))
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts += [f"${len(data)}\r\n".encode(), data, b"\r\n"]
+        try:
+            sock.sendall(b"".join(parts))
+            return self._reply(reader)
+        except (OSError, ConnectionError):
+            # Drop the broken connection; the next command reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def _reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [self._reply(reader) for _ in range(int(rest))]
+        raise ConnectionError(f"Unexpected Redis reply {line!r}")
+
+    def _call(self, operation, *args):
+        """Run a cache operation on Redis, or on the local fallback while Redis is cooling down"""
+        if time.monotonic() < self._down_until:
+            self._count("fallbacks")
+            return getattr(self.fallback, operation)(*args)
+        try:
+            return getattr(self, f"_redis{operation}")(*args)
+        except Exception:
+            self._down_until = time.monotonic() + REDIS_COOLDOWN_SECONDS
+            raise
+
+    def _get(self, key):
+        return self._call("_get", key)
+
+    def _set(self, key, blob, ttl):
+        self._call("_set", key, blob, ttl)
+
+    def _delete(self, key):
+        self._call("_delete", key)
+
+    def _redis_get(self, key):
+        return self._command("GET", key)
+
+    def _redis_set(self, key, blob, ttl):
+        if ttl:
+            self._command("SET", key, blob, "EX", int(ttl))
+        else:
+            self._command("SET", key, blob)
+
+    def _redis_delete(self, key):
+        self._command("DEL", key)
+
+
+def make_backend(kind=None):
+    """Backend from CROP_CACHE_BACKEND (memory, sqlite or redis) and CROP_CACHE_URL"""
+    kind = kind or os.getenv("CROP_CACHE_BACKEND", "sqlite")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        return RedisBackend(os.getenv("CROP_CACHE_URL", "redis://localhost:6379/0"))
+    if kind == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown cache backend '{kind}'")
+
+
+def get_cache():
+    """Process-wide cache backend, created on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = make_backend()
+    return _cache
+
+
+def set_cache(backend):
+    """Replace the process-wide backend, e.g. with a MemoryBackend in benchmarks"""
+    global _cache
+    with _cache_lock:
+        _cache = backend
+
+
+def _serve_resp_standin(server_socket, store):
+    """Tiny in-process stand-in for a Redis server, enough for GET/SET/DEL"""
+    def handle(conn):
+        reader = conn.makefile("rb")
+        while True:
+            header = reader.readline()
+            if not header:
+                return
+            args = []
+            for _ in range(int(header[1:-2])):
+                length = int(reader.readline()[1:-2])
+                args.append(reader.read(length + 2)[:-2])
+            command = args[0].upper()
+            if command == b"GET":
+                value = store.get(args[1])
+                conn.sendall(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"SET":
+                store[args[1]] = args[2]
+                conn.sendall(b"+OK\r\n")
+            elif command == b"DEL":
+                conn.sendall(b":%d\r\n" % int(store.pop(args[1], None) is not None))
+            else:
+                conn.sendall(b"-ERR unknown command\r\n")
+
+    while True:
+        conn, _ = server_socket.accept()
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    # Round-trip every backend; redis runs against CROP_CACHE_URL or a local stand-in: python cache_backends.py
+    import tempfile
+
+    url = os.getenv("CROP_CACHE_URL")
+    if not url:
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        threading.Thread(target=_serve_resp_standin, args=(listener, {}), daemon=True).start()
+        url = f"redis://127.0.0.1:{listener.getsockname()[1]}/0"
+
+    payload = {"recommendations": [{"crop_name": "Wheat", "considerations": ["Irrigate at crown root stage"] * 20}]}
+    audio = os.urandom(64 * 1024)
+    for backend in (MemoryBackend(), SQLiteBackend(os.path.join(tempfile.mkdtemp(), "cache.db")), RedisBackend(url)):
+        assert backend.get_json("recommendation", "missing") is None
+        backend.set_json("recommendation", "ludhiana|11", payload, ttl=60)
+        assert backend.get_json("recommendation", "ludhiana|11") == payload
+        backend.set("audio", "hi|namaste", audio)
+        assert backend.get("audio", "hi|namaste") == audio
+        backend.delete("audio", "hi|namaste")
+        assert backend.get("audio", "hi|namaste") is None
+        assert not backend.set("audio", "too-big", os.urandom(MAX_VALUE_BYTES + 1))
+
+        start = time.perf_counter()
+        for i in range(1000):
+            backend.get_json("recommendation", "ludhiana|11")
+        per_get = (time.perf_counter() - start) * 1000 / 1000
+        print(f"{backend.name:>7}: ok, {per_get:.3f} ms per get, stats {backend.stats}")
+    # Nothing listens here: the first call pays the timeout, the rest go to the local fallback
+    unreachable = RedisBackend("redis://127.0.0.1:9/0", timeout=0.5)
+    start = time.perf_counter()
+    for i in range(100):
+        unreachable.set("audio", f"key-{i}", audio)
+        assert unreachable.get("audio", f"key-{i}") == (audio if i else None)
+    print(f"redis down: 100 set+get in {(time.perf_counter() - start) * 1000:.1f} ms, stats {unreachable.stats}")
+    json_size = len(json.dumps(payload).encode())
+    print(f"compression: {json_size} bytes of JSON stored as {len(encode(json.dumps(payload).encode()))}")
@@ -0,0 +1,315 @@
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import telemetry
+
+# Record production model and TTS traffic, or replay it offline: CROP_CASSETTE_MODE=record|replay
+MODE = os.getenv("CROP_CASSETTE_MODE", "")
+CASSETTE_PATH = os.getenv("CROP_CASSETTE", os.path.join(telemetry.RUNTIME_DIR, "cassettes", "default.cassette"))
+# Multiplies recorded latencies on replay; 0 replays as fast as possible
+LATENCY_SCALE = float(os.getenv("CROP_CASSETTE_LATENCY_SCALE", "1.0"))
+# Raise on a prompt or text that was never recorded; CROP_CASSETTE_STRICT=0 serves a recorded one in its place,
+# tagged as a substitute and logged as a cassette_miss
+STRICT = os.getenv("CROP_CASSETTE_STRICT", "1") != "0"
+REPLAY_MODEL_NAME = "cassette"
+# Records compressed together per gzip member; prompts share most of their text, so batching them compresses far better
+FLUSH_RECORDS = int(os.getenv("CROP_CASSETTE_FLUSH_RECORDS", "16"))
+FLUSH_BYTES = 1024 * 1024
+
+_FRAME_HEADER = struct.Struct(">II")
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def content_key(contents):
+    """Stable hash of a prompt string or a multi-turn contents list"""
+    canonical = contents if isinstance(contents, str) else json.dumps(contents, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _frame(header, payload):
+    meta = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return _FRAME_HEADER.pack(len(meta), len(payload)) + meta + payload
+
+
+class Cassette:
+    """Append-only file of recorded model answers and TTS audio.
+
+    Records are frames of a JSON header and a binary payload, buffered and
+    written FLUSH_RECORDS at a time as one gzip member (and at exit).
+    Members can be appended by several processes and the file still reads
+    as one gzip stream. A prompt is stored once, however many answers were
+    recorded for it.
+    """
+
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._prompts_written = set()
+        self._loaded = False
+        self.prompts = {}
+        self.answers = {}
+        self.audio = {}
+        self._replays = {}
+        self._pending = []
+        self._pending_bytes = 0
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+    def _append(self, header, payload):
+        frame = _frame(header, payload)
+        with self._lock:
+            self._pending.append(frame)
+            self._pending_bytes += len(frame)
+            self.stats["recorded"] += 1
+            if len(self._pending) >= FLUSH_RECORDS or self._pending_bytes >= FLUSH_BYTES:
+                self._flush()
+
+    def flush(self):
+        """Write buffered records to the file"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        # One write per complete gzip member keeps concurrent appends from interleaving
+        blob = gzip.compress(b"".join(self._pending), compresslevel=6)
+        self._pending, self._pending_bytes = [], 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(blob)
+
+    def record_answer(self, contents, text, latency_ms, model_name, finish_reason=None, input_tokens=None,
+                      output_tokens=None):
+        key = content_key(contents)
+        if key not in self._prompts_written:
+            prompt = contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False)
+            self._append({"kind": "prompt", "key": key}, prompt.encode("utf-8"))
+            self._prompts_written.add(key)
+        self._append({"kind": "answer", "key": key, "model": model_name, "latency_ms": round(latency_ms, 1),
+                      "finish_reason": finish_reason, "input_tokens": input_tokens, "output_tokens": output_tokens,
+                      "ts": round(time.time(), 3)}, text.encode("utf-8"))
+
+    def record_audio(self, engine, text, lang, audio, latency_ms):
+        self._append({"kind": "audio", "key": content_key(f"{lang}|{text}"), "lang": lang, "engine": engine.name,
+                      "format": engine.audio_format, "latency_ms": round(latency_ms, 1),
+                      "ts": round(time.time(), 3)}, audio)
+
+    def load(self):
+        """Read every record; answers and audio are kept in recording order per key"""
+        with self._lock:
+            if self._loaded:
+                return self
+            try:
+                with gzip.open(self.path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Nothing recorded yet: every lookup is a miss
+                data = b""
+            offset = 0
+            while offset < len(data):
+                meta_len, payload_len = _FRAME_HEADER.unpack_from(data, offset)
+                offset += _FRAME_HEADER.size
+                header = json.loads(data[offset:offset + meta_len])
+                payload = data[offset + meta_len:offset + meta_len + payload_len]
+                offset += meta_len + payload_len
+                if header["kind"] == "prompt":
+                    self.prompts[header["key"]] = payload.decode("utf-8")
+                elif header["kind"] == "answer":
+                    self.answers.setdefault(header["key"], []).append((header, payload.decode("utf-8")))
+                elif header["kind"] == "audio":
+                    self.audio.setdefault(header["key"], []).append((header, payload))
+            self._loaded = True
+        return self
+
+    def _pick(self, kind, key, entries, candidates, strict=None):
+        """Recorded entry for a key, cycling through repeats; on a miss, a deterministic stand-in unless strict"""
+        strict = STRICT if strict is None else strict
+        substitute = entries is None
+        with self._lock:
+            if substitute:
+                self.stats["misses"] += 1
+                if not strict and candidates:
+                    entries = candidates[int(key[:8], 16) % len(candidates)]
+            else:
+                self.stats["replayed"] += 1
+            count = self._replays.get(key, 0)
+            self._replays[key] = count + 1
+        if substitute:
+            telemetry.record("cassette_miss", kind=kind, key=key, substituted=entries is not None)
+            if entries is None:
+                raise CassetteMiss(key)
+            header, payload = entries[count % len(entries)]
+            # The stand-in was recorded for other input, so whoever replays it can tell
+            return dict(header, substitute=True), payload
+        return entries[count % len(entries)]
+
+    def answer(self, contents, strict=None):
+        self.load()
+        key = content_key(contents)
+        return self._pick("answer", key, self.answers.get(key), list(self.answers.values()), strict)
+
+    def audio_formats(self, lang):
+        self.load()
+        return {header["format"] for entries in self.audio.values() for header, _ in entries if header["lang"] == lang}
+
+    def audio_for(self, text, lang, audio_format, strict=None):
+        self.load()
+        key = content_key(f"{lang}|{text}")
+        candidates = [[entry for entry in entries if entry[0]["format"] == audio_format]
+                      for entries in self.audio.values() if entries[0][0]["lang"] == lang]
+        exact = [entry for entry in self.audio.get(key, []) if entry[0]["format"] == audio_format]
+        return self._pick("audio", key, exact or None, [c for c in candidates if c], strict)
+
+    def summary(self):
+        self.load()
+        answers = [header for entries in self.answers.values() for header, _ in entries]
+        audio = [header for entries in self.audio.values() for header, _ in entries]
+        return {
+            "bytes": os.path.getsize(self.path),
+            "prompts": len(self.prompts),
+            "answers": len(answers),
+            "audio_chunks": len(audio),
+            "models": sorted({header["model"] for header in answers}),
+            "engines": sorted({header["engine"] for header in audio}),
+            "answer_latency_ms": sum(header["latency_ms"] for header in answers),
+            "audio_latency_ms": sum(header["latency_ms"] for header in audio),
+        }
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """Process-wide cassette at CROP_CASSETTE, created on first use"""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+            atexit.register(_cassette.flush)
+    return _cassette
+
+
+def _response(header, text):
+    """Replayed answer shaped like a Gemini response; cassette_substitute marks one recorded for another prompt"""
+    return SimpleNamespace(
+        text=text,
+        cassette_substitute=header.get("substitute", False),
+        usage_metadata=SimpleNamespace(prompt_token_count=header["input_tokens"],
+                                       candidates_token_count=header["output_tokens"]),
+        candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name=header["finish_reason"] or "STOP"))],
+    )
+
+
+class RecordingModel:
+    """Wraps a model and records every answer it gives into the cassette"""
+
+    def __init__(self, model, cassette=None):
+        self.model = model
+        self.model_name = getattr(model, "model_name", "unknown")
+        self.cassette = cassette or get_cassette()
+
+    def _record(self, contents, response, start):
+        latency_ms = (time.perf_counter() - start) * 1000
+        try:
+            text = response.text
+        except Exception:
+            # Blocked or empty answers have no text to replay
+            return
+        candidates = getattr(response, "candidates", None) or []
+        reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        usage = getattr(response, "usage_metadata", None)
+        self.cassette.record_answer(contents, text, latency_ms, self.model_name,
+                                    finish_reason=getattr(reason, "name", reason),
+                                    input_tokens=getattr(usage, "prompt_token_count", None),
+                                    output_tokens=getattr(usage, "candidates_token_count", None))
+
+    def generate_content(self, contents):
+        start = time.perf_counter()
+        response = self.model.generate_content(contents)
+        self._record(contents, response, start)
+        return response
+
+    async def generate_content_async(self, contents):
+        start = time.perf_counter()
+        response = await self.model.generate_content_async(contents)
+        await asyncio.to_thread(self._record, contents, response, start)
+        return response
+
+
+class ReplayModel:
+    """Answers from the cassette after the recorded latency times latency_scale; needs no network"""
+    model_name = REPLAY_MODEL_NAME
+
+    def __init__(self, cassette=None, latency_scale=None):
+        self.cassette = (cassette or get_cassette()).load()
+        self.latency_scale = LATENCY_SCALE if latency_scale is None else latency_scale
+
+    def generate_content(self, contents):
+        header, text = self.cassette.answer(contents)
+        time.sleep(header["latency_ms"] / 1000 * self.latency_scale)
+        return _response(header, text)
+
+    async def generate_content_async(self, contents):
+        header, text = self.cassette.answer(contents)
+        await asyncio.sleep(header["latency_ms"] / 1000 * self.latency_scale)
+        return _response(header, text)
+
+
+def wrap_model(model):
+    """The model as the current cassette mode wants it: recorded, or untouched"""
+    if MODE == "record" and model is not None and not isinstance(model, RecordingModel):
+        return RecordingModel(model)
+    return model
+
+
+if __name__ == "__main__":
+    # Summary of a cassette: python cassettes.py path/to/file.cassette
+    # Record a stub session and replay it: python cassettes.py demo [answers]
+    if sys.argv[1:2] != ["demo"]:
+        path = sys.argv[1] if len(sys.argv) > 1 else CASSETTE_PATH
+        for field, value in Cassette(path).summary().items():
+            print(f"{field:>18}: {value}")
+        sys.exit()
+
+    import tempfile
+
+    import crop_core
+
+    answers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    path = os.path.join(tempfile.mkdtemp(prefix="cassette-demo-"), "demo.cassette")
+    recorder = RecordingModel(crop_core.StubModel(0.05), Cassette(path))
+    prompts = [crop_core.build_prompt("en", "November", f"District {i % 5}, Punjab", 50000 + 1000 * i,
+                                      "New Farmer", "Small (Less than 5 acres)", False) for i in range(answers)]
+    for prompt in prompts:
+        asyncio.run(recorder.generate_content_async(prompt))
+    recorder.cassette.flush()
+    raw = sum(len(p.encode("utf-8")) + len(recorder.model.response.text.encode("utf-8")) for p in prompts)
+    summary = Cassette(path).summary()
+    print(f"recorded {summary['answers']} answers for {summary['prompts']} prompts: {summary['bytes']:,} bytes "
+          f"on disk for {raw:,} bytes of prompts and answers")
+    for scale in (1.0, 0.0):
+        replay = ReplayModel(Cassette(path), latency_scale=scale)
+        start = time.perf_counter()
+        texts = [asyncio.run(replay.generate_content_async(prompt)).text for prompt in prompts]
+        print(f"replay at latency x{scale}: {time.perf_counter() - start:.2f} s, "
+              f"identical: {texts == [recorder.model.response.text] * answers}, misses: {replay.cassette.stats['misses']}")
+    unrecorded = prompts[0].replace("District 0", "District 99")
+    try:
+        replay.cassette.answer(unrecorded)
+    except CassetteMiss:
+        print("unrecorded prompt: CassetteMiss (strict)")
+    header, _ = replay.cassette.answer(unrecorded, strict=False)
+    print(f"unrecorded prompt, CROP_CASSETTE_STRICT=0: stand-in served, substitute={header['substitute']}")
@@ -0,0 +1,522 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+import cache_backends
+import cassettes
+import knowledge_base
+import model_router
+import prompts
+import scheduler
+import telemetry
+
+# Load .env file
+load_dotenv()
+
+# Get API key from environment
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_NAMES = model_router.MODEL_NAMES
+LLM_TIMEOUT_SECONDS = float(os.getenv("CROP_LLM_TIMEOUT_SECONDS", "60"))
+# Budgets (₹) from which a request weighs enough crops and costs to go to the stronger model
+COMPLEX_BUDGET = int(os.getenv("CROP_COMPLEX_BUDGET", "200000"))
+# How long a stored recommendation is served before it is regenerated in the background
+FRESHNESS_WINDOW = int(os.getenv("CROP_FRESHNESS_WINDOW", str(24 * 3600)))
+# Shorter than the freshness window, so background refreshes always reach the model
+RECOMMENDATION_CACHE_TTL = FRESHNESS_WINDOW // 2
+# Follow-up requests allowed when an answer is cut off at the output token limit
+MAX_CONTINUATIONS = int(os.getenv("CROP_MAX_CONTINUATIONS", "2"))
+# Offline stand-in for Gemini, for load tests and demos: CROP_STUB_MODEL=1 CROP_STUB_LATENCY=1.5
+USE_STUB_MODEL = os.getenv("CROP_STUB_MODEL") == "1"
+STUB_LATENCY_SECONDS = float(os.getenv("CROP_STUB_LATENCY", "1.0"))
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _fallback_en(response_text, month, location, budget):
+    """English card shown when the model answer has no JSON"""
+    return {
+        "recommendations": [{
+            "crop_name": "Consult Local Expert",
+            "profit_potential": "Variable",
+            "estimated_roi": "Contact specialist",
+            "investment_required": f"Within ₹{budget}",
+            "growing_period": "Varies",
+            "key_benefits": ["Local analysis required"],
+            "considerations": ["Contact agriculture department"],
+            "market_price_range": "Market dependent"
+        }],
+        "general_advice": response_text[:300],
+        "seasonal_notes": f"For {location} in {month}, check local weather patterns."
+    }
+
+
+def _fallback_hi(response_text, month, location, budget):
+    """Hindi card shown when the model answer has no JSON"""
+    return {
+        "recommendations": [{
+            "crop_name": "स्थानीय विशेषज्ञ से सलाह लें",
+            "profit_potential": "परिवर्तनशील",
+            "estimated_roi": "विशेषज्ञ से संपर्क करें",
+            "investment_required": f"₹{budget} के भीतर",
+            "growing_period": "अलग-अलग",
+            "key_benefits": ["स्थानीय विश्लेषण आवश्यक"],
+            "considerations": ["कृषि विभाग से संपर्क करें"],
+            "market_price_range": "बाजार पर निर्भर"
+        }],
+        "general_advice": response_text[:300],
+        "seasonal_notes": f"{location} में {month} के लिए स्थानीय मौसम पैटर्न देखें।"
+    }
+
+
+def _fallback_or(response_text, month, location, budget):
+    """Odia card shown when the model answer has no JSON"""
+    return {
+        "recommendations": [{
+            "crop_name": "ସ୍ଥାନୀୟ ପରାମର୍ଶ ନିଅନ୍ତୁ",
+            "profit_potential": "Variable",
+            "estimated_roi": "ବିଶେଷଜ୍ଞଙ୍କ ସହ ଯୋଗାଯୋଗ କରନ୍ତୁ",
+            "investment_required": f"₹{budget} ମଧ୍ୟରେ",
+            "growing_period": "ବିଭିନ୍ନ",
+            "key_benefits": ["ସ୍ଥାନୀୟ ବିଶ୍ଳେଷଣ ଆବଶ୍ୟକ"],
+            "considerations": ["କୃଷି ବିଭାଗ ସହ ଯୋଗାଯୋଗ କରନ୍ତୁ"],
+            "market_price_range": "ବଜାର ଉପରେ ନିର୍ଭରଶୀଳ"
+        }],
+        "general_advice": response_text[:300],
+        "seasonal_notes": f"{month} ରେ {location} ପାଇଁ ସ୍ଥାନୀୟ ଋତୁ pattern ଦେଖନ୍ତୁ |"
+    }
+
+
+LANGUAGES = {
+    "en": {
+        "fallback": _fallback_en,
+        "months": knowledge_base.MONTH_NAMES[0],
+        "experience_levels": ["New Farmer", "Intermediate", "Experienced Farmer"],
+        "farm_sizes": ["Small (Less than 5 acres)", "Medium (5-50 acres)", "Large (50+ acres)"],
+        "profit_levels": {"High": "High", "Medium": "Medium", "Low": "Low"},
+        "labels": {
+            "month": "Month", "location": "Location", "budget": "Budget",
+            "experience": "Experience Level", "farm_size": "Farm Size", "organic": "Prefer Organic Farming",
+            "growing_period": "Growing Period", "investment_required": "Investment Required",
+            "market_price_range": "Market Rate", "profit_potential": "Profit Potential", "estimated_roi": "ROI",
+            "key_benefits": "Key Benefits", "considerations": "Considerations",
+            "general_advice": "General Advice", "seasonal_notes": "Seasonal Notes",
+        },
+        "speech": ("Here are your crop recommendations. ", ". General Advice: ", ". Seasonal Notes: "),
+    },
+    "hi": {
+        "fallback": _fallback_hi,
+        "months": knowledge_base.MONTH_NAMES[1],
+        "experience_levels": ["नया किसान", "मध्यम", "अनुभवी किसान"],
+        "farm_sizes": ["छोटा (5 एकड़ से कम)", "मध्यम (5-50 एकड़)", "बड़ा (50+ एकड़)"],
+        "profit_levels": {"High": "उच्च", "Medium": "मध्यम", "Low": "कम"},
+        "labels": {
+            "month": "महीना", "location": "स्थान", "budget": "बजट",
+            "experience": "अनुभव स्तर", "farm_size": "खेत का आकार", "organic": "जैविक खेती पसंद करें",
+            "growing_period": "उगाने की अवधि", "investment_required": "आवश्यक निवेश",
+            "market_price_range": "बाजार दर", "profit_potential": "मुनाफे की संभावना", "estimated_roi": "ROI",
+            "key_benefits": "मुख्य लाभ", "considerations": "विचारणीय बातें",
+            "general_advice": "सामान्य सलाह", "seasonal_notes": "मौसमी टिप्पणी",
+        },
+        "speech": ("यहाँ आपकी फसल सिफारिशें हैं। ", ". सामान्य सलाह: ", ". मौसमी टिप्पणी: "),
+    },
+    "or": {
+        "fallback": _fallback_or,
+        "months": knowledge_base.MONTH_NAMES[2],
+        "experience_levels": ["ନୂଆ କୃଷକ", "ମଧ୍ୟମ ଅନୁଭବ", "ଅନୁଭବୀ କୃଷକ"],
+        "farm_sizes": ["ଛୋଟ (5 ଏକର କମ୍)", "ମଧ୍ୟମ (5-50 ଏକର)", "ବଡ଼ (50+ ଏକର)"],
+        "profit_levels": {"High": "ଉଚ୍ଚ", "Medium": "ମଧ୍ୟମ", "Low": "କମ୍"},
+        "labels": {
+            "month": "ମାସ", "location": "ସ୍ଥାନ", "budget": "ବଜେଟ୍",
+            "experience": "ଅନୁଭବ ସ୍ତର", "farm_size": "ଜମି ଆକାର", "organic": "ଜୈବିକ ଚାଷକୁ ପ୍ରାଧାନ୍ୟ",
+            "growing_period": "ବୃଦ୍ଧିର ସମୟ", "investment_required": "ନିବେଶ ଆବଶ୍ୟକ",
+            "market_price_range": "ବଜାର ଦର", "profit_potential": "ଲାଭ ସମ୍ଭାବନା", "estimated_roi": "ROI",
+            "key_benefits": "ମୁଖ୍ୟ ଲାଭଗୁଡ଼ିକ", "considerations": "ସତର୍କତାଗୁଡ଼ିକ",
+            "general_advice": "ସାଧାରଣ ପରାମର୍ଶ", "seasonal_notes": "ଋତୁଗତ ନୋଟ୍ସ",
+        },
+        "speech": ("ଏଠାରେ ଆପଣଙ୍କ ଫସଲ ସୁପାରିଶ ଅଛି | ", " | ସାଧାରଣ ପରାମର୍ଶ: ", " | ଋତୁଗତ ନୋଟ୍ସ: "),
+    },
+}
+
+
+def localization(language):
+    """Month names, form options and field labels for one language"""
+    config = LANGUAGES[language]
+    return {key: config[key] for key in ("months", "experience_levels", "farm_sizes", "profit_levels", "labels")}
+
+
+def speech_text(language, recommendations):
+    """Spoken summary of a whole recommendation"""
+    intro, advice, notes = LANGUAGES[language]["speech"]
+    return (
+        intro
+        + " , ".join([crop['crop_name'] for crop in recommendations['recommendations']])
+        + advice + recommendations['general_advice']
+        + notes + recommendations['seasonal_notes']
+    )
+
+
+def crop_speech_text(language, crop):
+    """Short spoken summary of one crop card"""
+    labels = LANGUAGES[language]["labels"]
+    end = {"en": ".", "hi": "।", "or": " |"}[language]
+    return " ".join(
+        [f"{crop['crop_name']}{end}"]
+        + [f"{labels[field]}: {crop[field]}{end}" for field in ("growing_period", "investment_required", "profit_potential")]
+    )
+
+
+class StubModel:
+    """Answers every prompt with the same realistic recommendation after a fixed delay"""
+    model_name = "stub"
+
+    def __init__(self, latency=None):
+        self.latency = STUB_LATENCY_SECONDS if latency is None else latency
+        crops = [("Wheat", "High", "4-5 months"), ("Mustard", "Medium", "3-4 months"), ("Chickpea", "Medium", "4 months")]
+        self.response = SimpleNamespace(text=json.dumps({
+            "recommendations": [
+                {"crop_name": name, "profit_potential": potential, "estimated_roi": "25-35%",
+                 "investment_required": "₹20,000-30,000 per acre", "growing_period": period,
+                 "key_benefits": ["Assured procurement at MSP", "Low water need"],
+                 "considerations": ["Irrigate at critical stages"], "market_price_range": "₹2,000-2,400 per quintal"}
+                for name, potential, period in crops
+            ],
+            "general_advice": "Sow on time with certified seed. Test the soil before applying fertilizer.",
+            "seasonal_notes": "Rabi sowing season; watch for late frost.",
+        }))
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return self.response
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.latency)
+        return self.response
+
+
+async def setup_model_async():
+    """Configure Gemini and return the shared model router"""
+    if cassettes.MODE == "replay":
+        return cassettes.ReplayModel()
+    if USE_STUB_MODEL:
+        return cassettes.wrap_model(StubModel())
+    genai.configure(api_key=GEMINI_API_KEY)
+    # No test prompt: the router learns which models answer, and how fast, from real traffic
+    return model_router.get_router(lambda model_name: cassettes.wrap_model(genai.GenerativeModel(model_name)))
+
+
+def request_complexity(budget, organic):
+    """Organic plans and large budgets trade more constraints off against each other; the rest are routine"""
+    return model_router.COMPLEX if organic or budget >= COMPLEX_BUDGET else model_router.SIMPLE
+
+
+def build_prompt(language, month, location, budget, experience, farm_size, organic):
+    """Full prompt for one request, grounded in the local knowledge base"""
+    reference_notes = knowledge_base.format_context(knowledge_base.retrieve(location, month))
+    return prompts.get(language, "recommendation").render(
+        month=month, location=location, budget=budget, experience=experience, farm_size=farm_size,
+        organic=prompts.YES_NO[language][0 if organic else 1], reference_notes=reference_notes
+    )
+
+
+def _usage(response, prompt):
+    """Input and output tokens of one call, estimated from the text when the API does not report them"""
+    usage = getattr(response, "usage_metadata", None)
+    return {"input_tokens": getattr(usage, "prompt_token_count", None) or len(prompt) // 4,
+            "output_tokens": _output_tokens(response)}
+
+
+def _extract_json(response_text):
+    """The JSON object in the model text, or None if there is none"""
+    start_idx = response_text.find('{')
+    end_idx = response_text.rfind('}') + 1
+
+    if start_idx != -1 and end_idx > start_idx:
+        return json.loads(response_text[start_idx:end_idx])
+    return None
+
+
+def _try_json(response_text):
+    try:
+        return _extract_json(response_text)
+    except ValueError:
+        return None
+
+
+def _truncated(response):
+    """True when the model stopped because it hit the output token limit"""
+    for candidate in getattr(response, "candidates", None) or []:
+        reason = getattr(candidate, "finish_reason", None)
+        if getattr(reason, "name", reason) in ("MAX_TOKENS", 2):
+            return True
+    return False
+
+
+def _output_tokens(response):
+    """Output tokens reported by the API, or a rough estimate from the text length"""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "candidates_token_count", None) or len(response.text) // 4
+
+
+def _splice(partial, continuation):
+    """Join a continuation onto the cut-off text, dropping code fences and repeated overlap"""
+    continuation = continuation.strip()
+    if continuation.startswith("```"):
+        continuation = continuation.split("\n", 1)[1] if "\n" in continuation else ""
+    for size in range(min(len(partial), len(continuation), 200), 15, -1):
+        if partial.endswith(continuation[:size]):
+            continuation = continuation[size:]
+            break
+    return partial + continuation
+
+
+def salvage_crops(response_text):
+    """Crop entries that were complete before the answer was cut off"""
+    start = response_text.find('"recommendations"')
+    start = response_text.find("[", start) if start != -1 else -1
+    if start == -1:
+        return []
+    decoder = json.JSONDecoder()
+    crops = []
+    index = start + 1
+    while True:
+        while index < len(response_text) and response_text[index] in " \t\r\n,":
+            index += 1
+        if index >= len(response_text) or response_text[index] != "{":
+            return crops
+        try:
+            crop, index = decoder.raw_decode(response_text, index)
+        except ValueError:
+            return crops
+        if "crop_name" in crop:
+            crops.append(crop)
+
+
+def _salvage(language, response_text, month, location, budget):
+    """Answer built from the complete crops of a cut-off response, or None if there are none"""
+    crops = salvage_crops(response_text)
+    if not crops:
+        return None
+    result = LANGUAGES[language]["fallback"]("", month, location, budget)
+    result["recommendations"] = crops
+    result["incomplete"] = "salvaged"
+    for field in ("general_advice", "seasonal_notes"):
+        match = re.search(rf'"{field}"\s*:\s*("(?:[^"\\]|\\.)*")', response_text)
+        if match:
+            result[field] = json.loads(match.group(1))
+    return result
+
+
+async def _continue_truncated(model, language, prompt, response, timeout):
+    """Ask the model to resume a cut-off answer and splice the parts together"""
+    text = response.text
+    continue_prompt = prompts.get(language, "continuation")
+    kept_tokens = _output_tokens(response)
+    continuation_tokens = extra_input_tokens = continuations = 0
+    while continuations < MAX_CONTINUATIONS and _try_json(text) is None:
+        contents = [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [text]},
+                    {"role": "user", "parts": [continue_prompt.text]}]
+        with telemetry.timed("llm_continuation", language=language, model=getattr(model, "model_name", None),
+                             prompt_version=continue_prompt.version):
+            follow_up = await asyncio.wait_for(model.generate_content_async(contents), timeout)
+        continuations += 1
+        # The continuation re-reads the prompt and everything so far, but does not regenerate it
+        extra_input_tokens += (len(prompt) + len(text) + len(continue_prompt.text)) // 4
+        continuation_tokens += _output_tokens(follow_up)
+        text = _splice(text, follow_up.text)
+        if not _truncated(follow_up) and _try_json(text) is None:
+            break
+    telemetry.record("truncation", language=language, prompt_version=prompts.version(language),
+                     continuations=continuations,
+                     completed=_try_json(text) is not None, output_tokens_kept=kept_tokens,
+                     continuation_output_tokens=continuation_tokens, extra_input_tokens=extra_input_tokens)
+    return text
+
+
+def parse_response(language, response_text, month, location, budget):
+    """Extract the JSON answer from the model text, or build the fallback card"""
+    result = _extract_json(response_text)
+    if result is not None:
+        return result
+    telemetry.record("fallback", language=language, prompt_version=prompts.version(language), reason="no_json")
+    result = LANGUAGES[language]["fallback"](response_text, month, location, budget)
+    result["incomplete"] = "fallback"
+    return result
+
+
+def result_key(result):
+    """Content hash of a parsed recommendation and its size in bytes"""
+    canonical = json.dumps(result, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest(), len(canonical.encode("utf-8"))
+
+
+def is_complete(result):
+    """False for fallback cards and answers salvaged from a cut-off response, which are shown but not kept"""
+    return bool(result) and not result.get("incomplete")
+
+
+async def generate_recommendations_async(model, language, month, location, budget, experience, farm_size, organic,
+                                         timeout=LLM_TIMEOUT_SECONDS):
+    """Ask the model for crop recommendations without blocking a thread.
+
+    Raises asyncio.TimeoutError after timeout seconds; cancelling the task
+    cancels the model call. Other errors are raised to the caller.
+    """
+    # Retrieval reads the knowledge base index from disk, which would stall every other call on the loop
+    prompt = await asyncio.to_thread(build_prompt, language, month, location, budget, experience, farm_size, organic)
+    model = model_router.for_request(model, request_complexity(budget, organic))
+    model_name = getattr(model, "model_name", None)
+    prompt_version = prompts.version(language)
+    # Replicas share the cache, so a prompt answered by any worker is not sent again
+    cache = cache_backends.get_cache()
+    cache_key = f"{model_name}|{prompt_version}|{prompt}"
+    cached = await asyncio.to_thread(cache.get_json, "recommendation", cache_key)
+    if cached is not None:
+        return cached
+
+    with telemetry.timed("llm_call", language=language, model=model_name, prompt_version=prompt_version) as call:
+        try:
+            response = await asyncio.wait_for(model.generate_content_async(prompt), timeout)
+        except asyncio.TimeoutError:
+            telemetry.record("llm_timeout", language=language, prompt_version=prompt_version, timeout_seconds=timeout)
+            raise
+        call.fields.update(_usage(response, prompt))
+        if getattr(model, "served_by", None):
+            call.fields["model"] = model.served_by
+    text = response.text
+    # Cut off at the token limit, or an opened JSON object that does not parse
+    if _truncated(response) or ("{" in text and _try_json(text) is None):
+        text = await _continue_truncated(model, language, prompt, response, timeout)
+    result = _try_json(text)
+    if result is None:
+        # Salvaged answers and fallback cards are not cached, so the next request asks the model again
+        salvaged = _salvage(language, text, month, location, budget)
+        return salvaged or parse_response(language, text, month, location, budget)
+    if getattr(response, "cassette_substitute", False):
+        # A replayed answer recorded for another prompt can be shown, but is not this prompt's answer to keep
+        telemetry.record("cassette_substitute", language=language, prompt_version=prompt_version)
+        result["incomplete"] = "substitute"
+        return result
+    await asyncio.to_thread(cache.set_json, "recommendation", cache_key, result, RECOMMENDATION_CACHE_TTL)
+    return result
+
+
+def _event_loop():
+    """Event loop shared by all sync callers, running on a daemon thread"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="crop-core-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared loop and wait for its result"""
+    future = asyncio.run_coroutine_threadsafe(coro, _event_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # The caller gave up (e.g. a Streamlit rerun stopped the script), so stop the model call too
+        future.cancel()
+        raise
+
+
+def setup_model():
+    """Blocking wrapper around setup_model_async for the Streamlit pages"""
+    return run_sync(setup_model_async())
+
+
+def generate_recommendations(model, language, month, location, budget, experience, farm_size, organic,
+                             work_class=scheduler.INTERACTIVE):
+    """Blocking wrapper around generate_recommendations_async, in a slot of the shared scheduler"""
+    coro = generate_recommendations_async(model, language, month, location, budget, experience, farm_size, organic)
+    # Inside a scheduler item (a background refresh) the slot is already held
+    if scheduler.current_class() is None:
+        coro = scheduler.get_scheduler().run_async(work_class, coro)
+    return run_sync(coro)
+
+
+def _truncation_benchmark(limit_tokens):
+    """Tokens spent finishing a cut-off answer by continuation vs by regenerating it"""
+    full_text = StubModel(0).response.text
+
+    class TruncatingModel:
+        # Stops every answer after limit_tokens output tokens (4 characters each), like MAX_TOKENS
+        model_name = "stub-truncating"
+        calls = input_tokens = output_tokens = first_output_tokens = 0
+        finished = False
+
+        async def generate_content_async(self, contents):
+            done = len(contents[1]["parts"][0]) if isinstance(contents, list) else 0
+            text = full_text[done:done + limit_tokens * 4]
+            self.finished = done + len(text) >= len(full_text)
+            self.calls += 1
+            parts = [turn["parts"][0] for turn in contents] if isinstance(contents, list) else [contents]
+            self.input_tokens += sum(len(part) for part in parts) // 4
+            self.output_tokens += len(text) // 4
+            self.first_output_tokens = self.first_output_tokens or len(text) // 4
+            return SimpleNamespace(
+                text=text, usage_metadata=SimpleNamespace(candidates_token_count=len(text) // 4),
+                candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="STOP" if self.finished else "MAX_TOKENS"))])
+
+    cache_backends.set_cache(cache_backends.MemoryBackend(max_bytes=0))
+    args = ("en", "November", "Ludhiana, Punjab", 50000, "New Farmer", "Small (1-2 acres)", False)
+    model = TruncatingModel()
+    prompt_tokens = len(build_prompt(*args)) // 4
+    answer_tokens = len(full_text) // 4
+    result = asyncio.run(generate_recommendations_async(model, *args))
+    print(f"answer {answer_tokens} output tokens, limit {limit_tokens}: {model.calls - 1} continuation(s) -> "
+          f"{len(result['recommendations'])} crops, {'complete' if model.finished else 'salvaged'}")
+    print(f"continuation: {model.output_tokens - model.first_output_tokens} extra output tokens, "
+          f"{model.input_tokens - prompt_tokens} extra input tokens")
+    # A full retry needs a raised limit and regenerates everything, including the part already received
+    print(f"full retry:   {answer_tokens} extra output tokens, {prompt_tokens} extra input tokens")
+
+
+if __name__ == "__main__":
+    # Sync-threaded vs async throughput against a stub model: python crop_core.py 500 1.0 32
+    # Continuation vs full retry for a cut-off answer: python crop_core.py truncation 150
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    if sys.argv[1:2] == ["truncation"]:
+        _truncation_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 150)
+        sys.exit()
+
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+
+    # Keep the benchmark on the model path rather than measuring the shared cache
+    cache_backends.set_cache(cache_backends.MemoryBackend(max_bytes=0))
+    model = StubModel(latency)
+    args = ("en", "November", "Ludhiana, Punjab", 50000, "New Farmer", "Small (1-2 acres)", False)
+
+    def blocking_call():
+        # The pre-async code path: one thread held for the whole model call
+        response = model.generate_content(build_prompt(*args))
+        return parse_response(args[0], response.text, *args[1:4])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: blocking_call(), range(requests)))
+    threaded = time.perf_counter() - start
+    print(f"threaded ({threads} threads): {requests / threaded:7.1f} req/s, {threaded:.2f} s")
+
+    async def run_all():
+        return await asyncio.gather(*(generate_recommendations_async(model, *args) for _ in range(requests)))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    concurrent = time.perf_counter() - start
+    print(f"async (1 thread):    {requests / concurrent:7.1f} req/s, {concurrent:.2f} s, "
+          f"{requests} in flight, {threading.active_count()} threads alive")
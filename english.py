@@ -1,13 +1,21 @@
 import streamlit as st
-import google.generativeai as genai
 import pandas as pd
-import json
 from datetime import datetime
 import plotly.express as px
 import os
 from dotenv import load_dotenv
-from gtts import gTTS
-import tempfile
+import admin_auth
+import budget_optimizer
+import crop_core
+import session_store
+import history_store
+import lite_mode
+import mandi_prices
+import price_trends
+import revalidate
+import roi_simulation
+import similar_requests
+import speech
 
 
 
@@ -26,8 +34,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Lite mode for 2G/3G: no decorative CSS, static charts, plain tables and audio only on request
+lite = lite_mode.enabled("📶 Lite mode (slow connection)", help="Loads a much smaller page: simple charts and tables, audio only when you press play")
+
 # Indian-themed CSS
-st.markdown("""
+if not lite:
+    st.markdown("""
 <style>
     .main-header {
         font-size: 2.8rem;
@@ -85,22 +97,35 @@ st.markdown("""
         text-shadow: 1px 1px 2px rgba(0,0,0,0.1);
     }
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state (holds only a key into the shared result store)
 if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
 
 def speak_text(text):
-    """Convert text to speech and return audio file path"""
+    """Start converting text to speech in the background and return the job"""
+    return speech.prepare(text, "en")
+
+def attach_audio(job, slot, show_timing=True):
+    """Fill an audio placeholder with the first segment as soon as it is ready, then the full track below it"""
     try:
-        tts = gTTS(text=text, lang="en")
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts.save(temp_file.name)
-        return temp_file.name
+        first = job.first_segment()
+        if first is None:
+            if show_timing:
+                slot.caption("🔇 Voice output is not available on this server")
+            return
+        slot.audio(first, format=job.audio_format)
+        if len(job.chunks) > 1:
+            # A second player, since replacing the first would cut off a farmer who is already listening
+            slot.caption("Full audio")
+            slot.audio(job.full_track(), format=job.audio_format)
+        else:
+            job.full_track()
+        if show_timing:
+            slot.caption(f"⏱️ First audio in {job.first_audio_ms / 1000:.1f}s · full track in {job.full_track_ms / 1000:.1f}s · {job.engine.name}")
     except Exception as e:
-        st.error(f"Speech error: {e}")
-        return None
+        slot.error(f"Speech error: {e}")
  
 
 def setup_gemini_api():
@@ -110,17 +135,7 @@ def setup_gemini_api():
             st.error("❌ Gemini API Key not found. Please set it in your .env file.")
             return None
 
-        genai.configure(api_key=GEMINI_API_KEY)
-        model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-        
-        for model_name in model_names:
-            try:
-                model = genai.GenerativeModel(model_name)
-                test_response = model.generate_content("Test")
-                return model
-            except:
-                continue
-        return None
+        return crop_core.setup_model()
     except Exception as e:
         st.error(f"Gemini setup error: {e}")
         return None
@@ -129,66 +144,13 @@ def setup_gemini_api():
 def get_crop_recommendations(model, month, location, budget, experience, farm_size, organic):
     """Get crop recommendations using Gemini API"""
     try:
-        prompt = f"""
-        You are an Indian agriculture consultant. Based on the following information, recommend crops:
-        
-        Month: {month}
-        Location: {location}
-        Budget: ₹{budget}
-        Experience: {experience}
-        Farm Size: {farm_size}
-        Organic Farming: {'Yes' if organic else 'No'}
-        
-        Respond in JSON format:
-        {{
-            "recommendations": [
-                {{
-                    "crop_name": "Crop Name",
-                    "profit_potential": "High/Medium/Low",
-                    "estimated_roi": "percentage",
-                    "investment_required": "amount",
-                    "growing_period": "time in months",
-                    "key_benefits": ["benefit1", "benefit2", "benefit3"],
-                    "considerations": ["consideration1", "consideration2"],
-                    "market_price_range": "market rate"
-                }}
-            ],
-            "general_advice": "General advice",
-            "seasonal_notes": "Seasonal notes"
-        }}
-        
-        Recommend 3-5 crops based on Indian weather patterns, soil conditions, and market conditions.
-        """
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = response_text[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
-            return {
-                "recommendations": [{
-                    "crop_name": "Consult Local Expert",
-                    "profit_potential": "Variable",
-                    "estimated_roi": "Contact specialist",
-                    "investment_required": f"Within ₹{budget}",
-                    "growing_period": "Varies",
-                    "key_benefits": ["Local analysis required"],
-                    "considerations": ["Contact agriculture department"],
-                    "market_price_range": "Market dependent"
-                }],
-                "general_advice": response_text[:300],
-                "seasonal_notes": f"For {location} in {month}, check local weather patterns."
-            }
+        return crop_core.generate_recommendations(model, "en", month, location, budget,
+                                                  experience, farm_size, organic)
     except Exception as e:
         st.error(f"Error getting recommendations: {str(e)}")
         return None
 
-def display_crop_card(crop_data, index):
+def display_crop_card(crop_data, index, location):
     """Display crop recommendation card"""
     # Map profit potential to CSS class
     profit_mapping = {
@@ -197,13 +159,16 @@ def display_crop_card(crop_data, index):
         'Low': 'profit-low'
     }
     profit_class = profit_mapping.get(crop_data['profit_potential'], 'profit-medium')
+    # Recorded mandi prices, when the local price store has this crop
+    prices = mandi_prices.recent_prices(crop_data['crop_name'], location)
+    mandi_line = f"<p><strong>Mandi Price:</strong> {mandi_prices.price_text(prices, 'en')}</p>" if prices else ""
     
     st.markdown(f"""
     <div class="crop-card">
         <div class="crop-title">🌱 {crop_data['crop_name']}</div>
         <p><strong>Growing Period:</strong> {crop_data['growing_period']}</p>
         <p><strong>Investment Required:</strong> {crop_data['investment_required']}</p>
-        <p><strong>Market Rate:</strong> {crop_data['market_price_range']}</p>
+        <p><strong>Market Rate:</strong> {crop_data['market_price_range']}</p>{mandi_line}
         <p><strong>Profit Potential:</strong> <span class="{profit_class}">{crop_data['profit_potential']}</span></p>
         <p><strong>ROI:</strong> {crop_data['estimated_roi']}</p>
     </div>
@@ -225,6 +190,8 @@ def main():
         selected_month = st.selectbox("📅 Month", months, index=datetime.now().month - 1)
         
         location = st.text_input("📍 Location", placeholder="e.g., Punjab, India or Maharashtra")
+        
+        farmer_id = st.text_input("👤 Farmer ID / Mobile (optional)", placeholder="e.g., 9876543210")
     
     with col2:
         budget = st.number_input("💰 Budget (₹)", min_value=1000, max_value=10000000, value=50000, step=5000)
@@ -237,32 +204,87 @@ def main():
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Recent results for this farmer or district, served from the local history store
+    history = history_store.get_history_store()
+    recent = history.recent("en", location, farmer_id)
+    if recent:
+        with st.expander(f"🕘 Recent recommendations ({len(recent)})"):
+            for row in recent:
+                crops = ", ".join(crop['crop_name'] for crop in row['result']['recommendations'])
+                when = datetime.fromtimestamp(row['created_at']).strftime("%d-%m-%Y %H:%M")
+                month_label = months[row['month'] - 1] if row['month'] else ""
+                col1, col2 = st.columns([5, 1])
+                col1.write(f"{when} · {month_label} · ₹{row['budget']:,} — {crops}")
+                if col2.button("Show", key=f"history-{row['id']}"):
+                    session_store.save_recommendations(row['result'])
+                    st.rerun()
+    
     # Get Recommendations Button
     if st.button("🚀 Get Crop Recommendations", type="primary", use_container_width=True):
         if not location.strip():
             st.error("Please enter your location")
             return
         
-        model = setup_gemini_api()
-        if not model:
-            st.error("Gemini API connection issue. Please check your internet connection.")
-            return
+        # Serve the last answer for these inputs at once and refresh it in the background if stale
+        key = history_store.request_key("en", location, selected_month, budget, experience, farm_size, organic)
+        
+        def generate():
+            model = setup_gemini_api()
+            if not model:
+                return None
+            return get_crop_recommendations(model, selected_month, location, budget,
+                                            experience, farm_size, organic)
+        
+        def store_result(result):
+            # Fallback cards and salvaged answers are shown once but never served again from history
+            if crop_core.is_complete(result):
+                history.append(result, "en", location, selected_month, budget,
+                               experience, farm_size, organic, farmer_id=farmer_id)
         
-        with st.spinner("🤖 Analyzing market conditions and preparing recommendations..."):
-            recommendations = get_crop_recommendations(model, selected_month, location, budget, 
-                                                     experience, farm_size, organic)
+        def find_similar():
+            return similar_requests.find_similar(history, "en", location, selected_month, budget,
+                                                 experience, farm_size, organic)
+        
+        if revalidate.serve_cached(history, key, generate, store_result, find_similar) is None:
+            model = setup_gemini_api()
+            if not model:
+                st.error("Gemini API connection issue. Please check your internet connection.")
+                return
+        
+            with st.spinner("🤖 Analyzing market conditions and preparing recommendations..."):
+                recommendations = get_crop_recommendations(model, selected_month, location, budget, 
+                                                         experience, farm_size, organic)
             
-            if recommendations:
-                st.session_state.recommendations = recommendations
-                st.success("✅ Recommendations generated successfully!")
-            else:
-                st.error("❌ Failed to generate recommendations. Please try again.")
+                if recommendations:
+                    session_store.save_recommendations(recommendations)
+                    store_result(recommendations)
+                    revalidate.clear_served()
+                    st.success("✅ Recommendations generated successfully!")
+                else:
+                    st.error("❌ Failed to generate recommendations. Please try again.")
     
     # Display Recommendations
     
     
-    if st.session_state.recommendations:
-        recommendations = st.session_state.recommendations
+    revalidate.apply_refresh()
+    recommendations = session_store.load_recommendations()
+    if recommendations:
+        similar = st.session_state.get("served_similar")
+        if similar:
+            st.info(f"🔁 Advice shared from a similar request in your agro-climatic zone ({similar['district'].title()}, ₹{similar['budget']:,}), adjusted to your inputs.")
+        elif st.session_state.get("served_age") is not None:
+            if st.session_state.get("pending_refresh"):
+                st.info(f"🕘 Saved recommendations from {revalidate.format_age(st.session_state.served_age)} ago. Fetching an updated answer in the background…")
+                revalidate.watch_refresh()
+            else:
+                st.info(f"🕘 Saved recommendations from {revalidate.format_age(st.session_state.served_age)} ago.")
+        
+        # Start the audio in the background so cards and charts render without waiting; lite mode waits for a tap
+        speech_text = crop_core.speech_text("en", recommendations)
+        if not lite:
+            speech_job = speak_text(speech_text)
+            crop_jobs = [speak_text(crop_core.crop_speech_text("en", crop)) for crop in recommendations['recommendations']]
+        crop_audio_slots = []
         
         # Summary Metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -282,7 +304,7 @@ def main():
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                display_crop_card(crop, i)
+                display_crop_card(crop, i, location)
             
             with col2:
                 st.markdown(f"### #{i+1}")
@@ -294,6 +316,8 @@ def main():
                     st.markdown("**⚠️ Considerations:**")
                     for consideration in crop['considerations']:
                         st.write(f"• {consideration}")
+                    
+                    crop_audio_slots.append(st.container())
                         
         
         # Analysis Tab
@@ -312,15 +336,84 @@ def main():
                 else:
                     profit_numeric.append(1)
             
-            fig = px.bar(x=crop_names, y=profit_numeric, title="Profit Comparison",
-                        labels={'x': 'Crops', 'y': 'Profit Level'},
-                        color=profit_numeric, color_continuous_scale='Oranges')
-            
-            fig.update_layout(showlegend=False,
-                            yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
-                                     ticktext=['Low', 'Medium', 'High']))
-            st.plotly_chart(fig, use_container_width=True)
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(crop_names, profit_numeric, title="Profit Comparison", y_label="Profit Level",
+                                                           y_ticks=[(1, 'Low'), (2, 'Medium'), (3, 'High')]))
+            else:
+                fig = px.bar(x=crop_names, y=profit_numeric, title="Profit Comparison",
+                            labels={'x': 'Crops', 'y': 'Profit Level'},
+                            color=profit_numeric, color_continuous_scale='Oranges')
+                
+                fig.update_layout(showlegend=False,
+                                yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
+                                         ticktext=['Low', 'Medium', 'High']))
+                st.plotly_chart(fig, use_container_width=True)
         
+        # Expected mandi price in each crop's harvest month, from the local price history
+        harvest = price_trends.harvest_frame(recommendations, location, selected_month)
+        if not harvest.empty:
+            st.subheader("📈 Expected Price at Harvest")
+            harvest['harvest_label'] = [months[m - 1] for m in harvest['harvest_month']]
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(harvest['crop'], harvest['expected'], title="Mandi price expected in the harvest month",
+                                                           y_label='₹ per quintal', low=harvest['low'], high=harvest['high'],
+                                                           markers=harvest['current'], bar_name="At harvest", marker_name="Now",
+                                                           bar_text=harvest['harvest_label']))
+            else:
+                fig = px.bar(harvest, x='crop', y='expected', text='harvest_label', title="Mandi price expected in the harvest month",
+                            error_y=harvest['high'] - harvest['expected'],
+                            error_y_minus=harvest['expected'] - harvest['low'],
+                            labels={'crop': 'Crops', 'expected': '₹ per quintal'},
+                            color_discrete_sequence=['#FF6B35'])
+                fig.data[0].name = "At harvest"
+                fig.add_scatter(x=harvest['crop'], y=harvest['current'], mode='markers', name="Now",
+                                marker=dict(color='#138808', size=12, symbol='diamond'))
+                fig.update_layout(showlegend=True)
+                st.plotly_chart(fig, use_container_width=True)
+            st.caption("Band: typical price swing by harvest time. Based on recorded mandi prices for your state.")
+        
+        # Simulated ROI spread and chance of a loss, so the downside is visible next to the estimate
+        risk = roi_simulation.simulate(recommendations, location, selected_month, budget)
+        if risk:
+            st.subheader("🎲 Profit Risk")
+            lite_mode.table(pd.DataFrame([{
+                'Crop': name,
+                'Bad year ROI': f"{result['roi_percentiles']['p5']:.0f}%",
+                'Typical ROI': f"{result['roi_percentiles']['p50']:.0f}%",
+                'Good year ROI': f"{result['roi_percentiles']['p95']:.0f}%",
+                'Chance of loss': f"{result['loss_probability']:.0%}",
+                'Typical profit on your budget': roi_simulation.format_rupees(result['median_profit']),
+            } for name, result in risk.items()]), lite)
+            st.caption(f"From {roi_simulation.TRIALS:,} simulated seasons per crop: yields, costs and harvest prices drawn from local data. Bad and good years are the worst and best 5%.")
+
+            # Land and budget split across the crops; moving a slider re-solves from cached tables
+            st.subheader("🧮 Budget Split")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                acres = st.number_input("🌾 Land to plant (acres)", min_value=0.5, max_value=1000.0, step=0.5,
+                                        value=budget_optimizer.default_acres("en", farm_size))
+            with col2:
+                max_share = st.slider("Most land for one crop (%)", 20, 100, int(budget_optimizer.DEFAULT_MAX_SHARE * 100), step=5)
+            with col3:
+                max_loss = st.number_input("Loss you can bear in a bad year (₹)", min_value=0, max_value=10000000, step=1000,
+                                           value=int(budget * budget_optimizer.DEFAULT_MAX_LOSS_SHARE))
+            plan = budget_optimizer.optimize(risk, budget, acres, max_share / 100, max_loss)
+            if plan and plan['crops']:
+                lite_mode.table(pd.DataFrame([{
+                    'Crop': crop['crop'],
+                    'Acres': crop['acres'],
+                    'Share of land': f"{crop['share']:.0%}",
+                    'Investment': roi_simulation.format_rupees(crop['investment']),
+                    'Expected profit': roi_simulation.format_rupees(crop['expected_profit']),
+                    'Bad year': roi_simulation.format_rupees(crop['worst_case']),
+                } for crop in plan['crops']]), lite)
+                st.caption(f"Plant {plan['acres']} of {acres:g} acres for {roi_simulation.format_rupees(plan['investment'])}: expected profit {roi_simulation.format_rupees(plan['expected_profit'])}, {roi_simulation.format_rupees(plan['worst_case'])} if every crop has a bad year.")
+            elif all(result['mean_profit_per_acre'] <= 0 for result in risk.values()):
+                # Leaving all the land fallow is then the best plan, whatever the limits
+                st.warning("None of these crops is expected to make a profit this season, so no land is planned for them. Ask a local agriculture expert about other crops.")
+            else:
+                st.warning("No planting plan fits this budget and loss limit. Try a larger loss limit or less land.")
+
                 # Advice Section
         col1, col2 = st.columns(2)
         
@@ -334,16 +427,7 @@ def main():
         
         # 👉 Voice Feature goes here
         st.markdown("### 🔊 Listen to Recommendations")
-        speech_text = (
-            "Here are your crop recommendations. "
-            + " , ".join([crop['crop_name'] for crop in recommendations['recommendations']])
-            + ". General Advice: " + recommendations['general_advice']
-            + ". Seasonal Notes: " + recommendations['seasonal_notes']
-        )
-        
-        audio_path = speak_text(speech_text)
-        if audio_path:
-            st.audio(audio_path, format="audio/mp3")
+        audio_slot = st.container()
         
         # Additional Tips
         st.markdown("#### 📚 Additional Tips")
@@ -358,6 +442,20 @@ def main():
         
         for tip in tips:
             st.write(tip)
+        
+        # Attach the audio players now that everything else is on the page
+        if lite:
+            # Keys include the result's store key, so a new answer starts without audio again
+            result_key = st.session_state.recommendations
+            lite_mode.deferred_audio(audio_slot, "🔊 Play", f"listen-{result_key}", lambda: speak_text(speech_text), attach_audio)
+            for i, (crop, slot) in enumerate(zip(recommendations['recommendations'], crop_audio_slots)):
+                lite_mode.deferred_audio(slot, "🔊 Play", f"listen-{result_key}-{i}",
+                                         lambda crop=crop: speak_text(crop_core.crop_speech_text("en", crop)),
+                                         attach_audio, show_timing=False)
+        else:
+            attach_audio(speech_job, audio_slot)
+            for job, slot in zip(crop_jobs, crop_audio_slots):
+                attach_audio(job, slot, show_timing=False)
     
     else:
         # Welcome Section
@@ -380,4 +478,5 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Admin pages (?admin) run in this process, so memory diagnostics measure this app
+    admin_auth.navigation(main, "🌾 Crop Profit Advisor")
@@ -1,13 +1,21 @@
 import streamlit as st
-import google.generativeai as genai
 import pandas as pd
-import json
 from datetime import datetime
 import plotly.express as px
 import os
 from dotenv import load_dotenv
-from gtts import gTTS
-import tempfile
+import admin_auth
+import budget_optimizer
+import crop_core
+import session_store
+import history_store
+import lite_mode
+import mandi_prices
+import price_trends
+import revalidate
+import roi_simulation
+import similar_requests
+import speech
 
 # Load .env file
 load_dotenv()
@@ -24,8 +32,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Lite mode for 2G/3G: no decorative CSS, static charts, plain tables and audio only on request
+lite = lite_mode.enabled("📶 लाइट मोड (धीमा इंटरनेट)", help="बहुत हल्का पेज: सादे चार्ट और तालिकाएं, आवाज़ केवल चलाने पर")
+
 # Indian-themed CSS
-st.markdown("""
+if not lite:
+    st.markdown("""
 <style>
     .main-header {
         font-size: 2.8rem;
@@ -83,22 +95,35 @@ st.markdown("""
         text-shadow: 1px 1px 2px rgba(0,0,0,0.1);
     }
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state (holds only a key into the shared result store)
 if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
 
 def speak_text(text, lang="en"):
-    """Convert text to speech and return audio file path"""
+    """Start converting text to speech in the background and return the job"""
+    return speech.prepare(text, lang)
+
+def attach_audio(job, slot, show_timing=True):
+    """Fill an audio placeholder with the first segment as soon as it is ready, then the full track below it"""
     try:
-        tts = gTTS(text=text, lang=lang)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts.save(temp_file.name)
-        return temp_file.name
+        first = job.first_segment()
+        if first is None:
+            if show_timing:
+                slot.caption("🔇 इस सर्वर पर आवाज़ उपलब्ध नहीं है")
+            return
+        slot.audio(first, format=job.audio_format)
+        if len(job.chunks) > 1:
+            # A second player, since replacing the first would cut off a farmer who is already listening
+            slot.caption("पूरा ऑडियो")
+            slot.audio(job.full_track(), format=job.audio_format)
+        else:
+            job.full_track()
+        if show_timing:
+            slot.caption(f"⏱️ पहली आवाज़ {job.first_audio_ms / 1000:.1f} सेकंड में · पूरा ऑडियो {job.full_track_ms / 1000:.1f} सेकंड में · {job.engine.name}")
     except Exception as e:
-        st.error(f"आवाज़ त्रुटि: {e}")
-        return None
+        slot.error(f"आवाज़ त्रुटि: {e}")
  
 
 def setup_gemini_api():
@@ -108,17 +133,7 @@ def setup_gemini_api():
             st.error("❌ Gemini API Key नहीं मिली। कृपया इसे अपनी .env फ़ाइल में सेट करें।")
             return None
 
-        genai.configure(api_key=GEMINI_API_KEY)
-        model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-        
-        for model_name in model_names:
-            try:
-                model = genai.GenerativeModel(model_name)
-                test_response = model.generate_content("Test")
-                return model
-            except:
-                continue
-        return None
+        return crop_core.setup_model()
     except Exception as e:
         st.error(f"Gemini सेटअप त्रुटि: {e}")
         return None
@@ -127,67 +142,13 @@ def setup_gemini_api():
 def get_crop_recommendations(model, month, location, budget, experience, farm_size, organic):
     """Get crop recommendations using Gemini API"""
     try:
-        prompt = f"""
-        आप एक भारतीय कृषि सलाहकार हैं। निम्नलिखित जानकारी के आधार पर, फसलों की सिफारिश करें:
-        
-        महीना: {month}
-        स्थान: {location}
-        बजट: ₹{budget}
-        अनुभव: {experience}
-        खेत का आकार: {farm_size}
-        जैविक खेती: {'हाँ' if organic else 'नहीं'}
-        
-        कृपया JSON प्रारूप में उत्तर दें (सभी जानकारी हिंदी में):
-        {{
-            "recommendations": [
-                {{
-                    "crop_name": "फसल का नाम",
-                    "profit_potential": "उच्च/मध्यम/कम",
-                    "estimated_roi": "प्रतिशत में",
-                    "investment_required": "राशि",
-                    "growing_period": "महीनों में समय",
-                    "key_benefits": ["लाभ1", "लाभ2", "लाभ3"],
-                    "considerations": ["विचार1", "विचार2"],
-                    "market_price_range": "बाजार दर"
-                }}
-            ],
-            "general_advice": "सामान्य सलाह हिंदी में",
-            "seasonal_notes": "मौसमी टिप्पणी हिंदी में"
-        }}
-        
-        भारतीय मौसम पैटर्न, मिट्टी की स्थिति और बाजार की स्थिति के आधार पर 3-5 फसलों की सिफारिश करें।
-        सभी जानकारी हिंदी में दें।
-        """
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = response_text[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
-            return {
-                "recommendations": [{
-                    "crop_name": "स्थानीय विशेषज्ञ से सलाह लें",
-                    "profit_potential": "परिवर्तनशील",
-                    "estimated_roi": "विशेषज्ञ से संपर्क करें",
-                    "investment_required": f"₹{budget} के भीतर",
-                    "growing_period": "अलग-अलग",
-                    "key_benefits": ["स्थानीय विश्लेषण आवश्यक"],
-                    "considerations": ["कृषि विभाग से संपर्क करें"],
-                    "market_price_range": "बाजार पर निर्भर"
-                }],
-                "general_advice": response_text[:300],
-                "seasonal_notes": f"{location} में {month} के लिए स्थानीय मौसम पैटर्न देखें।"
-            }
+        return crop_core.generate_recommendations(model, "hi", month, location, budget,
+                                                  experience, farm_size, organic)
     except Exception as e:
         st.error(f"सिफारिशें प्राप्त करने में त्रुटि: {str(e)}")
         return None
 
-def display_crop_card(crop_data, index):
+def display_crop_card(crop_data, index, location):
     """Display crop recommendation card"""
     # Map profit potential to CSS class
     profit_mapping = {
@@ -199,13 +160,16 @@ def display_crop_card(crop_data, index):
         'Low': 'profit-low'
     }
     profit_class = profit_mapping.get(crop_data['profit_potential'], 'profit-medium')
+    # Recorded mandi prices, when the local price store has this crop
+    prices = mandi_prices.recent_prices(crop_data['crop_name'], location)
+    mandi_line = f"<p><strong>मंडी भाव:</strong> {mandi_prices.price_text(prices, 'hi')}</p>" if prices else ""
     
     st.markdown(f"""
     <div class="crop-card">
         <div class="crop-title">🌱 {crop_data['crop_name']}</div>
         <p><strong>उगाने की अवधि:</strong> {crop_data['growing_period']}</p>
         <p><strong>आवश्यक निवेश:</strong> {crop_data['investment_required']}</p>
-        <p><strong>बाजार दर:</strong> {crop_data['market_price_range']}</p>
+        <p><strong>बाजार दर:</strong> {crop_data['market_price_range']}</p>{mandi_line}
         <p><strong>मुनाफे की संभावना:</strong> <span class="{profit_class}">{crop_data['profit_potential']}</span></p>
         <p><strong>ROI:</strong> {crop_data['estimated_roi']}</p>
     </div>
@@ -227,6 +191,8 @@ def main():
         selected_month = st.selectbox("📅 महीना", months, index=datetime.now().month - 1)
         
         location = st.text_input("📍 स्थान", placeholder="जैसे: पंजाब, भारत या महाराष्ट्र")
+        
+        farmer_id = st.text_input("👤 किसान आईडी / मोबाइल (वैकल्पिक)", placeholder="जैसे: 9876543210")
     
     with col2:
         budget = st.number_input("💰 बजट (₹)", min_value=1000, max_value=10000000, value=50000, step=5000)
@@ -239,30 +205,85 @@ def main():
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Recent results for this farmer or district, served from the local history store
+    history = history_store.get_history_store()
+    recent = history.recent("hi", location, farmer_id)
+    if recent:
+        with st.expander(f"🕘 हाल की सिफारिशें ({len(recent)})"):
+            for row in recent:
+                crops = ", ".join(crop['crop_name'] for crop in row['result']['recommendations'])
+                when = datetime.fromtimestamp(row['created_at']).strftime("%d-%m-%Y %H:%M")
+                month_label = months[row['month'] - 1] if row['month'] else ""
+                col1, col2 = st.columns([5, 1])
+                col1.write(f"{when} · {month_label} · ₹{row['budget']:,} — {crops}")
+                if col2.button("दिखाएं", key=f"history-{row['id']}"):
+                    session_store.save_recommendations(row['result'])
+                    st.rerun()
+    
     # Get Recommendations Button
     if st.button("🚀 फसल सिफारिशें प्राप्त करें", type="primary", use_container_width=True):
         if not location.strip():
             st.error("कृपया अपना स्थान दर्ज करें")
             return
         
-        model = setup_gemini_api()
-        if not model:
-            st.error("Gemini API कनेक्शन समस्या। कृपया अपना इंटरनेट कनेक्शन जांचें।")
-            return
+        # Serve the last answer for these inputs at once and refresh it in the background if stale
+        key = history_store.request_key("hi", location, selected_month, budget, experience, farm_size, organic)
+        
+        def generate():
+            model = setup_gemini_api()
+            if not model:
+                return None
+            return get_crop_recommendations(model, selected_month, location, budget,
+                                            experience, farm_size, organic)
         
-        with st.spinner("🤖 बाजार की स्थिति का विश्लेषण और सिफारिशें तैयार कर रहा हूं..."):
-            recommendations = get_crop_recommendations(model, selected_month, location, budget, 
-                                                     experience, farm_size, organic)
+        def store_result(result):
+            # Fallback cards and salvaged answers are shown once but never served again from history
+            if crop_core.is_complete(result):
+                history.append(result, "hi", location, selected_month, budget,
+                               experience, farm_size, organic, farmer_id=farmer_id)
+        
+        def find_similar():
+            return similar_requests.find_similar(history, "hi", location, selected_month, budget,
+                                                 experience, farm_size, organic)
+        
+        if revalidate.serve_cached(history, key, generate, store_result, find_similar) is None:
+            model = setup_gemini_api()
+            if not model:
+                st.error("Gemini API कनेक्शन समस्या। कृपया अपना इंटरनेट कनेक्शन जांचें।")
+                return
+        
+            with st.spinner("🤖 बाजार की स्थिति का विश्लेषण और सिफारिशें तैयार कर रहा हूं..."):
+                recommendations = get_crop_recommendations(model, selected_month, location, budget, 
+                                                         experience, farm_size, organic)
             
-            if recommendations:
-                st.session_state.recommendations = recommendations
-                st.success("✅ सिफारिशें सफलतापूर्वक तैयार हो गईं!")
-            else:
-                st.error("❌ सिफारिशें तैयार करने में असफल। कृपया पुनः प्रयास करें।")
+                if recommendations:
+                    session_store.save_recommendations(recommendations)
+                    store_result(recommendations)
+                    revalidate.clear_served()
+                    st.success("✅ सिफारिशें सफलतापूर्वक तैयार हो गईं!")
+                else:
+                    st.error("❌ सिफारिशें तैयार करने में असफल। कृपया पुनः प्रयास करें।")
     
     # Display Recommendations
-    if st.session_state.recommendations:
-        recommendations = st.session_state.recommendations
+    revalidate.apply_refresh()
+    recommendations = session_store.load_recommendations()
+    if recommendations:
+        similar = st.session_state.get("served_similar")
+        if similar:
+            st.info(f"🔁 आपके कृषि-जलवायु क्षेत्र के समान अनुरोध ({similar['district'].title()}, ₹{similar['budget']:,}) की सलाह, आपके विवरण के अनुसार बदली गई।")
+        elif st.session_state.get("served_age") is not None:
+            if st.session_state.get("pending_refresh"):
+                st.info(f"🕘 {revalidate.format_age(st.session_state.served_age)} पहले की सहेजी गई सिफारिशें। नई सिफारिशें पृष्ठभूमि में तैयार हो रही हैं…")
+                revalidate.watch_refresh()
+            else:
+                st.info(f"🕘 {revalidate.format_age(st.session_state.served_age)} पहले की सहेजी गई सिफारिशें।")
+        
+        # Start the audio in the background so cards and charts render without waiting; lite mode waits for a tap
+        speech_text = crop_core.speech_text("hi", recommendations)
+        if not lite:
+            speech_job = speak_text(speech_text, lang="hi")
+            crop_jobs = [speak_text(crop_core.crop_speech_text("hi", crop), lang="hi") for crop in recommendations['recommendations']]
+        crop_audio_slots = []
         
         # Summary Metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -282,7 +303,7 @@ def main():
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                display_crop_card(crop, i)
+                display_crop_card(crop, i, location)
             
             with col2:
                 st.markdown(f"### #{i+1}")
@@ -294,6 +315,8 @@ def main():
                     st.markdown("**⚠️ विचारणीय बातें:**")
                     for consideration in crop['considerations']:
                         st.write(f"• {consideration}")
+                    
+                    crop_audio_slots.append(st.container())
         
         # Analysis Tab
         if len(recommendations['recommendations']) > 1:
@@ -311,14 +334,83 @@ def main():
                 else:
                     profit_numeric.append(1)
             
-            fig = px.bar(x=crop_names, y=profit_numeric, title="मुनाफे की तुलना",
-                        labels={'x': 'फसलें', 'y': 'मुनाफे का स्तर'},
-                        color=profit_numeric, color_continuous_scale='Oranges')
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(crop_names, profit_numeric, title="मुनाफे की तुलना", y_label='मुनाफे का स्तर',
+                                                           y_ticks=[(1, 'कम'), (2, 'मध्यम'), (3, 'उच्च')]))
+            else:
+                fig = px.bar(x=crop_names, y=profit_numeric, title="मुनाफे की तुलना",
+                            labels={'x': 'फसलें', 'y': 'मुनाफे का स्तर'},
+                            color=profit_numeric, color_continuous_scale='Oranges')
             
-            fig.update_layout(showlegend=False,
-                            yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
-                                     ticktext=['कम', 'मध्यम', 'उच्च']))
-            st.plotly_chart(fig, use_container_width=True)
+                fig.update_layout(showlegend=False,
+                                yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
+                                         ticktext=['कम', 'मध्यम', 'उच्च']))
+                st.plotly_chart(fig, use_container_width=True)
+        
+        # Expected mandi price in each crop's harvest month, from the local price history
+        harvest = price_trends.harvest_frame(recommendations, location, selected_month)
+        if not harvest.empty:
+            st.subheader("📈 कटाई के समय अनुमानित भाव")
+            harvest['harvest_label'] = [months[m - 1] for m in harvest['harvest_month']]
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(harvest['crop'], harvest['expected'], title="कटाई के महीने में अनुमानित मंडी भाव",
+                                                           y_label='₹ प्रति क्विंटल', low=harvest['low'], high=harvest['high'],
+                                                           markers=harvest['current'], bar_name="कटाई पर", marker_name="अभी",
+                                                           bar_text=harvest['harvest_label']))
+            else:
+                fig = px.bar(harvest, x='crop', y='expected', text='harvest_label', title="कटाई के महीने में अनुमानित मंडी भाव",
+                            error_y=harvest['high'] - harvest['expected'],
+                            error_y_minus=harvest['expected'] - harvest['low'],
+                            labels={'crop': 'फसलें', 'expected': '₹ प्रति क्विंटल'},
+                            color_discrete_sequence=['#FF6B35'])
+                fig.data[0].name = "कटाई पर"
+                fig.add_scatter(x=harvest['crop'], y=harvest['current'], mode='markers', name="अभी",
+                                marker=dict(color='#138808', size=12, symbol='diamond'))
+                fig.update_layout(showlegend=True)
+                st.plotly_chart(fig, use_container_width=True)
+            st.caption("पट्टी: कटाई तक भाव में सामान्य उतार-चढ़ाव। आपके राज्य के दर्ज मंडी भावों पर आधारित।")
+        
+        # Simulated ROI spread and chance of a loss, so the downside is visible next to the estimate
+        risk = roi_simulation.simulate(recommendations, location, selected_month, budget)
+        if risk:
+            st.subheader("🎲 मुनाफे का जोखिम")
+            lite_mode.table(pd.DataFrame([{
+                'फसल': name,
+                'खराब साल ROI': f"{result['roi_percentiles']['p5']:.0f}%",
+                'सामान्य ROI': f"{result['roi_percentiles']['p50']:.0f}%",
+                'अच्छे साल ROI': f"{result['roi_percentiles']['p95']:.0f}%",
+                'नुकसान की संभावना': f"{result['loss_probability']:.0%}",
+                'आपके बजट पर सामान्य मुनाफा': roi_simulation.format_rupees(result['median_profit']),
+            } for name, result in risk.items()]), lite)
+            st.caption(f"हर फसल के {roi_simulation.TRIALS:,} अनुमानित मौसमों से: उपज, लागत और कटाई के भाव स्थानीय आंकड़ों से। खराब और अच्छे साल सबसे खराब और सबसे अच्छे 5% हैं।")
+
+            # Land and budget split across the crops; moving a slider re-solves from cached tables
+            st.subheader("🧮 बजट का बंटवारा")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                acres = st.number_input("🌾 बोने के लिए ज़मीन (एकड़)", min_value=0.5, max_value=1000.0, step=0.5,
+                                        value=budget_optimizer.default_acres("hi", farm_size))
+            with col2:
+                max_share = st.slider("एक फसल को अधिकतम ज़मीन (%)", 20, 100, int(budget_optimizer.DEFAULT_MAX_SHARE * 100), step=5)
+            with col3:
+                max_loss = st.number_input("खराब साल में सहने लायक घाटा (₹)", min_value=0, max_value=10000000, step=1000,
+                                           value=int(budget * budget_optimizer.DEFAULT_MAX_LOSS_SHARE))
+            plan = budget_optimizer.optimize(risk, budget, acres, max_share / 100, max_loss)
+            if plan and plan['crops']:
+                lite_mode.table(pd.DataFrame([{
+                    'फसल': crop['crop'],
+                    'एकड़': crop['acres'],
+                    'ज़मीन का हिस्सा': f"{crop['share']:.0%}",
+                    'निवेश': roi_simulation.format_rupees(crop['investment']),
+                    'अनुमानित मुनाफा': roi_simulation.format_rupees(crop['expected_profit']),
+                    'खराब साल': roi_simulation.format_rupees(crop['worst_case']),
+                } for crop in plan['crops']]), lite)
+                st.caption(f"{acres:g} में से {plan['acres']} एकड़ में {roi_simulation.format_rupees(plan['investment'])} लगाएं: अनुमानित मुनाफा {roi_simulation.format_rupees(plan['expected_profit'])}, हर फसल का साल खराब हो तो {roi_simulation.format_rupees(plan['worst_case'])}।")
+            elif all(result['mean_profit_per_acre'] <= 0 for result in risk.values()):
+                # Leaving all the land fallow is then the best plan, whatever the limits
+                st.warning("इस मौसम में इनमें से किसी फसल से मुनाफे की उम्मीद नहीं है, इसलिए योजना में इनके लिए ज़मीन नहीं रखी गई। दूसरी फसलों के बारे में स्थानीय कृषि विशेषज्ञ से पूछें।")
+            else:
+                st.warning("इस बजट और घाटे की सीमा में कोई बुआई योजना नहीं बनती। घाटे की सीमा बढ़ाएं या कम ज़मीन चुनें।")
         
         # Advice Section
         col1, col2 = st.columns(2)
@@ -333,16 +425,7 @@ def main():
 
         # 👉 Voice Feature
         st.markdown("### 🔊 सिफारिशें सुनें")
-        speech_text = (
-            "यहाँ आपकी फसल सिफारिशें हैं। "
-            + " , ".join([crop['crop_name'] for crop in recommendations['recommendations']])
-            + ". सामान्य सलाह: " + recommendations['general_advice']
-            + ". मौसमी टिप्पणी: " + recommendations['seasonal_notes']
-        )
-        
-        audio_path = speak_text(speech_text, lang="hi")
-        if audio_path:
-            st.audio(audio_path, format="audio/mp3")
+        audio_slot = st.container()
         
         # Additional Tips
         st.markdown("#### 📚 अतिरिक्त सुझाव")
@@ -356,6 +439,20 @@ def main():
         
         for tip in tips:
             st.write(tip)
+        
+        # Attach the audio players now that everything else is on the page
+        if lite:
+            # Keys include the result's store key, so a new answer starts without audio again
+            result_key = st.session_state.recommendations
+            lite_mode.deferred_audio(audio_slot, "🔊 सुनें", f"listen-{result_key}", lambda: speak_text(speech_text, lang="hi"), attach_audio)
+            for i, (crop, slot) in enumerate(zip(recommendations['recommendations'], crop_audio_slots)):
+                lite_mode.deferred_audio(slot, "🔊 सुनें", f"listen-{result_key}-{i}",
+                                         lambda crop=crop: speak_text(crop_core.crop_speech_text("hi", crop), lang="hi"),
+                                         attach_audio, show_timing=False)
+        else:
+            attach_audio(speech_job, audio_slot)
+            for job, slot in zip(crop_jobs, crop_audio_slots):
+                attach_audio(job, slot, show_timing=False)
     
     else:
         # Welcome Section
@@ -378,4 +475,5 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Admin pages (?admin) run in this process, so memory diagnostics measure this app
+    admin_auth.navigation(main, "🌾 फसल मुनाफा सलाहकार")
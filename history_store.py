@@ -0,0 +1,296 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+
+import agro_zones
+import knowledge_base
+import prompts
+import telemetry
+
+DB_PATH = os.getenv("CROP_HISTORY_DB", os.path.join(telemetry.RUNTIME_DIR, "history.db"))
+# Server-side key for farmer id hashes, e.g. CROP_FARMER_ID_KEY=<64 hex characters>; without it one is
+# generated once and kept here, since stored hashes only match while the key stays the same
+FARMER_ID_KEY_PATH = os.path.join(telemetry.RUNTIME_DIR, "farmer_id.key")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    farmer_id TEXT,
+    district TEXT NOT NULL,
+    month INTEGER,
+    language TEXT NOT NULL,
+    budget INTEGER,
+    request_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    profile TEXT,
+    zone INTEGER,
+    prompt_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rec_district ON recommendations (district, language, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_rec_farmer ON recommendations (farmer_id, created_at DESC) WHERE farmer_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_rec_month ON recommendations (month, language, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_rec_request ON recommendations (request_key, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_rec_created ON recommendations (created_at);
+"""
+# Columns added after the first release, and the indexes that need them
+MIGRATIONS = [("profile", "TEXT"), ("zone", "INTEGER"), ("prompt_version", "TEXT")]
+SIMILAR_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_rec_similar ON recommendations (district, month, language, profile, budget);
+CREATE INDEX IF NOT EXISTS idx_rec_zone ON recommendations (zone, month, language, profile, budget);
+"""
+
+
+def normalize_district(location):
+    """First part of the location string, e.g. 'Ludhiana, Punjab' -> 'ludhiana'"""
+    return agro_zones.district_of(location)
+
+
+_farmer_id_key = None
+_key_lock = threading.Lock()
+
+
+def _load_key(path):
+    """Key kept at path, written with a random one by whichever process gets there first"""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            # Linking fails if another process created the key meanwhile; theirs is kept
+            os.link(temp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp)
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip().encode("utf-8")
+
+
+def _farmer_key():
+    global _farmer_id_key
+    with _key_lock:
+        if _farmer_id_key is None:
+            key = os.getenv("CROP_FARMER_ID_KEY")
+            _farmer_id_key = key.encode("utf-8") if key else _load_key(FARMER_ID_KEY_PATH)
+    return _farmer_id_key
+
+
+def hash_farmer_id(farmer_id):
+    """Farmer ids are often phone numbers, so only a keyed hash is stored; a plain hash of one is easily reversed"""
+    farmer_id = (farmer_id or "").strip()
+    if not farmer_id:
+        return None
+    return hmac.new(_farmer_key(), farmer_id.encode("utf-8"), hashlib.sha256).hexdigest()[:24]
+
+
+def profile_key(experience, farm_size, organic):
+    """Farmer profile part of a request; only requests with the same profile are interchangeable"""
+    return hashlib.sha1(json.dumps([experience, farm_size, bool(organic)], ensure_ascii=False)
+                        .encode("utf-8")).hexdigest()[:16]
+
+
+def request_key(language, location, month, budget, experience, farm_size, organic):
+    """Stable key for one set of form inputs under the active prompt version"""
+    # A reworded prompt gives new keys, so answers to the old wording are not served for it
+    parts = [language, normalize_district(location), knowledge_base.month_number(month) or month,
+             budget, experience, farm_size, bool(organic), prompts.version(language)]
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class HistoryStore:
+    """Append-only recommendation history with indexed lookups.
+
+    Writes are queued and committed by a background thread so the request
+    path never waits on disk. Reads use a per-thread connection.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _connect(path) as conn:
+            conn.executescript(SCHEMA)
+            # Databases created before these columns existed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(recommendations)")}
+            for column, column_type in MIGRATIONS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE recommendations ADD COLUMN {column} {column_type}")
+            if "zone" not in columns:
+                districts = [row[0] for row in conn.execute("SELECT DISTINCT district FROM recommendations")]
+                conn.executemany("UPDATE recommendations SET zone = ? WHERE district = ?",
+                                 [(agro_zones.zone_for(d), d) for d in districts])
+            conn.executescript(SIMILAR_INDEXES)
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            rows = [self._queue.get()]
+            # Drain whatever else is waiting and commit it as one transaction
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO recommendations (created_at, farmer_id, district, month, language, "
+                        "budget, request_key, payload, profile, zone, prompt_version) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+            except sqlite3.Error as e:
+                telemetry.record("history_write_error", error=str(e), rows=len(rows))
+            for _ in rows:
+                self._queue.task_done()
+
+    def append(self, result, language, location, month, budget, experience, farm_size, organic, farmer_id=None):
+        """Queue a generated recommendation for storage without blocking"""
+        self._queue.put((
+            time.time(),
+            hash_farmer_id(farmer_id),
+            normalize_district(location),
+            knowledge_base.month_number(month),
+            language,
+            int(budget),
+            request_key(language, location, month, budget, experience, farm_size, organic),
+            json.dumps(result, ensure_ascii=False),
+            profile_key(experience, farm_size, organic),
+            agro_zones.zone_for(location),
+            prompts.version(language),
+        ))
+
+    def flush(self):
+        """Wait until every queued write is committed"""
+        self._queue.join()
+
+    def _rows(self, sql, params):
+        start = time.perf_counter()
+        rows = self._reader().execute(sql, params).fetchall()
+        telemetry.record("stage", stage="history_lookup", duration_ms=round((time.perf_counter() - start) * 1000, 3))
+        return [
+            {"id": row["id"], "created_at": row["created_at"], "district": row["district"],
+             "month": row["month"], "language": row["language"], "budget": row["budget"], "zone": row["zone"],
+             "result": json.loads(row["payload"])}
+            for row in rows
+        ]
+
+    def recent_for_farmer(self, farmer_id, language, limit=5):
+        """Most recent results for one farmer in one language"""
+        hashed = hash_farmer_id(farmer_id)
+        if not hashed:
+            return []
+        return self._rows(
+            "SELECT * FROM recommendations WHERE farmer_id = ? AND language = ? ORDER BY created_at DESC LIMIT ?",
+            (hashed, language, limit)
+        )
+
+    def recent_for_district(self, district, language, limit=5):
+        """Most recent results for a district in one language"""
+        return self._rows(
+            "SELECT * FROM recommendations WHERE district = ? AND language = ? ORDER BY created_at DESC LIMIT ?",
+            (normalize_district(district), language, limit)
+        )
+
+    def latest_for_request(self, key):
+        """Newest stored result for exactly these form inputs, or None"""
+        rows = self._rows(
+            "SELECT * FROM recommendations WHERE request_key = ? ORDER BY created_at DESC LIMIT 1",
+            (key,)
+        )
+        return rows[0] if rows else None
+
+    def nearest_similar(self, language, location, month, profile, low, high, budget, since=0):
+        """Closest result for the same zone (or district, if the zone is unknown), month, profile and prompt.
+
+        Candidates need a budget within [low, high]. The requester's own
+        district is preferred, then the closest budget, then the newest.
+        """
+        district = normalize_district(location)
+        zone = agro_zones.zone_for(location)
+        region_sql, region = ("zone = ?", zone) if zone is not None else ("district = ?", district)
+        rows = self._rows(
+            f"SELECT * FROM recommendations WHERE {region_sql} AND month = ? AND language = ? AND profile = ? "
+            "AND budget BETWEEN ? AND ? AND created_at >= ? AND prompt_version = ? "
+            "ORDER BY district = ? DESC, ABS(budget - ?), created_at DESC LIMIT 1",
+            (region, knowledge_base.month_number(month), language, profile, low, high, since,
+             prompts.version(language), district, budget)
+        )
+        return rows[0] if rows else None
+
+    def recent(self, language, location, farmer_id=None, limit=5):
+        """Farmer's own history when an id is given, otherwise the district's"""
+        if hash_farmer_id(farmer_id):
+            return self.recent_for_farmer(farmer_id, language, limit)
+        if normalize_district(location):
+            return self.recent_for_district(location, language, limit)
+        return []
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Single history store per server process"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+    return _store
+
+
+if __name__ == "__main__":
+    # Lookup benchmark: python history_store.py 100000
+    import random
+    import tempfile
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(tempfile.mkdtemp(), "history_bench.db")
+    store = HistoryStore(path)
+    districts = [f"district-{i}" for i in range(600)]
+    payload = {"recommendations": [{"crop_name": "Wheat"}], "general_advice": "", "seasonal_notes": ""}
+    start = time.perf_counter()
+    for i in range(count):
+        store.append(payload, random.choice(["en", "hi", "or"]), random.choice(districts),
+                     random.choice(knowledge_base.MONTH_NAMES[0]), 50000, "New Farmer", "Small", False,
+                     farmer_id=str(9000000000 + i % 5000))
+    store.flush()
+    print(f"Inserted {count} rows in {time.perf_counter() - start:.2f} s")
+
+    for label, lookup in [("farmer", lambda: store.recent_for_farmer(str(9000000000 + random.randrange(5000)), "en")),
+                          ("district", lambda: store.recent_for_district(random.choice(districts), "hi"))]:
+        timings = []
+        for _ in range(500):
+            start = time.perf_counter()
+            lookup()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"{label} lookup: p50 {timings[250]:.3f} ms, p99 {timings[494]:.3f} ms")
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+import telemetry
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "agronomy_notes.json")
+INDEX_DIR = os.getenv("CROP_KB_INDEX_DIR", os.path.join(telemetry.RUNTIME_DIR, "kb_index"))
+EMBEDDING_DIM = 1024
+
+# Month names as they appear in the English, Hindi and Odia apps
+MONTH_NAMES = [
+    ['January', 'February', 'March', 'April', 'May', 'June',
+     'July', 'August', 'September', 'October', 'November', 'December'],
+    ['जनवरी', 'फरवरी', 'मार्च', 'अप्रैल', 'मई', 'जून',
+     'जुलाई', 'अगस्त', 'सितंबर', 'अक्टूबर', 'नवंबर', 'दिसंबर'],
+    ['ଜାନୁଆରୀ', 'ଫେବୃଆରୀ', 'ମାର୍ଚ୍ଚ', 'ଏପ୍ରିଲ୍', 'ମଇ', 'ଜୁନ୍',
+     'ଜୁଲାଇ', 'ଅଗଷ୍ଟ', 'ସେପ୍ଟେମ୍ବର', 'ଅକ୍ଟୋବର', 'ନଭେମ୍ବର', 'ଡିସେମ୍ବର'],
+]
+
+# State spellings farmers type into the location box
+STATE_ALIASES = {
+    "punjab": ["punjab", "पंजाब", "ପଞ୍ଜାବ"],
+    "haryana": ["haryana", "हरियाणा", "ହରିୟାଣା"],
+    "uttar pradesh": ["uttar pradesh", "u.p.", "उत्तर प्रदेश", "ଉତ୍ତର ପ୍ରଦେଶ"],
+    "uttarakhand": ["uttarakhand", "उत्तराखंड"],
+    "himachal pradesh": ["himachal", "हिमाचल"],
+    "jammu and kashmir": ["jammu", "kashmir", "जम्मू", "कश्मीर"],
+    "rajasthan": ["rajasthan", "राजस्थान", "ରାଜସ୍ଥାନ"],
+    "gujarat": ["gujarat", "गुजरात", "ଗୁଜୁରାଟ"],
+    "maharashtra": ["maharashtra", "महाराष्ट्र", "ମହାରାଷ୍ଟ୍ର"],
+    "madhya pradesh": ["madhya pradesh", "m.p.", "मध्य प्रदेश", "ମଧ୍ୟ ପ୍ରଦେଶ"],
+    "chhattisgarh": ["chhattisgarh", "छत्तीसगढ़", "ଛତିଶଗଡ଼"],
+    "bihar": ["bihar", "बिहार", "ବିହାର"],
+    "jharkhand": ["jharkhand", "झारखंड", "ଝାଡ଼ଖଣ୍ଡ"],
+    "west bengal": ["west bengal", "bengal", "पश्चिम बंगाल", "ପଶ୍ଚିମବଙ୍ଗ"],
+    "odisha": ["odisha", "orissa", "ओडिशा", "उड़ीसा", "ଓଡ଼ିଶା", "ଓଡିଶା"],
+    "andhra pradesh": ["andhra", "आंध्र प्रदेश", "ଆନ୍ଧ୍ର"],
+    "telangana": ["telangana", "तेलंगाना"],
+    "karnataka": ["karnataka", "कर्नाटक"],
+    "tamil nadu": ["tamil nadu", "तमिलनाडु"],
+    "kerala": ["kerala", "केरल"],
+    "goa": ["goa", "गोवा"],
+    "assam": ["assam", "असम"],
+    "meghalaya": ["meghalaya"],
+    "tripura": ["tripura"],
+    "manipur": ["manipur"],
+    "mizoram": ["mizoram"],
+    "nagaland": ["nagaland"],
+    "arunachal pradesh": ["arunachal"],
+    "sikkim": ["sikkim"],
+    "puducherry": ["puducherry", "pondicherry"],
+}
+
+# \w misses Devanagari and Odia vowel signs, so those blocks count as letters for word boundaries
+_LETTER = r"\w\u0900-\u0DFF"
+_STATE_PATTERNS = [
+    (state, re.compile(rf"(?<![{_LETTER}])(?:{'|'.join(re.escape(alias) for alias in aliases)})(?![{_LETTER}])"))
+    for state, aliases in STATE_ALIASES.items()
+]
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_index = None
+_index_lock = threading.Lock()
+last_stats = {}
+
+
+def month_number(month):
+    """Return 1-12 for a month name in any of the app languages, or None"""
+    for names in MONTH_NAMES:
+        if month in names:
+            return names.index(month) + 1
+    return None
+
+
+def detect_state(location):
+    """Find the Indian state mentioned in a free-text location.
+
+    Aliases must stand as whole words ("Bengaluru" is not Bengal, nor
+    "Goalpara" Goa), and the comma-separated parts are tried from the
+    last, where the state usually is, to the first.
+    """
+    for part in reversed((location or "").lower().split(",")):
+        for state, pattern in _STATE_PATTERNS:
+            if pattern.search(part):
+                return state
+    return None
+
+
+def _features(text):
+    """Words plus character trigrams, so spelling variants still overlap"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    feats = list(tokens)
+    for token in tokens:
+        padded = f"#{token}#"
+        feats.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return feats
+
+
+def _bucket(feature):
+    """Stable hash of a feature into the embedding dimension"""
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % EMBEDDING_DIM
+
+
+def _term_counts(texts):
+    """Sparse feature counts for each text as a dense float32 matrix"""
+    counts = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        buckets = [_bucket(f) for f in _features(text)]
+        if buckets:
+            np.add.at(counts[row], buckets, 1.0)
+    return counts
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _corpus_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def build_index(corpus_path=CORPUS_PATH, index_dir=INDEX_DIR):
+    """Embed every passage of the corpus and write the index to disk"""
+    with open(corpus_path, encoding="utf-8") as f:
+        passages = json.load(f)
+
+    texts = [f"{p['title']}. {' '.join(p['states'])}. {p['text']}" for p in passages]
+    counts = _term_counts(texts)
+
+    # Sublinear TF-IDF weighting
+    doc_freq = np.count_nonzero(counts, axis=0)
+    idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+    embeddings = _normalize(np.log1p(counts) * idf).astype(np.float32)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(index_dir, "idf.npy"), idf)
+
+    meta = {
+        "corpus_hash": _corpus_hash(corpus_path),
+        "passages": [
+            {"id": p["id"], "title": p["title"], "states": p["states"],
+             "months": p["months"], "text": p["text"]}
+            for p in passages
+        ],
+    }
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return len(passages)
+
+
+def load_index(corpus_path=CORPUS_PATH, index_dir=INDEX_DIR):
+    """Load the on-disk index, rebuilding it when the corpus has changed"""
+    global _index
+    if _index is not None:
+        return _index
+    # Prompts are built on several threads; only the first may build and load the index
+    with _index_lock:
+        if _index is None:
+            _index = _load_index(corpus_path, index_dir)
+    return _index
+
+
+def _load_index(corpus_path, index_dir):
+    meta_path = os.path.join(index_dir, "meta.json")
+    needs_build = not os.path.exists(meta_path)
+    if not needs_build:
+        with open(meta_path, encoding="utf-8") as f:
+            needs_build = json.load(f).get("corpus_hash") != _corpus_hash(corpus_path)
+    if needs_build:
+        build_index(corpus_path, index_dir)
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    # Embeddings stay memory-mapped; only the pages we touch are read
+    embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+    idf = np.load(os.path.join(index_dir, "idf.npy"))
+    passages = meta["passages"]
+
+    return {
+        "embeddings": embeddings,
+        "idf": idf,
+        "passages": passages,
+        "states": [set(p["states"]) for p in passages],
+        "months": [set(p["months"]) for p in passages],
+    }
+
+
+def index_memory_bytes(index=None):
+    """Approximate memory footprint of the loaded index"""
+    index = index or load_index()
+    passage_bytes = sum(sys.getsizeof(p["text"]) + sys.getsizeof(p["title"]) for p in index["passages"])
+    return int(index["embeddings"].nbytes + index["idf"].nbytes + passage_bytes)
+
+
+def retrieve(location, month, k=3):
+    """Return the top-k agronomy passages for a location and month"""
+    start = time.perf_counter()
+    index = load_index()
+
+    month_no = month_number(month)
+    state = detect_state(location)
+    english_month = MONTH_NAMES[0][month_no - 1] if month_no else month
+    query = f"{location} {state or ''} {english_month} sowing crops"
+
+    query_vec = _normalize(np.log1p(_term_counts([query])) * index["idf"])[0]
+    scores = np.asarray(index["embeddings"] @ query_vec)
+
+    # Passages tagged for the same state or month are what the farmer needs
+    state_match = np.array([state is not None and state in s for s in index["states"]], dtype=np.float32)
+    month_match = np.array([month_no in m for m in index["months"]], dtype=np.float32)
+    general = np.array([not s for s in index["states"]], dtype=np.float32)
+    scores = scores + 0.5 * state_match + 0.3 * month_match + 0.1 * general * month_match
+
+    top = np.argsort(-scores)[:k]
+    results = [index["passages"][i] for i in top if scores[i] > 0]
+
+    latency_ms = (time.perf_counter() - start) * 1000
+    last_stats.update({
+        "latency_ms": round(latency_ms, 3),
+        "index_bytes": index_memory_bytes(index),
+        "passages": len(index["passages"]),
+        "k": k,
+    })
+    telemetry.record("stage", stage="retrieval", duration_ms=round(latency_ms, 3),
+                     index_bytes=last_stats["index_bytes"], k=k, state=state)
+    return results
+
+
+def format_context(passages):
+    """Render retrieved passages as a compact bullet list for the prompt"""
+    return "\n".join(f"- {p['title']}: {p['text']}" for p in passages)
+
+
+if __name__ == "__main__":
+    # Usage: python knowledge_base.py build | python knowledge_base.py "Ludhiana, Punjab" November
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        count = build_index()
+        print(f"Indexed {count} passages into {INDEX_DIR}")
+    else:
+        location = sys.argv[1] if len(sys.argv) > 1 else "Punjab"
+        month = sys.argv[2] if len(sys.argv) > 2 else "November"
+        for passage in retrieve(location, month):
+            print(f"[{passage['id']}] {passage['title']}")
+        print(f"Retrieval latency: {last_stats['latency_ms']:.3f} ms")
+        print(f"Index memory: {last_stats['index_bytes'] / 1024:.1f} KiB "
+              f"({last_stats['passages']} passages, dim {EMBEDDING_DIM})")
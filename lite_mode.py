@@ -0,0 +1,208 @@
+import base64
+import gzip
+import html
+import math
+import os
+import re
+import sys
+
+import streamlit as st
+
+# Effective connection types (the ECT client hint) that get the lite page without asking
+SLOW_CONNECTION_TYPES = ("slow-2g", "2g", "3g")
+# Below this downlink the full page's plotly bundle alone takes several seconds to arrive
+SLOW_DOWNLINK_MBPS = 1.5
+BAR_COLOR = "#FF6B35"
+MARKER_COLOR = "#138808"
+CHART_WIDTH, CHART_HEIGHT = 640, 320
+
+
+def connection_hint():
+    """True or False from ?lite=, the Save-Data header or the ECT/Downlink client hints; None without a hint"""
+    choice = st.query_params.get("lite")
+    if choice in ("1", "0"):
+        return choice == "1"
+    headers = st.context.headers
+    if headers.get("Save-Data", "").lower() == "on":
+        return True
+    # Browsers only send these client hints when they support them
+    if headers.get("ECT") in SLOW_CONNECTION_TYPES:
+        return True
+    try:
+        return float(headers.get("Downlink")) < SLOW_DOWNLINK_MBPS
+    except (TypeError, ValueError):
+        return None
+
+
+def enabled(label, help=None):
+    """Lite-mode toggle for this session, switched on by default when the connection looks slow"""
+    if "lite_mode" not in st.session_state:
+        st.session_state.lite_mode = bool(connection_hint())
+    return st.toggle(label, key="lite_mode", help=help)
+
+
+def _nice_step(span, ticks=4):
+    raw = span / ticks
+    magnitude = 10 ** math.floor(math.log10(raw)) if raw > 0 else 1
+    return next(step * magnitude for step in (1, 2, 2.5, 5, 10) if step * magnitude >= raw)
+
+
+def svg_bar_chart(labels, values, title="", y_label="", low=None, high=None, markers=None, marker_name=None,
+                  bar_name=None, bar_text=None, y_ticks=None):
+    """Static SVG bar chart with optional error bars and point markers, a few KB instead of plotly.js.
+
+    low/high give the error bar ends per bar, markers a second value per
+    bar drawn as a diamond, and y_ticks a list of (value, label) pairs to
+    use instead of numeric ticks.
+    """
+    # Accept lists or pandas columns; columns are read by position, not index label
+    labels, values = list(labels), [float(v) for v in values]
+    low, high, markers = [None if series is None else [float(v) for v in series] for series in (low, high, markers)]
+    left, right, top, bottom = 70, 20, 40 if title else 16, 56
+    plot_width, plot_height = CHART_WIDTH - left - right, CHART_HEIGHT - top - bottom
+    peak = max(values + (high or []) + (markers or []) + [0]) or 1
+    if y_ticks is None:
+        step = _nice_step(peak * 1.1)
+        y_ticks = [(step * i, f"{step * i:,.0f}") for i in range(int(peak * 1.1 // step) + 2)]
+    top_value = max(value for value, _ in y_ticks)
+
+    def y(value):
+        return top + plot_height * (1 - value / top_value)
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {CHART_WIDTH} {CHART_HEIGHT}" '
+             f'font-family="sans-serif" font-size="12">']
+    if title:
+        parts.append(f'<text x="{left}" y="22" font-size="15" font-weight="bold">{html.escape(title)}</text>')
+    for value, text in y_ticks:
+        parts.append(f'<line x1="{left}" x2="{CHART_WIDTH - right}" y1="{y(value):.1f}" y2="{y(value):.1f}" stroke="#ddd"/>'
+                     f'<text x="{left - 6}" y="{y(value) + 4:.1f}" text-anchor="end">{html.escape(text)}</text>')
+    if y_label:
+        parts.append(f'<text transform="translate(14 {top + plot_height / 2:.0f}) rotate(-90)" text-anchor="middle">'
+                     f'{html.escape(y_label)}</text>')
+    slot = plot_width / max(len(values), 1)
+    for i, (label, value) in enumerate(zip(labels, values)):
+        x = left + slot * i + slot * 0.2
+        width = slot * 0.6
+        center = x + width / 2
+        parts.append(f'<rect x="{x:.1f}" y="{y(value):.1f}" width="{width:.1f}" height="{y(0) - y(value):.1f}" fill="{BAR_COLOR}"/>')
+        if low is not None and high is not None:
+            parts.append(f'<path d="M{center:.1f} {y(low[i]):.1f}V{y(high[i]):.1f}M{center - 6:.1f} {y(low[i]):.1f}h12'
+                         f'M{center - 6:.1f} {y(high[i]):.1f}h12" stroke="#333" stroke-width="1.5"/>')
+        if bar_text is not None:
+            parts.append(f'<text x="{center:.1f}" y="{y(value) + 16:.1f}" text-anchor="middle" fill="#fff">'
+                         f'{html.escape(str(bar_text[i]))}</text>')
+        if markers is not None:
+            my = y(markers[i])
+            parts.append(f'<path d="M{center:.1f} {my - 7:.1f}l7 7-7 7-7-7z" fill="{MARKER_COLOR}"/>')
+        parts.append(f'<text x="{center:.1f}" y="{CHART_HEIGHT - bottom + 18}" text-anchor="middle">{html.escape(str(label))}</text>')
+    legend = [(name, color) for name, color in ((bar_name, BAR_COLOR), (marker_name, MARKER_COLOR)) if name]
+    for i, (name, color) in enumerate(legend):
+        x = left + i * 140
+        parts.append(f'<rect x="{x}" y="{CHART_HEIGHT - 22}" width="12" height="12" fill="{color}"/>'
+                     f'<text x="{x + 18}" y="{CHART_HEIGHT - 12}">{html.escape(name)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def show_svg(svg):
+    """Inline an SVG as an image, so no chart library is sent to the browser"""
+    encoded = base64.b64encode(svg.encode("utf-8")).decode("ascii")
+    st.markdown(f'<img src="data:image/svg+xml;base64,{encoded}" style="width:100%;max-width:{CHART_WIDTH}px"/>',
+                unsafe_allow_html=True)
+
+
+def table(frame, lite):
+    """Plain HTML table in lite mode; the interactive grid and its script otherwise"""
+    if lite:
+        # st.table takes no hide_index on the oldest supported Streamlit, so the first column (the crop) is the index
+        st.table(frame.set_index(frame.columns[0]))
+    else:
+        st.dataframe(frame, hide_index=True, use_container_width=True)
+
+
+def deferred_audio(slot, label, key, start_job, attach, **kwargs):
+    """A button that synthesizes and attaches audio only once pressed; it stays attached on later reruns"""
+    played = f"{key}-requested"
+    if slot.button(label, key=key):
+        st.session_state[played] = True
+    if st.session_state.get(played):
+        attach(start_job(), slot, **kwargs)
+
+
+def _static_imports(js_dir, name, seen=None):
+    """A frontend chunk and every chunk it imports statically"""
+    seen = set() if seen is None else seen
+    if name in seen:
+        return seen
+    seen.add(name)
+    with open(os.path.join(js_dir, name), encoding="utf-8", errors="ignore") as f:
+        source = f.read()
+    for child in re.findall(r'(?:from|import)\s*"\./([\w.-]+\.js)"', source):
+        _static_imports(js_dir, child, seen)
+    return seen
+
+
+def frontend_bytes(element_types):
+    """Gzipped bytes of the lazily loaded frontend chunks the given element types need beyond the page shell"""
+    static = os.path.join(os.path.dirname(st.__file__), "static")
+    js_dir = os.path.join(static, "static", "js")
+    with open(os.path.join(static, "index.html"), encoding="utf-8") as f:
+        entry = re.search(r'static/js/(index\.[\w-]+\.js)', f.read()).group(1)
+    shell = _static_imports(js_dir, entry)
+    chunk_prefix = {"plotly_chart": "PlotlyChart.", "dataframe": "DataFrame.", "table": "Table.", "audio": "Audio."}
+    needed = set()
+    for element_type in element_types:
+        prefix = chunk_prefix.get(element_type)
+        for name in os.listdir(js_dir) if prefix else []:
+            if name.startswith(prefix) and name.endswith(".js"):
+                needed |= _static_imports(js_dir, name)
+    total = 0
+    for name in needed - shell:
+        with open(os.path.join(js_dir, name), "rb") as f:
+            total += len(gzip.compress(f.read()))
+    return total
+
+
+if __name__ == "__main__":
+    # Page weight of one recommendation flow, full vs lite: python lite_mode.py [english.py] [port]
+    import urllib.error
+
+    import loadtest
+
+    def media_bytes(user):
+        """Bytes of the audio the browser would fetch; a first segment replaced by its full track is gone"""
+        total = 0
+        for element in user.find("audio", lambda e: e.url):
+            try:
+                total += len(user.fetch(element.url))
+            except urllib.error.HTTPError:
+                pass
+        return total
+
+    app = sys.argv[1] if len(sys.argv) > 1 else "english.py"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8597
+    server = loadtest.start_server(os.path.join(os.path.dirname(os.path.abspath(__file__)), app), port, 0.0, 0.0)
+    try:
+        rows = []
+        for label, query, listen in (("full", "lite=0", False), ("lite", "lite=1", False),
+                                     ("lite + play", "lite=1", True)):
+            user = loadtest.SimulatedUser(f"http://127.0.0.1:{port}", query_string=query)
+            user.rerun()
+            user.values[user.find("text_input")[0].id] = ("string_value", "Ludhiana, Punjab")
+            user.rerun()
+            user.rerun(trigger=user.find("button", lambda e: "🚀" in e.label)[0].id)
+            element_types = {element_type for element_type, _ in user.elements}
+            if listen:
+                # The summary track, the last play button on the page
+                user.rerun(trigger=user.find("button", lambda e: "🔊" in e.label)[-1].id)
+                element_types |= {element_type for element_type, _ in user.elements}
+            rows.append((label, user.ws.received, frontend_bytes(element_types), media_bytes(user)))
+            user.ws.close()
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{'mode':>12} {'websocket':>11} {'lazy JS (gzip)':>15} {'audio':>9} {'total':>11}")
+    for label, websocket, chunks, audio in rows:
+        print(f"{label:>12} {websocket:>11,} {chunks:>15,} {audio:>9,} {websocket + chunks + audio:>11,}")
+    print("The page shell (index.html and its scripts) is the same in both modes and not counted; "
+          "audio comes from the stub TTS engine.")
@@ -0,0 +1,296 @@
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+LOCATIONS = ["Ludhiana, Punjab", "Nashik, Maharashtra", "Cuttack, Odisha", "Patna, Bihar", "Guntur, Andhra Pradesh",
+             "Indore, Madhya Pradesh", "Karnal, Haryana", "Mysuru, Karnataka", "Bardhaman, West Bengal", "Jaipur, Rajasthan"]
+BUDGETS = [25000, 50000, 55000, 100000, 200000]
+SERVER_START_TIMEOUT = 60
+# Settings that point at state outside the server's runtime directory, dropped for the test server
+ISOLATED_ENV = ("CROP_HISTORY_DB", "CROP_CACHE_BACKEND", "CROP_CACHE_URL", "CROP_CACHE_DB", "CROP_ADVISOR_TELEMETRY_LOG",
+                "CROP_CASSETTE", "CROP_CASSETTE_MODE")
+
+
+class WebSocket:
+    """Just enough of a blocking RFC 6455 client to talk to a Streamlit server"""
+
+    def __init__(self, host, port, path):
+        self.sock = socket.create_connection((host, port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\nSec-WebSocket-Protocol: streamlit\r\n\r\n"
+        ).encode())
+        self.reader = self.sock.makefile("rb")
+        status = self.reader.readline()
+        if b" 101 " not in status:
+            raise ConnectionError(f"Websocket upgrade refused: {status!r}")
+        while self.reader.readline() not in (b"\r\n", b""):
+            pass
+        # Payload bytes received, for page-weight measurements
+        self.received = 0
+
+    def send(self, data, opcode=2):
+        # Client frames must be masked
+        mask = os.urandom(4)
+        length = len(data)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 0x80 | 127, length)
+        masked = (np.frombuffer(data, dtype=np.uint8) ^ np.resize(np.frombuffer(mask, dtype=np.uint8), length)).tobytes()
+        self.sock.sendall(header + mask + masked)
+
+    def recv(self):
+        message = b""
+        while True:
+            first, second = self.reader.read(2)
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", self.reader.read(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", self.reader.read(8))[0]
+            payload = self.reader.read(length)
+            opcode = first & 0x0F
+            if opcode == 9:
+                self.send(payload, opcode=10)
+                continue
+            if opcode == 8:
+                raise ConnectionError("Server closed the websocket")
+            message += payload
+            self.received += len(payload)
+            if first & 0x80:
+                return message
+
+    def close(self):
+        self.sock.close()
+
+
+class SimulatedUser:
+    """One browser session: keeps widget values and reruns the script like the frontend does"""
+
+    def __init__(self, base_url, query_string=""):
+        parsed = urlparse(base_url)
+        self.query_string = query_string
+        self.base_url = base_url.rstrip("/")
+        self.ws = WebSocket(parsed.hostname, parsed.port or 80, "/_stcore/stream")
+        self.values = {}
+        self.elements = []
+
+    def rerun(self, trigger=None):
+        """Send widget state, wait for the script to finish and return the rendered elements"""
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.widget_states.SetInParent()
+        for widget_id, (field, value) in self.values.items():
+            state = msg.rerun_script.widget_states.widgets.add(id=widget_id)
+            setattr(state, field, value)
+        if trigger:
+            msg.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+        self.ws.send(msg.SerializeToString())
+
+        elements = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                elements.append((element.WhichOneof("type"), getattr(element, element.WhichOneof("type"))))
+            elif kind == "script_finished":
+                self.elements = elements
+                return elements
+
+    def find(self, element_type, predicate=lambda e: True):
+        return [e for t, e in self.elements if t == element_type and predicate(e)]
+
+    def fetch(self, url):
+        with urllib.request.urlopen(self.base_url + url, timeout=60) as response:
+            return response.read()
+
+
+class Recorder:
+    """Latencies per step from all simulated users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = []
+
+    def timed(self, step, action):
+        start = time.perf_counter()
+        try:
+            result = action()
+        except Exception as e:
+            with self.lock:
+                self.errors.append(f"{step}: {e!r}")
+            return None
+        with self.lock:
+            self.latencies.setdefault(step, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+
+def user_flow(base_url, recorder, iterations, think_time, seed):
+    """Open the page, enter a location and budget, ask, play the audio and revisit history"""
+    rng = random.Random(seed)
+    try:
+        user = SimulatedUser(base_url)
+    except OSError as e:
+        with recorder.lock:
+            recorder.errors.append(f"connect: {e!r}")
+        return
+    try:
+        recorder.timed("open", user.rerun)
+        for _ in range(iterations):
+            location, budget = user.find("text_input")[0], user.find("number_input")[0]
+            time.sleep(rng.uniform(0, think_time))
+            user.values[location.id] = ("string_value", rng.choice(LOCATIONS))
+            recorder.timed("location", user.rerun)
+            user.values[budget.id] = ("int_value", rng.choice(BUDGETS))
+            recorder.timed("budget", user.rerun)
+
+            time.sleep(rng.uniform(0, think_time))
+            ask = user.find("button", lambda e: "🚀" in e.label)
+            if ask:
+                recorder.timed("recommend", lambda: user.rerun(trigger=ask[0].id))
+            # Audio plays in the browser; the server's part is serving the media file
+            audio = user.find("audio", lambda e: e.url)
+            if audio:
+                recorder.timed("audio", lambda: user.fetch(audio[0].url))
+
+            # Expanders open client-side; their history buttons are what rerun the script
+            history = user.find("button", lambda e: "history-" in e.id)
+            if history:
+                time.sleep(rng.uniform(0, think_time))
+                recorder.timed("history", lambda: user.rerun(trigger=rng.choice(history).id))
+    finally:
+        user.ws.close()
+
+
+def process_usage(pid):
+    """CPU seconds, current RSS and peak RSS (MiB) of a process, read from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    memory = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS", "VmHWM")):
+                name, value = line.split(":")
+                memory[name] = int(value.split()[0]) / 1024
+    return cpu, memory.get("VmRSS", 0), memory.get("VmHWM", 0)
+
+
+def start_server(app, port, model_latency, tts_latency):
+    """Run the page under streamlit with the stub model and stub speech"""
+    # Stub answers must never reach a real deployment's history, shared cache, telemetry or cassettes
+    env = {name: value for name, value in os.environ.items() if name not in ISOLATED_ENV}
+    env.update(CROP_STUB_MODEL="1", CROP_STUB_LATENCY=str(model_latency),
+               CROP_STUB_TTS="1", CROP_STUB_TTS_LATENCY=str(tts_latency),
+               GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "stub"),
+               CROP_ADVISOR_RUNTIME_DIR=tempfile.mkdtemp(prefix="crop-loadtest-"), CROP_CACHE_BACKEND="sqlite")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true", "--server.port", str(port),
+         "--global.developmentMode", "false", "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("Streamlit server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent farmers against a Streamlit page")
+    parser.add_argument("--app", default="english.py", help="page to serve, e.g. hindi.py")
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=2, help="recommendation flows per user")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users arrive")
+    parser.add_argument("--think", type=float, default=1.0, help="maximum think time between steps, seconds")
+    parser.add_argument("--model-latency", type=float, default=1.0, help="stub model delay, seconds")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="stub speech delay per chunk, seconds")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        app = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.app)
+        server = start_server(app, args.port, args.model_latency, args.tts_latency)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        # Warm up imports and caches so the first user does not pay for them
+        warmup = SimulatedUser(base_url)
+        warmup.rerun()
+        warmup.ws.close()
+        usage_before = process_usage(server.pid) if server else None
+        recorder = Recorder()
+        start = time.perf_counter()
+        users = []
+        for i in range(args.users):
+            user = threading.Thread(target=user_flow, args=(base_url, recorder, args.iterations, args.think, i))
+            user.start()
+            users.append(user)
+            time.sleep(args.ramp / max(args.users, 1))
+        for user in users:
+            user.join()
+        wall = time.perf_counter() - start
+        usage_after = process_usage(server.pid) if server else None
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    reruns = sum(len(v) for step, v in recorder.latencies.items() if step != "audio")
+    results = {"users": args.users, "iterations": args.iterations, "wall_seconds": round(wall, 2),
+               "reruns_per_second": round(reruns / wall, 2), "errors": recorder.errors, "steps": {}}
+    print(f"{args.users} users x {args.iterations} flows on {args.app}: {reruns} reruns in {wall:.1f} s "
+          f"-> {reruns / wall:.2f} reruns/s, {args.users * args.iterations / wall:.2f} flows/s")
+    print(f"{'step':>10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    all_reruns = [x for step, v in recorder.latencies.items() if step != "audio" for x in v]
+    for step, values in list(recorder.latencies.items()) + [("reruns", all_reruns)]:
+        if not values:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        results["steps"][step] = {"count": len(values), "p50": p50, "p95": p95, "p99": p99, "max": max(values)}
+        print(f"{step:>10} {len(values):>6} {p50:>9.0f} {p95:>9.0f} {p99:>9.0f} {max(values):>9.0f}")
+    if usage_before:
+        cpu = usage_after[0] - usage_before[0]
+        results.update(server_cpu_cores=round(cpu / wall, 2), server_rss_mib=round(usage_after[1]),
+                       server_peak_rss_mib=round(usage_after[2]))
+        print(f"server CPU {cpu:.1f} s ({cpu / wall:.2f} cores on average); "
+              f"RSS {usage_before[1]:.0f} MiB after warm-up, {usage_after[1]:.0f} MiB at end, "
+              f"{usage_after[2]:.0f} MiB peak")
+    print(f"{len(recorder.errors)} errors" + "".join(f"\n  {e}" for e in recorder.errors[:10]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
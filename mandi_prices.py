@@ -0,0 +1,349 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import agro_zones
+import knowledge_base
+import telemetry
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    # What reading a damaged or half-written file in the store raises
+    READ_ERRORS = (OSError, pa.ArrowException)
+except ImportError:
+    # Without pyarrow the cards simply show the model's market rate
+    pa = None
+    READ_ERRORS = (OSError,)
+
+# Parquet files partitioned as commodity=<slug>/state=<slug>/, plus index.parquet
+PRICE_DIR = os.getenv("CROP_MANDI_DIR", os.path.join(telemetry.RUNTIME_DIR, "mandi"))
+COMMODITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mandi_commodities.json")
+# Prices older than this (before the newest arrival in the market) are not part of "recent"
+RECENT_DAYS = int(os.getenv("CROP_MANDI_RECENT_DAYS", "30"))
+# Markets whose newest price is older than this are not shown at all
+MAX_STALENESS_DAYS = int(os.getenv("CROP_MANDI_MAX_STALENESS_DAYS", "120"))
+PARTITION_CACHE_SIZE = 64
+ROW_GROUP_SIZE = 64 * 1024
+
+# Agmarknet exports name the same columns differently (Min_x0020_Price, "Min Price (Rs./Quintal)", ...)
+COLUMNS = {"state": "state", "state_name": "state", "district": "district", "district_name": "district",
+           "market": "market", "market_name": "market", "commodity": "commodity",
+           "variety": "variety", "arrival_date": "date", "price_date": "date", "reported_date": "date",
+           "min_price": "min_price", "max_price": "max_price", "modal_price": "modal_price"}
+# Unit, "N mandis" and modal price wording on the crop cards
+PRICE_WORDS = {"en": ("quintal", "mandis", "modal"), "hi": ("क्विंटल", "मंडियां", "आम भाव"),
+               "or": ("କ୍ୱିଣ୍ଟାଲ", "ମଣ୍ଡି", "ସାଧାରଣ ଦର")}
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d %b %Y"]
+
+with open(COMMODITIES_PATH, encoding="utf-8") as f:
+    COMMODITY_ALIASES = json.load(f)["commodities"]
+
+# Longest alias first, so "green gram" wins over "gram"
+_aliases = sorted(((alias, name) for name, aliases in COMMODITY_ALIASES.items() for alias in aliases),
+                  key=lambda item: -len(item[0]))
+_alias_patterns = [(re.compile(rf"(?<![a-z]){re.escape(alias)}(?![a-z])") if alias.isascii() else None, alias, name)
+                   for alias, name in _aliases]
+_lock = threading.Lock()
+_partitions = OrderedDict()
+_index = None
+_index_version = None
+
+
+def slug(value):
+    """Partition-safe form of a commodity or state name"""
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-")
+
+
+def commodity_for(crop_name):
+    """Agmarknet commodity for a crop name as the model writes it, or None"""
+    text = (crop_name or "").lower()
+    for pattern, alias, name in _alias_patterns:
+        if (pattern.search(text) if pattern else alias in text):
+            return name
+    return None
+
+
+def _canonical(column):
+    name = re.sub(r"\(.*?\)", "", column.replace("_x0020_", " ")).strip().lower()
+    return COLUMNS.get(re.sub(r"[\s_]+", "_", name))
+
+
+def _read_csv(path):
+    """Stream an Agmarknet CSV dump as record batches with canonical column names"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f))
+    names = {column: _canonical(column) for column in header}
+    wanted = [column for column, name in names.items() if name]
+    missing = {"state", "market", "commodity", "date", "modal_price"} - {names[column] for column in wanted}
+    if missing:
+        raise ValueError(f"{path} has no column for {', '.join(sorted(missing))}")
+    date_column = next(column for column in wanted if names[column] == "date")
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=16 << 20, encoding="utf-8-sig"),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=wanted, timestamp_parsers=DATE_FORMATS,
+            column_types={date_column: pa.timestamp("s"),
+                          **{c: pa.float64() for c in wanted if names[c].endswith("_price")}},
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        yield batch.rename_columns([names[column] for column in batch.schema.names])
+
+
+def _state_key(state):
+    return knowledge_base.detect_state(state) or str(state).strip().lower()
+
+
+def ingest(paths, root=PRICE_DIR):
+    """Load CSV dumps into the partitioned store and rebuild the index and trends; returns rows written.
+
+    Each source file writes one Parquet file per commodity and state,
+    named after the source path, so loading the same dump again replaces its
+    rows instead of duplicating them.
+    """
+    total = 0
+    for path in paths:
+        # Dumps from different folders often share a file name, so the full path names the source
+        source = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+        groups = {}
+        for batch in _read_csv(path):
+            table = pa.Table.from_batches([batch])
+            table = table.filter(pc.and_(pc.is_valid(table["date"]), pc.is_valid(table["modal_price"])))
+            if not table.num_rows:
+                continue
+            keys = pc.binary_join_element_wise(table["commodity"], table["state"], "\x1f")
+            for key in pc.unique(keys).to_pylist():
+                if key is not None:
+                    # Spellings like "Orissa" and "Odisha" go to the same partition
+                    commodity, state = key.split("\x1f")
+                    groups.setdefault((commodity, _state_key(state)), []).append(table.filter(pc.equal(keys, key)))
+        for (commodity, state), tables in groups.items():
+            table = pa.concat_tables(tables, promote_options="default")
+            columns = {"market": table["market"], "district": table["district"] if "district" in table.column_names
+                       else pa.nulls(table.num_rows, pa.string()),
+                       "date": pc.cast(table["date"], pa.date32())}
+            for price in ("min_price", "max_price", "modal_price"):
+                columns[price] = table[price] if price in table.column_names else table["modal_price"]
+            table = pa.table(columns).sort_by([("market", "ascending"), ("date", "ascending")])
+            table = table.replace_schema_metadata({"commodity": commodity, "state": state})
+            directory = os.path.join(root, f"commodity={slug(commodity)}", f"state={slug(state)}")
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(table, os.path.join(directory, f"{source}.parquet"), row_group_size=ROW_GROUP_SIZE)
+            total += table.num_rows
+    build_index(root)
+    # Trends span the whole store, so they are rebuilt here and the apps only read them
+    import price_trends  # price_trends imports this module
+    price_trends.build(root)
+    return total
+
+
+def build_index(root=PRICE_DIR):
+    """One index row per commodity, state, district and market with its date range and file"""
+    parts = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(".parquet") or name == "index.parquet":
+                continue
+            path = os.path.join(directory, name)
+            table = pq.read_table(path, columns=["market", "district", "date"])
+            meta = pq.read_schema(path).metadata
+            summary = table.group_by(["market", "district"]).aggregate(
+                [("date", "min"), ("date", "max"), ("date", "count")])
+            rows = summary.num_rows
+            parts.append(summary.append_column("commodity", pa.array([meta[b"commodity"].decode()] * rows))
+                         .append_column("state", pa.array([meta[b"state"].decode()] * rows))
+                         .append_column("path", pa.array([os.path.relpath(path, root)] * rows)))
+    if parts:
+        index = pa.concat_tables(parts).rename_columns(
+            ["market", "district", "first_date", "last_date", "rows", "commodity", "state", "path"])
+        pq.write_table(index, os.path.join(root, "index.parquet"))
+    return sum(part.num_rows for part in parts)
+
+
+def _load_index(root=PRICE_DIR):
+    """Index grouped by (commodity, state), reloaded when ingestion rewrites it"""
+    global _index, _index_version
+    path = os.path.join(root, "index.parquet")
+    try:
+        version = (path, os.path.getmtime(path))
+    except OSError:
+        return {}
+    with _lock:
+        if _index is None or version != _index_version:
+            index = {}
+            for row in pq.read_table(path).to_pylist():
+                index.setdefault((row["commodity"], row["state"]), []).append(row)
+            _index, _index_version = index, version
+            _partitions.clear()
+        return _index
+
+
+def _partition(root, path):
+    """Parquet file as an Arrow table, kept in a small LRU"""
+    path = os.path.join(root, path)
+    with _lock:
+        table = _partitions.get(path)
+        if table is not None:
+            _partitions.move_to_end(path)
+            return table
+    table = pq.read_table(path)
+    with _lock:
+        _partitions[path] = table
+        while len(_partitions) > PARTITION_CACHE_SIZE:
+            _partitions.popitem(last=False)
+    return table
+
+
+def recent_prices(crop_name, location, days=RECENT_DAYS, root=PRICE_DIR):
+    """Min/max/modal prices (₹ per quintal) for a crop around a location, or None.
+
+    Markets in the farmer's district are used when they report the crop,
+    otherwise all markets in the state. Prices cover the last `days` days
+    before each market's newest arrival.
+    """
+    if pa is None:
+        return None
+    commodity = commodity_for(crop_name)
+    state = knowledge_base.detect_state(location)
+    if commodity is None or state is None:
+        return None
+    try:
+        return _recent_prices(commodity, state, location, days, root)
+    except READ_ERRORS as e:
+        # A damaged or half-written price store only costs the card its price line
+        telemetry.record("mandi_error", commodity=commodity, error=str(e))
+        return None
+
+
+def _recent_prices(commodity, state, location, days, root):
+    entries = _load_index(root).get((commodity, state))
+    if not entries:
+        return None
+    district = agro_zones.district_of(location)
+    local = [e for e in entries if district and district in ((e["district"] or "").lower(), e["market"].lower())]
+    scope = "district" if local else "state"
+    newest = max(e["last_date"] for e in local or entries)
+    if (date.today() - newest).days > MAX_STALENESS_DAYS:
+        return None
+    markets = [e for e in local or entries if (newest - e["last_date"]).days <= days]
+    since = pa.scalar(newest - timedelta(days=days), pa.date32())
+
+    tables = []
+    for path in sorted({e["path"] for e in markets}):
+        table = _partition(root, path)
+        tables.append(table.filter(pc.and_(pc.is_in(table["market"], pa.array([e["market"] for e in markets])),
+                                           pc.greater(table["date"], since))))
+    table = pa.concat_tables(tables)
+    if not table.num_rows:
+        return None
+    return {
+        "commodity": commodity,
+        "scope": scope,
+        "markets": len({e["market"] for e in markets}),
+        "market": markets[0]["market"] if len(markets) == 1 else None,
+        "from": pc.min(table["date"]).as_py().isoformat(),
+        "to": newest.isoformat(),
+        "min": round(pc.min(table["min_price"]).as_py()),
+        "max": round(pc.max(table["max_price"]).as_py()),
+        "modal": round(pc.approximate_median(table["modal_price"]).as_py()),
+    }
+
+
+def price_text(prices, language="en"):
+    """One-line summary for a crop card, e.g. '₹2,050–2,310/quintal (modal ₹2,180) · Khanna, 14-10-2026'"""
+    unit, mandis, modal = PRICE_WORDS[language]
+    where = prices["market"] or f"{prices['markets']} {mandis}"
+    day = "-".join(reversed(prices["to"].split("-")))
+    return f"₹{prices['min']:,}–{prices['max']:,}/{unit} ({modal} ₹{prices['modal']:,}) · {where}, {day}"
+
+
+def _write_sample(path, years, markets_per_state, seed=0):
+    """Synthetic Agmarknet-format dump: daily prices for every commodity, state and market"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    states = ["Punjab", "Haryana", "Uttar Pradesh", "Bihar", "Odisha", "Maharashtra", "Madhya Pradesh", "Rajasthan"]
+    commodities = list(COMMODITY_ALIASES)[:15]
+    days = np.arange(np.datetime64("today") - 365 * years, np.datetime64("today"))
+    columns = {name: [] for name in ("State", "District", "Market", "Commodity", "Arrival_Date",
+                                     "Min_x0020_Price", "Max_x0020_Price", "Modal_x0020_Price")}
+    for state in states:
+        for m in range(markets_per_state):
+            market = "Ludhiana" if state == "Punjab" and m == 0 else f"{state.split()[0]} Mandi {m}"
+            for commodity in commodities:
+                base = rng.uniform(1500, 6000)
+                modal = base * (1 + 0.15 * np.sin(np.arange(len(days)) / 58) + rng.normal(0, 0.03, len(days)))
+                n = len(days)
+                columns["State"].append(np.full(n, state))
+                columns["District"].append(np.full(n, market.split()[0]))
+                columns["Market"].append(np.full(n, market))
+                columns["Commodity"].append(np.full(n, commodity))
+                columns["Arrival_Date"].append(np.datetime_as_string(days).astype(object))
+                columns["Min_x0020_Price"].append(np.round(modal * 0.92))
+                columns["Max_x0020_Price"].append(np.round(modal * 1.08))
+                columns["Modal_x0020_Price"].append(np.round(modal))
+    table = pa.table({name: np.concatenate(parts) for name, parts in columns.items()})
+    pa_csv.write_csv(table, path)
+    return table.num_rows
+
+
+if __name__ == "__main__":
+    # Load dumps:   python mandi_prices.py ingest data/mandi/*.csv
+    # Look up:      python mandi_prices.py lookup Wheat "Ludhiana, Punjab"
+    # Benchmark:    python mandi_prices.py bench [years] [markets per state]
+    import tempfile
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "ingest":
+        start = time.perf_counter()
+        rows = ingest(sys.argv[2:])
+        print(f"{rows:,} rows in {time.perf_counter() - start:.1f} s into {PRICE_DIR}")
+    elif command == "lookup":
+        print(recent_prices(sys.argv[2], sys.argv[3]))
+    else:
+        years = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+        markets_per_state = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+        workdir = tempfile.mkdtemp(prefix="mandi-bench-")
+        try:
+            source = os.path.join(workdir, "agmarknet.csv")
+            rows = _write_sample(source, years, markets_per_state)
+            size = os.path.getsize(source) / 2**20
+            root = os.path.join(workdir, "store")
+            start = time.perf_counter()
+            ingest([source], root)
+            elapsed = time.perf_counter() - start
+            stored = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(root) for f in fs) / 2**20
+            print(f"ingest: {rows:,} rows ({size:.0f} MiB CSV) in {elapsed:.1f} s -> {rows / elapsed:,.0f} rows/s, "
+                  f"{stored:.0f} MiB Parquet")
+            crops = ["Wheat", "Mustard", "Potato", "Paddy (Basmati)", "Chickpea", "Onion"]
+            locations = ["Ludhiana, Punjab", "Karnal, Haryana", "Cuttack, Odisha", "Patna, Bihar", "Nashik, Maharashtra"]
+            for label in ("cold", "warm"):
+                if label == "cold":
+                    _index = None
+                timings = []
+                for i in range(500 if label == "warm" else 30):
+                    crop, location = crops[i % len(crops)], locations[i % len(locations)]
+                    if label == "cold":
+                        _partitions.clear()
+                    start = time.perf_counter()
+                    recent_prices(crop, location, root=root)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                print(f"lookup ({label}): p50 {timings[len(timings) // 2]:.2f} ms, "
+                      f"p99 {timings[int(len(timings) * 0.99)]:.2f} ms")
+            print(recent_prices("Wheat", "Ludhiana, Punjab", root=root))
+        finally:
+            shutil.rmtree(workdir)
@@ -0,0 +1,319 @@
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import cache_backends
+import knowledge_base
+import mandi_prices
+import price_trends
+import speech
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Stack depth kept per allocation; deeper stacks attribute better but cost more memory
+TRACE_FRAMES = int(os.getenv("CROP_TRACEMALLOC_FRAMES", "12"))
+SNAPSHOT_LIMIT = 4
+# Types worth watching by name when hunting leaks, besides the largest counts
+WATCHED_TYPES = ("SpeechJob", "Figure", "DataFrame", "Table", "SessionState", "AppSession", "bytes", "dict")
+# Libraries reported under their own name when no repo module is on the allocating stack
+LIBRARIES = ("gtts", "plotly", "streamlit", "pandas", "pyarrow", "numpy", "google", "grpc", "sqlite3", "json", "tornado")
+
+_lock = threading.Lock()
+_snapshots = []
+
+
+def start(frames=TRACE_FRAMES):
+    """Start tracing allocations; only memory allocated from now on is attributed"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop():
+    """Stop tracing and forget the snapshots, which hold on to every traced allocation"""
+    with _lock:
+        _snapshots.clear()
+    tracemalloc.stop()
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def subsystem(filename):
+    """Repo module or library that a source file belongs to"""
+    if not os.path.isabs(filename):
+        # Frozen stdlib modules such as '<frozen abc>'
+        return "other"
+    path = os.path.normpath(filename)
+    if path.startswith(REPO_DIR + os.sep):
+        relative = os.path.relpath(path, REPO_DIR)
+        return os.path.splitext(relative)[0].replace(os.sep, "/")
+    parts = path.split(os.sep)
+    for library in LIBRARIES:
+        if library in parts:
+            return library
+    return "other"
+
+
+def _attribute(traceback):
+    """The innermost repo module on the stack, else the library that allocated"""
+    for frame in reversed(traceback):
+        name = subsystem(frame.filename)
+        if name not in LIBRARIES and name != "other":
+            return name
+    return subsystem(traceback[-1].filename) if len(traceback) else "other"
+
+
+def _where(frame):
+    """'file.py:123', relative to the repo for repo files"""
+    filename = frame.filename
+    if filename.startswith(REPO_DIR + os.sep):
+        filename = os.path.relpath(filename, REPO_DIR)
+    return f"{filename}:{frame.lineno}"
+
+
+def object_counts():
+    """Live objects tracked by the garbage collector, by type name"""
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def take_snapshot(label=None):
+    """Record allocations, object counts and RSS; keeps the last SNAPSHOT_LIMIT snapshots"""
+    if not tracemalloc.is_tracing():
+        start()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    entry = {
+        "label": label or time.strftime("%H:%M:%S"),
+        "taken_at": time.time(),
+        "rss_bytes": rss_bytes(),
+        "traced_bytes": tracemalloc.get_traced_memory()[0],
+        "objects": object_counts(),
+        "snapshot": snapshot,
+    }
+    with _lock:
+        _snapshots.append(entry)
+        del _snapshots[:-SNAPSHOT_LIMIT]
+    return entry
+
+
+def snapshots():
+    with _lock:
+        return list(_snapshots)
+
+
+def by_subsystem(snapshot):
+    """Traced bytes and blocks per subsystem, largest first"""
+    totals = {}
+    for stat in snapshot.statistics("traceback"):
+        name = _attribute(stat.traceback)
+        size, count = totals.get(name, (0, 0))
+        totals[name] = (size + stat.size, count + stat.count)
+    return sorted(({"subsystem": name, "bytes": size, "blocks": count} for name, (size, count) in totals.items()),
+                  key=lambda row: -row["bytes"])
+
+
+def diff(old, new, limit=25):
+    """Growth between two snapshots, per subsystem and per source line, plus object count changes"""
+    totals = {}
+    for stat in new["snapshot"].compare_to(old["snapshot"], "traceback"):
+        name = _attribute(stat.traceback)
+        size, count = totals.get(name, (0, 0))
+        totals[name] = (size + stat.size_diff, count + stat.count_diff)
+    lines = [{"line": _where(stat.traceback[-1]), "bytes": stat.size_diff, "blocks": stat.count_diff, "total_bytes": stat.size}
+             for stat in new["snapshot"].compare_to(old["snapshot"], "lineno")[:limit] if stat.size_diff]
+    objects = new["objects"].copy()
+    objects.subtract(old["objects"])
+    return {
+        "seconds": new["taken_at"] - old["taken_at"],
+        "rss_bytes": (new["rss_bytes"] or 0) - (old["rss_bytes"] or 0),
+        "traced_bytes": new["traced_bytes"] - old["traced_bytes"],
+        "subsystems": sorted(({"subsystem": name, "bytes": size, "blocks": count}
+                              for name, (size, count) in totals.items() if size or count),
+                             key=lambda row: -abs(row["bytes"])),
+        "lines": lines,
+        "objects": [{"type": name, "change": change}
+                    for name, change in sorted(objects.items(), key=lambda item: -abs(item[1]))[:limit] if change],
+    }
+
+
+def deep_size(value, seen=None):
+    """Bytes held by a value and everything it references through containers"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value, 0)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in value)
+    elif hasattr(value, "nbytes") and isinstance(value.nbytes, int):
+        size += value.nbytes
+    elif hasattr(value, "__dict__"):
+        size += deep_size(vars(value), seen)
+    return size
+
+
+def session_report(result_store=None):
+    """Session state size and stored result bytes for every Streamlit session of this server"""
+    per_result = result_store.memory_report()["per_session"] if result_store else {}
+    sessions = []
+    try:
+        from streamlit.runtime import Runtime
+        # The session manager is not public API; without it only the result store is reported
+        infos = Runtime.instance()._session_mgr.list_sessions() if Runtime.exists() else []
+    except Exception:
+        infos = []
+    for info in infos:
+        state = info.session.session_state
+        keys = [key for key in state.filtered_state]
+        sessions.append({
+            "session": info.session.id,
+            "state_keys": len(keys),
+            "state_bytes": sum(deep_size(state[key]) for key in keys),
+            "result_bytes": per_result.pop(info.session.id, 0),
+            "script_runs": info.script_run_count,
+        })
+    # Sessions the result store still holds but Streamlit has already dropped are leak candidates
+    sessions += [{"session": sid, "state_keys": 0, "state_bytes": 0, "result_bytes": nbytes, "script_runs": None}
+                 for sid, nbytes in per_result.items()]
+    return sorted(sessions, key=lambda row: -(row["state_bytes"] + row["result_bytes"]))
+
+
+def temp_files():
+    """Temporary files this process holds open, and files left in the temp folder"""
+    temp_dir = os.path.realpath(tempfile.gettempdir())
+    held = []
+    try:
+        for fd in os.listdir("/proc/self/fd"):
+            try:
+                target = os.readlink(f"/proc/self/fd/{fd}")
+            except OSError:
+                continue
+            if target.startswith(temp_dir + os.sep):
+                held.append({"fd": int(fd), "path": target, "bytes": _file_size(target)})
+    except OSError:
+        pass
+    # Audio and temp files that nothing cleaned up, e.g. after a crashed synthesis
+    left = []
+    try:
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.name.endswith((".mp3", ".wav", ".tmp")):
+                    stat = entry.stat(follow_symlinks=False)
+                    left.append({"path": entry.path, "bytes": stat.st_size, "age_seconds": round(time.time() - stat.st_mtime)})
+    except OSError:
+        pass
+    return {"open": held, "left": sorted(left, key=lambda row: -row["bytes"])}
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _streamlit_caches():
+    """Sizes of st.cache_data / st.cache_resource entries and session state, as Streamlit reports them"""
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return []
+        stats = Runtime.instance().stats_mgr.get_stats()
+    except Exception:
+        return []
+    totals = Counter()
+    for family in stats.values():
+        for stat in family:
+            totals[f"{stat.category_name} {stat.cache_name}".strip()] += stat.byte_length
+    return [{"cache": name, "entries": None, "bytes": size} for name, size in totals.most_common()]
+
+
+def cache_sizes(result_store=None):
+    """Entry counts and bytes of every in-process cache the apps keep"""
+    rows = []
+    backend = cache_backends.get_cache()
+    if isinstance(backend, cache_backends.MemoryBackend):
+        rows.append({"cache": "shared cache (memory)", "entries": len(backend._entries), "bytes": backend.nbytes})
+    elif isinstance(backend, cache_backends.SQLiteBackend):
+        rows.append({"cache": "shared cache (sqlite file)", "entries": None, "bytes": _file_size(backend.path)})
+    else:
+        rows.append({"cache": f"shared cache ({backend.name})", "entries": None, "bytes": None})
+
+    with speech._jobs_lock:
+        jobs = list(speech._jobs.values())
+    audio = sum(len(f.result()) for job in jobs for f in job.futures if f.done() and f.exception() is None)
+    rows.append({"cache": "speech jobs (finished audio)", "entries": len(jobs), "bytes": audio})
+
+    if result_store is not None:
+        report = result_store.memory_report()
+        rows.append({"cache": "shared recommendation results", "entries": report["unique_results"],
+                     "bytes": report["stored_bytes"]})
+
+    with mandi_prices._lock:
+        partitions = list(mandi_prices._partitions.values())
+    rows.append({"cache": "mandi price partitions", "entries": len(partitions),
+                 "bytes": sum(table.nbytes for table in partitions)})
+    trends = price_trends._trends
+    rows.append({"cache": "price trends", "entries": 0 if trends is None else len(trends),
+                 "bytes": 0 if trends is None else int(trends.memory_usage(deep=True).sum())})
+    if knowledge_base._index is not None:
+        rows.append({"cache": "agronomy index", "entries": len(knowledge_base._index["passages"]),
+                     "bytes": knowledge_base.index_memory_bytes(knowledge_base._index)})
+    return rows + _streamlit_caches()
+
+
+def memory_report(result_store=None, top_types=15):
+    """Everything the diagnostics page shows that does not need tracemalloc"""
+    counts = object_counts()
+    return {
+        "rss_bytes": rss_bytes(),
+        "tracing": tracemalloc.is_tracing(),
+        "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        "gc_counts": gc.get_count(),
+        "objects": counts.most_common(top_types),
+        "watched": {name: counts.get(name, 0) for name in WATCHED_TYPES},
+        "sessions": session_report(result_store),
+        "caches": cache_sizes(result_store),
+        "temp_files": temp_files(),
+    }
+
+
+if __name__ == "__main__":
+    # Attribute the growth from one workload between two snapshots: python memory_diagnostics.py [jobs]
+    import session_store
+
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    store = session_store.ResultStore()
+    start()
+    before = take_snapshot("before")
+    for i in range(jobs):
+        store.put(f"session-{i}", {"recommendations": [{"crop_name": f"Crop {i}", "notes": "x" * 500}]})
+    after = take_snapshot("after")
+    change = diff(before, after, limit=5)
+    print(f"traced +{change['traced_bytes'] / 1024:.1f} KiB, rss +{change['rss_bytes'] / 1024:.1f} KiB")
+    for row in change["subsystems"][:5]:
+        print(f"{row['subsystem']:>20}: {row['bytes'] / 1024:+.1f} KiB in {row['blocks']:+} blocks")
+    for row in change["lines"]:
+        print(f"{row['line']}: {row['bytes'] / 1024:+.1f} KiB")
+    print("objects:", ", ".join(f"{row['type']} {row['change']:+}" for row in change["objects"][:5]))
+    report = memory_report(store)
+    print(f"{len(report['sessions'])} sessions, caches: " +
+          ", ".join(f"{row['cache']} {row['bytes'] or 0:,} B" for row in report["caches"]))
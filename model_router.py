@@ -0,0 +1,282 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import telemetry
+
+MODEL_NAMES = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
+SIMPLE = "simple"
+COMPLEX = "complex"
+
+# Per request complexity: models in order of preference, the latency above which the model counts
+# as degraded, and the most a call may cost (USD, None for no limit) before the next model is preferred
+TIERS = {
+    SIMPLE: {"models": ['gemini-1.5-flash', 'gemini-pro', 'gemini-1.5-pro'], "latency_ms": 10000, "max_cost": 0.002},
+    COMPLEX: {"models": ['gemini-1.5-pro', 'gemini-1.5-flash', 'gemini-pro'], "latency_ms": 25000, "max_cost": None},
+}
+# e.g. CROP_MODEL_TIERS='{"simple": {"latency_ms": 6000}}'
+for _name, _overrides in json.loads(os.getenv("CROP_MODEL_TIERS", "{}")).items():
+    TIERS[_name].update(_overrides)
+# USD per million input and output tokens; e.g. CROP_MODEL_PRICES='{"gemini-1.5-pro": [1.25, 5.0]}'
+PRICES = {'gemini-1.5-flash': (0.075, 0.30), 'gemini-1.5-pro': (1.25, 5.00), 'gemini-pro': (0.50, 1.50)}
+PRICES.update({name: tuple(price) for name, price in json.loads(os.getenv("CROP_MODEL_PRICES", "{}")).items()})
+# Weight of the newest call in the moving averages; 0.3 reacts within a few calls
+EWMA_ALPHA = float(os.getenv("CROP_ROUTER_EWMA_ALPHA", "0.3"))
+# Error rate above which a model counts as degraded; two failures in a row cross it
+MAX_ERROR_RATE = 0.4
+# A degraded model gets one trial request this often, so it wins its traffic back once it recovers
+PROBE_INTERVAL_SECONDS = float(os.getenv("CROP_ROUTER_PROBE_SECONDS", "30"))
+# Models tried for one call before the error reaches the caller
+MAX_ATTEMPTS = 2
+
+
+class ModelStats:
+    """Moving averages of one model's latency, error rate and cost per call"""
+    __slots__ = ("latency_ms", "error_rate", "cost", "calls", "failures", "last_used")
+
+    def __init__(self):
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.cost = None
+        self.calls = 0
+        self.failures = 0
+        self.last_used = 0.0
+
+    def observe(self, latency_ms, ok, cost):
+        self.calls += 1
+        self.failures += not ok
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        # Failures often return fast, so only successful calls say how quick the model is
+        if ok:
+            self.latency_ms = latency_ms if self.latency_ms is None else self.latency_ms + EWMA_ALPHA * (latency_ms - self.latency_ms)
+        if cost is not None:
+            self.cost = cost if self.cost is None else self.cost + EWMA_ALPHA * (cost - self.cost)
+
+    def degraded(self, tier):
+        return self.error_rate > MAX_ERROR_RATE or (self.latency_ms or 0) > tier["latency_ms"]
+
+    def expected_ms(self):
+        """Latency to expect per successful answer, counting retries after failures"""
+        return (self.latency_ms or 0) / max(1 - self.error_rate, 0.05)
+
+
+def call_cost(model_name, contents, response):
+    """USD for one call from the reported token counts, estimated from text length when missing"""
+    price = PRICES.get(model_name)
+    if price is None:
+        return None
+    usage = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(usage, "prompt_token_count", None)
+    if not input_tokens:
+        input_tokens = len(contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False)) // 4
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if not output_tokens:
+        try:
+            output_tokens = len(response.text) // 4
+        except Exception:
+            output_tokens = 0
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1e6
+
+
+class ModelRouter:
+    """Sends each call to the model that suits its complexity and is performing now.
+
+    Within a tier the first model in preference order that is healthy and
+    within the tier's cost limit is chosen. A model is degraded while its
+    error rate or latency average is over the limits; it then gets only one
+    trial call per probe interval, and traffic moves down the list. When
+    every model is degraded, the one with the lowest expected latency is
+    used. Replaces probing each model with a test prompt at startup.
+    """
+    model_name = "auto"
+
+    def __init__(self, models, tiers=None, clock=time.monotonic):
+        self.models = models
+        self.clock = clock
+        self.tiers = {name: dict(config, models=[m for m in config["models"] if m in models])
+                      for name, config in (tiers or TIERS).items()}
+        self.stats = {name: ModelStats() for name in models}
+        self._lock = threading.Lock()
+
+    def candidates(self, complexity, preferred=None):
+        """Model names to try for one call, best first; claims the probe slot of a degraded model it puts first"""
+        tier = self.tiers[complexity]
+        now = self.clock()
+        with self._lock:
+            eligible = []
+            for name in tier["models"]:
+                stats = self.stats[name]
+                over_budget = tier["max_cost"] is not None and (stats.cost or 0) > tier["max_cost"]
+                probe_due = now - stats.last_used >= PROBE_INTERVAL_SECONDS
+                if not over_budget and (not stats.degraded(tier) or probe_due):
+                    eligible.append(name)
+            rest = sorted((name for name in tier["models"] if name not in eligible),
+                          key=lambda name: self.stats[name].expected_ms())
+            order = eligible + rest
+            # Follow-up calls of one request stay on the model that answered the first part
+            if preferred in order and not self.stats[preferred].degraded(tier):
+                order.remove(preferred)
+                order.insert(0, preferred)
+            if order:
+                self.stats[order[0]].last_used = now
+        return order[:MAX_ATTEMPTS]
+
+    def observe(self, name, complexity, latency_ms, ok, contents=None, response=None):
+        cost = call_cost(name, contents, response) if ok else None
+        with self._lock:
+            self.stats[name].observe(latency_ms, ok, cost)
+            self.stats[name].last_used = self.clock()
+        telemetry.record("model_route", model=name, complexity=complexity, latency_ms=round(latency_ms, 2), ok=ok,
+                         cost_usd=None if cost is None else round(cost, 6))
+
+    def route(self, complexity):
+        return Route(self, complexity)
+
+    def generate_content(self, contents):
+        return self.route(SIMPLE).generate_content(contents)
+
+    async def generate_content_async(self, contents):
+        return await self.route(SIMPLE).generate_content_async(contents)
+
+    def metrics(self):
+        """Moving averages and call counts per model"""
+        with self._lock:
+            return {name: {
+                "latency_ms": None if stats.latency_ms is None else round(stats.latency_ms, 1),
+                "error_rate": round(stats.error_rate, 3),
+                "cost_usd": None if stats.cost is None else round(stats.cost, 6),
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "degraded": {complexity: stats.degraded(tier) for complexity, tier in self.tiers.items()},
+            } for name, stats in self.stats.items()}
+
+
+class Route:
+    """One request's handle on the router; follow-ups such as continuations go to the model that answered first"""
+
+    def __init__(self, router, complexity):
+        self.router = router
+        self.complexity = complexity
+        self.model_name = router.model_name
+        self.served_by = None
+
+    def _outcome(self, name, start, ok, contents, response=None):
+        self.router.observe(name, self.complexity, (self.router.clock() - start) * 1000, ok, contents, response)
+
+    def generate_content(self, contents):
+        error = None
+        for name in self.router.candidates(self.complexity, self.served_by):
+            start = self.router.clock()
+            try:
+                response = self.router.models[name].generate_content(contents)
+            except Exception as e:
+                self._outcome(name, start, False, contents)
+                error = e
+                continue
+            self._outcome(name, start, True, contents, response)
+            self.served_by = name
+            return response
+        raise error or RuntimeError("No model configured")
+
+    async def generate_content_async(self, contents):
+        error = None
+        for name in self.router.candidates(self.complexity, self.served_by):
+            start = self.router.clock()
+            try:
+                response = await self.router.models[name].generate_content_async(contents)
+            except asyncio.CancelledError:
+                # The caller's timeout ran out on this model, which counts against it
+                self._outcome(name, start, False, contents)
+                raise
+            except Exception as e:
+                self._outcome(name, start, False, contents)
+                error = e
+                continue
+            self._outcome(name, start, True, contents, response)
+            self.served_by = name
+            return response
+        raise error or RuntimeError("No model configured")
+
+
+def for_request(model, complexity):
+    """The route for one request when the model is a router, else the model itself"""
+    return model.route(complexity) if isinstance(model, ModelRouter) else model
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(make_model):
+    """Process-wide router over MODEL_NAMES, created on first use with make_model(name) for each model"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter({name: make_model(name) for name in MODEL_NAMES})
+    return _router
+
+
+def get_metrics():
+    """Router metrics, or an empty dict before the router is set up"""
+    return _router.metrics() if _router is not None else {}
+
+
+if __name__ == "__main__":
+    # Fast model slows down, then fails, then recovers: python model_router.py [requests] [slow latency s]
+    from types import SimpleNamespace
+
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    slow_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 12.0
+    clock = SimpleNamespace(now=0.0, request=0)
+    response = SimpleNamespace(text="x" * 3200, usage_metadata=None)
+    prompt = "prompt " * 300
+
+    class SimulatedModel:
+        """Advances a simulated clock instead of sleeping; the fast model is slow for the 2nd fifth of the
+        run and down for the 3rd"""
+
+        def __init__(self, latency, unstable=False):
+            self.latency, self.unstable = latency, unstable
+
+        def generate_content(self, contents):
+            phase = clock.request * 5 // requests if self.unstable else 0
+            if phase == 2:
+                clock.now += 0.3
+                raise ConnectionError("503 Service Unavailable")
+            clock.now += slow_seconds if phase == 1 else self.latency
+            return response
+
+    def simulate(call):
+        models = {'gemini-1.5-flash': SimulatedModel(1.2, unstable=True), 'gemini-1.5-pro': SimulatedModel(3.5),
+                  'gemini-pro': SimulatedModel(2.0)}
+        waits, failed = [], 0
+        for clock.request in range(requests):
+            start = clock.now
+            # Requests arrive every 5 s, so probe intervals pass in simulated time
+            try:
+                call(models, SimpleNamespace(text=prompt))
+            except ConnectionError:
+                failed += 1
+            waits.append(clock.now - start)
+            clock.now = start + max(clock.now - start, 5.0)
+        return sorted(waits), failed
+
+    telemetry.record = lambda event, **fields: None
+    # Before: setup picked the first model that answered a test prompt and kept it
+    first, first_failed = simulate(lambda models, request: models['gemini-1.5-flash'].generate_content(request.text))
+    routers = []
+
+    def routed(models, request):
+        if not routers:
+            routers.append(ModelRouter(models, clock=lambda: clock.now))
+        routers[0].route(SIMPLE).generate_content(request.text)
+
+    adaptive, adaptive_failed = simulate(routed)
+    for label, waits, failed in (("first model that answered", first, first_failed), ("router", adaptive, adaptive_failed)):
+        print(f"{label:>26}: p50 {waits[len(waits) // 2]:5.1f} s, p95 {waits[int(len(waits) * 0.95)]:5.1f} s, "
+              f"mean {sum(waits) / len(waits):5.2f} s, failed {failed}/{requests}")
+    for name, row in routers[0].metrics().items():
+        print(f"{name:>18}: {row}")
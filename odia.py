@@ -1,11 +1,21 @@
 import streamlit as st
-import google.generativeai as genai
 import pandas as pd
-import json
 from datetime import datetime
 import plotly.express as px
 import os
 from dotenv import load_dotenv
+import admin_auth
+import budget_optimizer
+import crop_core
+import session_store
+import history_store
+import lite_mode
+import mandi_prices
+import price_trends
+import revalidate
+import roi_simulation
+import similar_requests
+import speech
 
 # Load .env file
 load_dotenv()
@@ -22,8 +32,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Lite mode for 2G/3G: no decorative CSS, static charts, plain tables and audio only on request
+lite = lite_mode.enabled("📶 ଲାଇଟ୍ ମୋଡ୍ (ଧୀର ଇଣ୍ଟରନେଟ୍)", help="ବହୁତ ହାଲୁକା ପୃଷ୍ଠା: ସରଳ ଚାର୍ଟ ଓ ସାରଣୀ, ଶବ୍ଦ କେବଳ ଚଲାଇଲେ")
+
 # Odia-themed CSS
-st.markdown("""
+if not lite:
+    st.markdown("""
 <style>
     .main-header {
         font-size: 2.8rem;
@@ -81,12 +95,35 @@ st.markdown("""
         text-shadow: 1px 1px 2px rgba(0,0,0,0.1);
     }
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state (holds only a key into the shared result store)
 if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
 
+def speak_text(text, lang="or"):
+    """Start converting text to speech in the background and return the job"""
+    return speech.prepare(text, lang)
+
+def attach_audio(job, slot, show_timing=True):
+    """Fill an audio placeholder with the first segment as soon as it is ready, then the full track below it"""
+    try:
+        first = job.first_segment()
+        if first is None:
+            if show_timing:
+                slot.caption("🔇 ଏହି ସର୍ଭରରେ ସ୍ୱର ଉପଲବ୍ଧ ନାହିଁ")
+            return
+        slot.audio(first, format=job.audio_format)
+        if len(job.chunks) > 1:
+            # A second player, since replacing the first would cut off a farmer who is already listening
+            slot.caption("ସମ୍ପୂର୍ଣ୍ଣ ଅଡିଓ")
+            slot.audio(job.full_track(), format=job.audio_format)
+        else:
+            job.full_track()
+        if show_timing:
+            slot.caption(f"⏱️ ପ୍ରଥମ ସ୍ୱର {job.first_audio_ms / 1000:.1f} ସେକେଣ୍ଡରେ · ସମ୍ପୂର୍ଣ୍ଣ ଅଡିଓ {job.full_track_ms / 1000:.1f} ସେକେଣ୍ଡରେ · {job.engine.name}")
+    except Exception as e:
+        slot.error(f"ସ୍ୱର ତ୍ରୁଟି: {e}")
  
 
 def setup_gemini_api():
@@ -96,17 +133,7 @@ def setup_gemini_api():
             st.error("❌ Gemini API Key not found. Please set it in your .env file.")
             return None
 
-        genai.configure(api_key=GEMINI_API_KEY)
-        model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-        
-        for model_name in model_names:
-            try:
-                model = genai.GenerativeModel(model_name)
-                test_response = model.generate_content("Test")
-                return model
-            except:
-                continue
-        return None
+        return crop_core.setup_model()
     except Exception as e:
         st.error(f"Gemini setup error: {e}")
         return None
@@ -115,66 +142,13 @@ def setup_gemini_api():
 def get_crop_recommendations(model, month, location, budget, experience, farm_size, organic):
     """Get crop recommendations using Gemini API"""
     try:
-        prompt = f"""
-        ଆପଣ ଜଣେ ଭାରତୀୟ କୃଷି ପରାମର୍ଶଦାତା | ନିମ୍ନଲିଖିତ ତଥ୍ୟ ଆଧାରରେ ଫସଲ ସୁପାରିଶ କରନ୍ତୁ:
-        
-        ମାସ: {month}
-        ସ୍ଥାନ: {location}
-        ବଜେଟ୍: ₹{budget}
-        ଅନୁଭବ: {experience}
-        ଜମି ଆକାର: {farm_size}
-        ଜୈବିକ ଚାଷ: {'ହଁ' if organic else 'ନା'}
-        
-        JSON format ରେ ଉତ୍ତର ଦିଅନ୍ତୁ:
-        {{
-            "recommendations": [
-                {{
-                    "crop_name": "ଫସଲର ନାମ",
-                    "profit_potential": "High/Medium/Low",
-                    "estimated_roi": "ପ୍ରତିଶତ",
-                    "investment_required": "ପରିମାଣ",
-                    "growing_period": "ମାସରେ ସମୟ",
-                    "key_benefits": ["ଲାଭ1", "ଲାଭ2", "ଲାଭ3"],
-                    "considerations": ["ସତର୍କତା1", "ସତର୍କତା2"],
-                    "market_price_range": "ବଜାର ଦର"
-                }}
-            ],
-            "general_advice": "ସାଧାରଣ ପରାମର୍ଶ",
-            "seasonal_notes": "ଋତୁଗତ ନୋଟ୍ସ"
-        }}
-        
-        ଭାରତୀୟ ଋତୁ, ମାଟି ଏବଂ ବଜାର ଅବସ୍ଥା ଅନୁସାରେ 3-5 ଟି ଫସଲର ସୁପାରିଶ କରନ୍ତୁ |
-        """
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = response_text[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
-            return {
-                "recommendations": [{
-                    "crop_name": "ସ୍ଥାନୀୟ ପରାମର୍ଶ ନିଅନ୍ତୁ",
-                    "profit_potential": "Variable",
-                    "estimated_roi": "ବିଶେଷଜ୍ଞଙ୍କ ସହ ଯୋଗାଯୋଗ କରନ୍ତୁ",
-                    "investment_required": f"₹{budget} ମଧ୍ୟରେ",
-                    "growing_period": "ବିଭିନ୍ନ",
-                    "key_benefits": ["ସ୍ଥାନୀୟ ବିଶ୍ଳେଷଣ ଆବଶ୍ୟକ"],
-                    "considerations": ["କୃଷି ବିଭାଗ ସହ ଯୋଗାଯୋଗ କରନ୍ତୁ"],
-                    "market_price_range": "ବଜାର ଉପରେ ନିର୍ଭରଶୀଳ"
-                }],
-                "general_advice": response_text[:300],
-                "seasonal_notes": f"{month} ରେ {location} ପାଇଁ ସ୍ଥାନୀୟ ଋତୁ pattern ଦେଖନ୍ତୁ |"
-            }
+        return crop_core.generate_recommendations(model, "or", month, location, budget,
+                                                  experience, farm_size, organic)
     except Exception as e:
         st.error(f"ସୁପାରିଶ ପାଇବାରେ ସମସ୍ୟା: {str(e)}")
         return None
 
-def display_crop_card(crop_data, index):
+def display_crop_card(crop_data, index, location):
     """Display crop recommendation card"""
     # Map profit potential to CSS class
     profit_mapping = {
@@ -183,13 +157,16 @@ def display_crop_card(crop_data, index):
         'Low': 'profit-low'
     }
     profit_class = profit_mapping.get(crop_data['profit_potential'], 'profit-medium')
+    # Recorded mandi prices, when the local price store has this crop
+    prices = mandi_prices.recent_prices(crop_data['crop_name'], location)
+    mandi_line = f"<p><strong>ମଣ୍ଡି ଦର:</strong> {mandi_prices.price_text(prices, 'or')}</p>" if prices else ""
     
     st.markdown(f"""
     <div class="crop-card">
         <div class="crop-title">🌱 {crop_data['crop_name']}</div>
         <p><strong>ବୃଦ୍ଧିର ସମୟ:</strong> {crop_data['growing_period']}</p>
         <p><strong>ନିବେଶ ଆବଶ୍ୟକ:</strong> {crop_data['investment_required']}</p>
-        <p><strong>ବଜାର ଦର:</strong> {crop_data['market_price_range']}</p>
+        <p><strong>ବଜାର ଦର:</strong> {crop_data['market_price_range']}</p>{mandi_line}
         <p><strong>ଲାଭ ସମ୍ଭାବନା:</strong> <span class="{profit_class}">{crop_data['profit_potential']}</span></p>
         <p><strong>ROI:</strong> {crop_data['estimated_roi']}</p>
     </div>
@@ -211,6 +188,8 @@ def main():
         selected_month = st.selectbox("📅 ମାସ", months, index=datetime.now().month - 1)
         
         location = st.text_input("📍 ସ୍ଥାନ", placeholder="ଯେପରି: ଓଡ଼ିଶା, ଭାରତ କିମ୍ବା କଟକ")
+        
+        farmer_id = st.text_input("👤 କୃଷକ ID / ମୋବାଇଲ୍ (ଇଚ୍ଛାଧୀନ)", placeholder="ଯେପରି: 9876543210")
     
     with col2:
         budget = st.number_input("💰 ବଜେଟ୍ (₹)", min_value=1000, max_value=10000000, value=50000, step=5000)
@@ -223,30 +202,85 @@ def main():
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Recent results for this farmer or district, served from the local history store
+    history = history_store.get_history_store()
+    recent = history.recent("or", location, farmer_id)
+    if recent:
+        with st.expander(f"🕘 ସାମ୍ପ୍ରତିକ ସୁପାରିଶ ({len(recent)})"):
+            for row in recent:
+                crops = ", ".join(crop['crop_name'] for crop in row['result']['recommendations'])
+                when = datetime.fromtimestamp(row['created_at']).strftime("%d-%m-%Y %H:%M")
+                month_label = months[row['month'] - 1] if row['month'] else ""
+                col1, col2 = st.columns([5, 1])
+                col1.write(f"{when} · {month_label} · ₹{row['budget']:,} — {crops}")
+                if col2.button("ଦେଖନ୍ତୁ", key=f"history-{row['id']}"):
+                    session_store.save_recommendations(row['result'])
+                    st.rerun()
+    
     # Get Recommendations Button
     if st.button("🚀 ଫସଲ ସୁପାରିଶ ପାଆନ୍ତୁ", type="primary", use_container_width=True):
         if not location.strip():
             st.error("ଦୟାକରି ସ୍ଥାନ ଦିଅନ୍ତୁ")
             return
         
-        model = setup_gemini_api()
-        if not model:
-            st.error("Gemini API ସଂଯୋଗରେ ସମସ୍ୟା | ଦୟାକରି ଆପଣଙ୍କର ଇଣ୍ଟରନେଟ୍ ସଂଯୋଗ ଯାଞ୍ଚ କରନ୍ତୁ |")
-            return
+        # Serve the last answer for these inputs at once and refresh it in the background if stale
+        key = history_store.request_key("or", location, selected_month, budget, experience, farm_size, organic)
+        
+        def generate():
+            model = setup_gemini_api()
+            if not model:
+                return None
+            return get_crop_recommendations(model, selected_month, location, budget,
+                                            experience, farm_size, organic)
         
-        with st.spinner("🤖 ବଜାର ଅବସ୍ଥାର ବିଶ୍ଳେଷଣ ଏବଂ ସୁପାରିଶ ପ୍ରସ୍ତୁତ କରାଯାଉଛି..."):
-            recommendations = get_crop_recommendations(model, selected_month, location, budget, 
-                                                     experience, farm_size, organic)
+        def store_result(result):
+            # Fallback cards and salvaged answers are shown once but never served again from history
+            if crop_core.is_complete(result):
+                history.append(result, "or", location, selected_month, budget,
+                               experience, farm_size, organic, farmer_id=farmer_id)
+        
+        def find_similar():
+            return similar_requests.find_similar(history, "or", location, selected_month, budget,
+                                                 experience, farm_size, organic)
+        
+        if revalidate.serve_cached(history, key, generate, store_result, find_similar) is None:
+            model = setup_gemini_api()
+            if not model:
+                st.error("Gemini API ସଂଯୋଗରେ ସମସ୍ୟା | ଦୟାକରି ଆପଣଙ୍କର ଇଣ୍ଟରନେଟ୍ ସଂଯୋଗ ଯାଞ୍ଚ କରନ୍ତୁ |")
+                return
+        
+            with st.spinner("🤖 ବଜାର ଅବସ୍ଥାର ବିଶ୍ଳେଷଣ ଏବଂ ସୁପାରିଶ ପ୍ରସ୍ତୁତ କରାଯାଉଛି..."):
+                recommendations = get_crop_recommendations(model, selected_month, location, budget, 
+                                                         experience, farm_size, organic)
             
-            if recommendations:
-                st.session_state.recommendations = recommendations
-                st.success("✅ ସୁପାରିଶଗୁଡ଼ିକ ସଫଳତାର ସହ ପ୍ରସ୍ତୁତ କରାଯାଇଛି!")
-            else:
-                st.error("❌ ସୁପାରିଶ ପ୍ରସ୍ତୁତ କରିବାରେ ବିଫଳ | ଦୟାକରି ପୁନଃ ଚେଷ୍ଟା କରନ୍ତୁ |")
+                if recommendations:
+                    session_store.save_recommendations(recommendations)
+                    store_result(recommendations)
+                    revalidate.clear_served()
+                    st.success("✅ ସୁପାରିଶଗୁଡ଼ିକ ସଫଳତାର ସହ ପ୍ରସ୍ତୁତ କରାଯାଇଛି!")
+                else:
+                    st.error("❌ ସୁପାରିଶ ପ୍ରସ୍ତୁତ କରିବାରେ ବିଫଳ | ଦୟାକରି ପୁନଃ ଚେଷ୍ଟା କରନ୍ତୁ |")
     
     # Display Recommendations
-    if st.session_state.recommendations:
-        recommendations = st.session_state.recommendations
+    revalidate.apply_refresh()
+    recommendations = session_store.load_recommendations()
+    if recommendations:
+        similar = st.session_state.get("served_similar")
+        if similar:
+            st.info(f"🔁 ଆପଣଙ୍କ କୃଷି-ଜଳବାୟୁ ଅଞ୍ଚଳର ସମାନ ଅନୁରୋଧ ({similar['district'].title()}, ₹{similar['budget']:,}) ର ପରାମର୍ଶ, ଆପଣଙ୍କ ବିବରଣୀ ଅନୁସାରେ ସଂଶୋଧିତ |")
+        elif st.session_state.get("served_age") is not None:
+            if st.session_state.get("pending_refresh"):
+                st.info(f"🕘 {revalidate.format_age(st.session_state.served_age)} ପୂର୍ବର ସଞ୍ଚିତ ସୁପାରିଶ | ନୂଆ ସୁପାରିଶ ପୃଷ୍ଠଭୂମିରେ ପ୍ରସ୍ତୁତ ହେଉଛି…")
+                revalidate.watch_refresh()
+            else:
+                st.info(f"🕘 {revalidate.format_age(st.session_state.served_age)} ପୂର୍ବର ସଞ୍ଚିତ ସୁପାରିଶ |")
+        
+        # Start the audio in the background so cards and charts render without waiting; lite mode waits for a tap
+        speech_text = crop_core.speech_text("or", recommendations)
+        if not lite:
+            speech_job = speak_text(speech_text)
+            crop_jobs = [speak_text(crop_core.crop_speech_text("or", crop)) for crop in recommendations['recommendations']]
+        crop_audio_slots = []
         
         # Summary Metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -266,7 +300,7 @@ def main():
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                display_crop_card(crop, i)
+                display_crop_card(crop, i, location)
             
             with col2:
                 st.markdown(f"### #{i+1}")
@@ -278,6 +312,8 @@ def main():
                     st.markdown("**⚠️ ସତର୍କତାଗୁଡ଼ିକ:**")
                     for consideration in crop['considerations']:
                         st.write(f"• {consideration}")
+                    
+                    crop_audio_slots.append(st.container())
         
         # Analysis Tab
         if len(recommendations['recommendations']) > 1:
@@ -295,14 +331,83 @@ def main():
                 else:
                     profit_numeric.append(1)
             
-            fig = px.bar(x=crop_names, y=profit_numeric, title="ଲାଭ ତୁଳନା",
-                        labels={'x': 'ଫସଲଗୁଡ଼ିକ', 'y': 'ଲାଭ ସ୍ତର'},
-                        color=profit_numeric, color_continuous_scale='Oranges')
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(crop_names, profit_numeric, title="ଲାଭ ତୁଳନା", y_label='ଲାଭ ସ୍ତର',
+                                                           y_ticks=[(1, 'କମ୍'), (2, 'ମଧ୍ୟମ'), (3, 'ଉଚ୍ଚ')]))
+            else:
+                fig = px.bar(x=crop_names, y=profit_numeric, title="ଲାଭ ତୁଳନା",
+                            labels={'x': 'ଫସଲଗୁଡ଼ିକ', 'y': 'ଲାଭ ସ୍ତର'},
+                            color=profit_numeric, color_continuous_scale='Oranges')
             
-            fig.update_layout(showlegend=False,
-                            yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
-                                     ticktext=['କମ୍', 'ମଧ୍ୟମ', 'ଉଚ୍ଚ']))
-            st.plotly_chart(fig, use_container_width=True)
+                fig.update_layout(showlegend=False,
+                                yaxis=dict(tickmode='array', tickvals=[1, 2, 3], 
+                                         ticktext=['କମ୍', 'ମଧ୍ୟମ', 'ଉଚ୍ଚ']))
+                st.plotly_chart(fig, use_container_width=True)
+        
+        # Expected mandi price in each crop's harvest month, from the local price history
+        harvest = price_trends.harvest_frame(recommendations, location, selected_month)
+        if not harvest.empty:
+            st.subheader("📈 ଅମଳ ସମୟରେ ଆନୁମାନିକ ଦର")
+            harvest['harvest_label'] = [months[m - 1] for m in harvest['harvest_month']]
+            if lite:
+                lite_mode.show_svg(lite_mode.svg_bar_chart(harvest['crop'], harvest['expected'], title="ଅମଳ ମାସରେ ଆନୁମାନିକ ମଣ୍ଡି ଦର",
+                                                           y_label='₹ ପ୍ରତି କ୍ୱିଣ୍ଟାଲ', low=harvest['low'], high=harvest['high'],
+                                                           markers=harvest['current'], bar_name="ଅମଳ ସମୟରେ", marker_name="ଏବେ",
+                                                           bar_text=harvest['harvest_label']))
+            else:
+                fig = px.bar(harvest, x='crop', y='expected', text='harvest_label', title="ଅମଳ ମାସରେ ଆନୁମାନିକ ମଣ୍ଡି ଦର",
+                            error_y=harvest['high'] - harvest['expected'],
+                            error_y_minus=harvest['expected'] - harvest['low'],
+                            labels={'crop': 'ଫସଲ', 'expected': '₹ ପ୍ରତି କ୍ୱିଣ୍ଟାଲ'},
+                            color_discrete_sequence=['#FF6B35'])
+                fig.data[0].name = "ଅମଳ ସମୟରେ"
+                fig.add_scatter(x=harvest['crop'], y=harvest['current'], mode='markers', name="ଏବେ",
+                                marker=dict(color='#138808', size=12, symbol='diamond'))
+                fig.update_layout(showlegend=True)
+                st.plotly_chart(fig, use_container_width=True)
+            st.caption("ପଟି: ଅମଳ ପର୍ଯ୍ୟନ୍ତ ଦରର ସାଧାରଣ ହ୍ରାସବୃଦ୍ଧି | ଆପଣଙ୍କ ରାଜ୍ୟର ରେକର୍ଡ ହୋଇଥିବା ମଣ୍ଡି ଦର ଆଧାରରେ |")
+        
+        # Simulated ROI spread and chance of a loss, so the downside is visible next to the estimate
+        risk = roi_simulation.simulate(recommendations, location, selected_month, budget)
+        if risk:
+            st.subheader("🎲 ଲାଭ ବିପଦ")
+            lite_mode.table(pd.DataFrame([{
+                'ଫସଲ': name,
+                'ଖରାପ ବର୍ଷ ROI': f"{result['roi_percentiles']['p5']:.0f}%",
+                'ସାଧାରଣ ROI': f"{result['roi_percentiles']['p50']:.0f}%",
+                'ଭଲ ବର୍ଷ ROI': f"{result['roi_percentiles']['p95']:.0f}%",
+                'କ୍ଷତି ସମ୍ଭାବନା': f"{result['loss_probability']:.0%}",
+                'ଆପଣଙ୍କ ବଜେଟରେ ସାଧାରଣ ଲାଭ': roi_simulation.format_rupees(result['median_profit']),
+            } for name, result in risk.items()]), lite)
+            st.caption(f"ପ୍ରତି ଫସଲର {roi_simulation.TRIALS:,} ଟି ଅନୁମାନିତ ଋତୁରୁ: ଅମଳ, ଖର୍ଚ୍ଚ ଓ ଦର ସ୍ଥାନୀୟ ତଥ୍ୟରୁ | ଖରାପ ଓ ଭଲ ବର୍ଷ ହେଉଛି ସବୁଠୁ ଖରାପ ଓ ଭଲ 5% |")
+
+            # Land and budget split across the crops; moving a slider re-solves from cached tables
+            st.subheader("🧮 ବଜେଟ୍ ବଣ୍ଟନ")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                acres = st.number_input("🌾 ଚାଷ ପାଇଁ ଜମି (ଏକର)", min_value=0.5, max_value=1000.0, step=0.5,
+                                        value=budget_optimizer.default_acres("or", farm_size))
+            with col2:
+                max_share = st.slider("ଗୋଟିଏ ଫସଲକୁ ସର୍ବାଧିକ ଜମି (%)", 20, 100, int(budget_optimizer.DEFAULT_MAX_SHARE * 100), step=5)
+            with col3:
+                max_loss = st.number_input("ଖରାପ ବର୍ଷରେ ସହିପାରୁଥିବା କ୍ଷତି (₹)", min_value=0, max_value=10000000, step=1000,
+                                           value=int(budget * budget_optimizer.DEFAULT_MAX_LOSS_SHARE))
+            plan = budget_optimizer.optimize(risk, budget, acres, max_share / 100, max_loss)
+            if plan and plan['crops']:
+                lite_mode.table(pd.DataFrame([{
+                    'ଫସଲ': crop['crop'],
+                    'ଏକର': crop['acres'],
+                    'ଜମିର ଅଂଶ': f"{crop['share']:.0%}",
+                    'ନିବେଶ': roi_simulation.format_rupees(crop['investment']),
+                    'ଆନୁମାନିକ ଲାଭ': roi_simulation.format_rupees(crop['expected_profit']),
+                    'ଖରାପ ବର୍ଷ': roi_simulation.format_rupees(crop['worst_case']),
+                } for crop in plan['crops']]), lite)
+                st.caption(f"{acres:g} ରୁ {plan['acres']} ଏକରରେ {roi_simulation.format_rupees(plan['investment'])} ଲଗାନ୍ତୁ: ଆନୁମାନିକ ଲାଭ {roi_simulation.format_rupees(plan['expected_profit'])}, ସବୁ ଫସଲର ବର୍ଷ ଖରାପ ହେଲେ {roi_simulation.format_rupees(plan['worst_case'])} |")
+            elif all(result['mean_profit_per_acre'] <= 0 for result in risk.values()):
+                # Leaving all the land fallow is then the best plan, whatever the limits
+                st.warning("ଏହି ଋତୁରେ ଏଥିରୁ କୌଣସି ଫସଲରୁ ଲାଭ ଆଶା ନାହିଁ, ତେଣୁ ଯୋଜନାରେ ଏଗୁଡ଼ିକ ପାଇଁ ଜମି ରଖାଯାଇନାହିଁ | ଅନ୍ୟ ଫସଲ ବିଷୟରେ ସ୍ଥାନୀୟ କୃଷି ବିଶେଷଜ୍ଞଙ୍କୁ ପଚାରନ୍ତୁ |")
+            else:
+                st.warning("ଏହି ବଜେଟ୍ ଓ କ୍ଷତି ସୀମାରେ କୌଣସି ଚାଷ ଯୋଜନା ସମ୍ଭବ ନୁହେଁ | କ୍ଷତି ସୀମା ବଢ଼ାନ୍ତୁ କିମ୍ବା କମ୍ ଜମି ବାଛନ୍ତୁ |")
         
         # Advice Section
         col1, col2 = st.columns(2)
@@ -315,6 +420,10 @@ def main():
             st.markdown("#### 📅 ଋତୁଗତ ନୋଟ୍ସ")
             st.warning(recommendations['seasonal_notes'])
         
+        # 👉 Voice Feature
+        st.markdown("### 🔊 ସୁପାରିଶ ଶୁଣନ୍ତୁ")
+        audio_slot = st.container()
+        
         # Additional Tips
         st.markdown("#### 📚 ଅତିରିକ୍ତ ସୁଝାବ")
         tips = [
@@ -327,6 +436,20 @@ def main():
         
         for tip in tips:
             st.write(tip)
+        
+        # Attach the audio players now that everything else is on the page
+        if lite:
+            # Keys include the result's store key, so a new answer starts without audio again
+            result_key = st.session_state.recommendations
+            lite_mode.deferred_audio(audio_slot, "🔊 ଶୁଣନ୍ତୁ", f"listen-{result_key}", lambda: speak_text(speech_text), attach_audio)
+            for i, (crop, slot) in enumerate(zip(recommendations['recommendations'], crop_audio_slots)):
+                lite_mode.deferred_audio(slot, "🔊 ଶୁଣନ୍ତୁ", f"listen-{result_key}-{i}",
+                                         lambda crop=crop: speak_text(crop_core.crop_speech_text("or", crop)),
+                                         attach_audio, show_timing=False)
+        else:
+            attach_audio(speech_job, audio_slot)
+            for job, slot in zip(crop_jobs, crop_audio_slots):
+                attach_audio(job, slot, show_timing=False)
     
     else:
         # Welcome Section
@@ -349,4 +472,5 @@ def main():
         """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Admin pages (?admin) run in this process, so memory diagnostics measure this app
+    admin_auth.navigation(main, "🌾 ଫସଲ ଲାଭ ସଲାହକାର")
@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import knowledge_base
+import mandi_prices
+import telemetry
+
+TRENDS_FILE = "trends.parquet"
+# Months of history used for the price drift; older trends say little about the next harvest
+DRIFT_MONTHS = 24
+ROLLING_MONTHS = (3, 12)
+# Width of the expected-price band in standard deviations (about a 68% range)
+BAND_SIGMAS = 1.0
+DEFAULT_GROWING_MONTHS = 4
+NATIONAL = "*"
+
+_lock = threading.Lock()
+_trends = None
+_trends_version = None
+
+
+def _monthly_prices(root):
+    """Median modal price per commodity, state and month, plus an all-India series per commodity"""
+    frames = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(".parquet") and name not in ("index.parquet", TRENDS_FILE):
+                path = os.path.join(directory, name)
+                table = mandi_prices.pq.read_table(path, columns=["date", "modal_price"])
+                meta = table.schema.metadata
+                frame = table.to_pandas()
+                frame["commodity"] = meta[b"commodity"].decode()
+                frame["state"] = meta[b"state"].decode()
+                frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["commodity", "state", "month", "price"])
+    daily = pd.concat(frames, ignore_index=True)
+    daily["month"] = pd.to_datetime(daily["date"]).dt.to_period("M")
+    daily = pd.concat([daily, daily.assign(state=NATIONAL)], ignore_index=True)
+    return (daily.groupby(["commodity", "state", "month"], observed=True)["modal_price"].median()
+            .rename("price").reset_index())
+
+
+def compute_trends(monthly):
+    """Rolling means, seasonal indices, volatility and drift per commodity and state, all vectorized.
+
+    Seasonality is the ratio to a centred 12-month moving average,
+    averaged per calendar month and normalised to a mean of 1. Volatility
+    and drift are the standard deviation and recent mean of monthly log
+    changes of the deseasonalised price.
+    """
+    keys = ["commodity", "state"]
+    monthly = monthly.sort_values(keys + ["month"]).reset_index(drop=True)
+    groups = monthly.groupby(keys, sort=False)["price"]
+    for window in ROLLING_MONTHS:
+        monthly[f"rolling_{window}"] = groups.rolling(window, min_periods=1).mean().to_numpy()
+    # 2x12 centred moving average, the classic ratio-to-moving-average baseline
+    centred = pd.Series(groups.rolling(12, center=True, min_periods=12).mean().to_numpy(), index=monthly.index)
+    monthly["centred"] = (centred + centred.groupby([monthly["commodity"], monthly["state"]]).shift(-1)) / 2
+    monthly["calendar_month"] = monthly["month"].dt.month
+    monthly["ratio"] = monthly["price"] / monthly["centred"]
+
+    seasonal = monthly.pivot_table(index=keys, columns="calendar_month", values="ratio", aggfunc="mean")
+    seasonal = seasonal.reindex(columns=range(1, 13)).fillna(1.0)
+    seasonal = seasonal.div(seasonal.mean(axis=1), axis=0)
+
+    factors = seasonal.stack().rename("factor")
+    monthly = monthly.join(factors, on=keys + ["calendar_month"])
+    monthly["log_level"] = np.log(monthly["price"] / monthly["factor"])
+    monthly["change"] = monthly.groupby(keys, sort=False)["log_level"].diff()
+
+    recent = monthly.groupby(keys, sort=False).tail(DRIFT_MONTHS).groupby(keys, sort=False)
+    last = monthly.groupby(keys, sort=False).tail(1).set_index(keys)
+    trends = pd.DataFrame({
+        "last_month": last["month"].dt.to_timestamp(),
+        "price": last["price"],
+        "rolling_3": last["rolling_3"],
+        "rolling_12": last["rolling_12"],
+        "level": np.exp(monthly.groupby(keys, sort=False).tail(3).groupby(keys, sort=False)["log_level"].mean()),
+        "drift": recent["change"].mean().fillna(0.0),
+        "volatility": monthly.groupby(keys, sort=False)["change"].std().fillna(0.0),
+        "months": monthly.groupby(keys, sort=False).size(),
+    })
+    trends = trends.join(seasonal.rename(columns=lambda m: f"season_{m}"))
+    return trends.reset_index()
+
+
+def build(root=mandi_prices.PRICE_DIR):
+    """Precompute trends for every commodity and state in the price store"""
+    trends = compute_trends(_monthly_prices(root))
+    trends.to_parquet(os.path.join(root, TRENDS_FILE), index=False)
+    return trends
+
+
+def load_trends(root=mandi_prices.PRICE_DIR):
+    """Trend table keyed by (commodity, state) as the last ingest wrote it, or None before the first one"""
+    global _trends, _trends_version
+    trends_path = os.path.join(root, TRENDS_FILE)
+    try:
+        version = (root, os.path.getmtime(trends_path))
+    except OSError:
+        return None
+    with _lock:
+        if _trends is not None and version == _trends_version:
+            return _trends
+        try:
+            trends = pd.read_parquet(trends_path)
+        except mandi_prices.READ_ERRORS as e:
+            # Charts and simulations then go without local prices instead of failing the page
+            telemetry.record("mandi_error", stage="trends", error=str(e))
+            return None
+        _trends, _trends_version = trends.set_index(["commodity", "state"]).sort_index(), version
+        return _trends
+
+
+def growing_months(growing_period):
+    """Months to harvest from text like '4-5 months', '120 days' or '4 महीने'"""
+    numbers = [int(n) for n in re.findall(r"\d+", growing_period or "")]
+    if not numbers:
+        return DEFAULT_GROWING_MONTHS
+    months = sum(numbers[:2]) / len(numbers[:2])
+    if re.search(r"day|दिन|ଦିନ", growing_period, re.IGNORECASE):
+        months /= 30
+    return max(1, round(months))
+
+
+def harvest_expectation(crop, location, month, root=mandi_prices.PRICE_DIR, today=None):
+    """Expected price (₹ per quintal) in the harvest month for one crop card, or None"""
+    if mandi_prices.pa is None:
+        return None
+    commodity = mandi_prices.commodity_for(crop["crop_name"])
+    trends = load_trends(root) if commodity else None
+    if trends is None:
+        return None
+    state = knowledge_base.detect_state(location)
+    key = (commodity, state) if (commodity, state) in trends.index else (commodity, NATIONAL)
+    if key not in trends.index:
+        return None
+    row = trends.loc[key]
+
+    today = today or date.today()
+    sowing = knowledge_base.month_number(month) or today.month
+    growing = growing_months(crop.get("growing_period"))
+    # Months from now until the harvest, and from the last recorded price until then
+    harvest_index = today.year * 12 + today.month - 1 + (sowing - today.month) % 12 + growing
+    last = row["last_month"]
+    ahead = max(1, harvest_index - (last.year * 12 + last.month - 1))
+    harvest_month = harvest_index % 12 + 1
+
+    expected = row["level"] * np.exp(row["drift"] * ahead) * row[f"season_{harvest_month}"]
+    spread = np.exp(BAND_SIGMAS * row["volatility"] * np.sqrt(ahead))
+    return {
+        "commodity": commodity,
+        "scope": "state" if key[1] != NATIONAL else "india",
+        "harvest_month": harvest_month,
+        "months_ahead": ahead,
+        "current": round(float(row["rolling_3"])),
+        "expected": round(float(expected)),
+        "low": round(float(expected / spread)),
+        "high": round(float(expected * spread)),
+        "volatility": round(float(row["volatility"]), 4),
+    }
+
+
+def harvest_frame(recommendations, location, month, root=mandi_prices.PRICE_DIR):
+    """Expected harvest prices for the recommended crops that have price history"""
+    rows = []
+    for crop in recommendations["recommendations"]:
+        expectation = harvest_expectation(crop, location, month, root)
+        if expectation:
+            rows.append(dict(expectation, crop=crop["crop_name"]))
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Benchmark the trend build over a synthetic store: python price_trends.py [years] [markets per state]
+    # Rebuild for the real store: python price_trends.py build
+    import shutil
+    import tempfile
+
+    if sys.argv[1:2] == ["build"]:
+        start = time.perf_counter()
+        trends = build()
+        print(f"{len(trends)} commodity/state trends in {time.perf_counter() - start:.2f} s")
+        sys.exit()
+
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    markets_per_state = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    workdir = tempfile.mkdtemp(prefix="trends-bench-")
+    try:
+        source = os.path.join(workdir, "agmarknet.csv")
+        rows = mandi_prices._write_sample(source, years, markets_per_state)
+        root = os.path.join(workdir, "store")
+        mandi_prices.ingest([source], root)
+        # Ingest already built them; time a rebuild on its own
+        start = time.perf_counter()
+        trends = build(root)
+        print(f"build: {rows:,} daily rows -> {len(trends)} commodity/state trends in "
+              f"{time.perf_counter() - start:.2f} s")
+        load_trends(root)
+        recommendations = {"recommendations": [
+            {"crop_name": name, "growing_period": period}
+            for name, period in [("Wheat", "4-5 months"), ("Mustard", "120 days"), ("Potato", "3 months"),
+                                 ("Onion", "4 महीने")]
+        ]}
+        timings = []
+        for _ in range(200):
+            start = time.perf_counter()
+            frame = harvest_frame(recommendations, "Ludhiana, Punjab", "November", root)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"chart data for {len(frame)} crops: p50 {timings[100]:.2f} ms, p99 {timings[197]:.2f} ms")
+        print(frame[["crop", "harvest_month", "months_ahead", "current", "expected", "low", "high"]].to_string(index=False))
+    finally:
+        shutil.rmtree(workdir)
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import string
+import sys
+
+import telemetry
+
+# Variant to use per feature, for A/B runs; e.g. CROP_PROMPT_VARIANTS='{"recommendation": "short"}'
+ACTIVE_VARIANTS = json.loads(os.getenv("CROP_PROMPT_VARIANTS", "{}"))
+DEFAULT_VARIANT = "default"
+
+RECOMMENDATION_EN = """\
+You are an Indian agriculture consultant. Based on the following information, recommend crops:
+
+Month: {month}
+Location: {location}
+Budget: ₹{budget}
+Experience: {experience}
+Farm Size: {farm_size}
+Organic Farming: {organic}
+
+Local reference notes (prefer these facts over general knowledge):
+{reference_notes}
+
+Respond in JSON format:
+{{
+    "recommendations": [
+        {{
+            "crop_name": "Crop Name",
+            "profit_potential": "High/Medium/Low",
+            "estimated_roi": "percentage",
+            "investment_required": "amount",
+            "growing_period": "time in months",
+            "key_benefits": ["benefit1", "benefit2", "benefit3"],
+            "considerations": ["consideration1", "consideration2"],
+            "market_price_range": "market rate"
+        }}
+    ],
+    "general_advice": "General advice",
+    "seasonal_notes": "Seasonal notes"
+}}
+
+Recommend 3-5 crops based on Indian weather patterns, soil conditions, and market conditions.
+Keep every text field to one short sentence.
+"""
+
+RECOMMENDATION_HI = """\
+आप एक भारतीय कृषि सलाहकार हैं। निम्नलिखित जानकारी के आधार पर, फसलों की सिफारिश करें:
+
+महीना: {month}
+स्थान: {location}
+बजट: ₹{budget}
+अनुभव: {experience}
+खेत का आकार: {farm_size}
+जैविक खेती: {organic}
+
+स्थानीय संदर्भ नोट्स (सामान्य जानकारी के बजाय इन तथ्यों को प्राथमिकता दें):
+{reference_notes}
+
+कृपया JSON प्रारूप में उत्तर दें (सभी जानकारी हिंदी में):
+{{
+    "recommendations": [
+        {{
+            "crop_name": "फसल का नाम",
+            "profit_potential": "उच्च/मध्यम/कम",
+            "estimated_roi": "प्रतिशत में",
+            "investment_required": "राशि",
+            "growing_period": "महीनों में समय",
+            "key_benefits": ["लाभ1", "लाभ2", "लाभ3"],
+            "considerations": ["विचार1", "विचार2"],
+            "market_price_range": "बाजार दर"
+        }}
+    ],
+    "general_advice": "सामान्य सलाह हिंदी में",
+    "seasonal_notes": "मौसमी टिप्पणी हिंदी में"
+}}
+
+भारतीय मौसम पैटर्न, मिट्टी की स्थिति और बाजार की स्थिति के आधार पर 3-5 फसलों की सिफारिश करें।
+सभी जानकारी हिंदी में दें।
+हर टेक्स्ट फ़ील्ड को एक छोटे वाक्य में रखें।
+"""
+
+RECOMMENDATION_OR = """\
+ଆପଣ ଜଣେ ଭାରତୀୟ କୃଷି ପରାମର୍ଶଦାତା | ନିମ୍ନଲିଖିତ ତଥ୍ୟ ଆଧାରରେ ଫସଲ ସୁପାରିଶ କରନ୍ତୁ:
+
+ମାସ: {month}
+ସ୍ଥାନ: {location}
+ବଜେଟ୍: ₹{budget}
+ଅନୁଭବ: {experience}
+ଜମି ଆକାର: {farm_size}
+ଜୈବିକ ଚାଷ: {organic}
+
+ସ୍ଥାନୀୟ ସନ୍ଦର୍ଭ ତଥ୍ୟ (ସାଧାରଣ ଜ୍ଞାନ ବଦଳରେ ଏହି ତଥ୍ୟକୁ ପ୍ରାଧାନ୍ୟ ଦିଅନ୍ତୁ):
+{reference_notes}
+
+JSON format ରେ ଉତ୍ତର ଦିଅନ୍ତୁ:
+{{
+    "recommendations": [
+        {{
+            "crop_name": "ଫସଲର ନାମ",
+            "profit_potential": "High/Medium/Low",
+            "estimated_roi": "ପ୍ରତିଶତ",
+            "investment_required": "ପରିମାଣ",
+            "growing_period": "ମାସରେ ସମୟ",
+            "key_benefits": ["ଲାଭ1", "ଲାଭ2", "ଲାଭ3"],
+            "considerations": ["ସତର୍କତା1", "ସତର୍କତା2"],
+            "market_price_range": "ବଜାର ଦର"
+        }}
+    ],
+    "general_advice": "ସାଧାରଣ ପରାମର୍ଶ",
+    "seasonal_notes": "ଋତୁଗତ ନୋଟ୍ସ"
+}}
+
+ଭାରତୀୟ ଋତୁ, ମାଟି ଏବଂ ବଜାର ଅବସ୍ଥା ଅନୁସାରେ 3-5 ଟି ଫସଲର ସୁପାରିଶ କରନ୍ତୁ |
+ପ୍ରତ୍ୟେକ ଲେଖା ଗୋଟିଏ ଛୋଟ ବାକ୍ୟରେ ରଖନ୍ତୁ |
+"""
+
+# Detailed template of the original single-language app (sih.py)
+DETAILED_RECOMMENDATION_EN = """\
+You are an expert agricultural consultant with deep knowledge of crop profitability, seasonal patterns, and regional farming conditions.
+
+Given the following information:
+- Month: {month}
+- Location: {location}
+- Budget: ${budget}
+
+Local reference notes (prefer these facts over general knowledge):
+{reference_notes}
+
+Please provide crop recommendations that would be most profitable for this situation. Consider:
+1. Seasonal suitability for the given month
+2. Climate and soil conditions typical for the location
+3. Initial investment requirements within the budget
+4. Expected profit margins and ROI
+5. Market demand and pricing trends
+6. Growing duration and harvest timing
+
+Format your response as a JSON with the following structure:
+{{
+    "recommendations": [
+        {{
+            "crop_name": "Crop Name",
+            "profit_potential": "High/Medium/Low",
+            "estimated_roi": "percentage",
+            "investment_required": "amount",
+            "growing_period": "duration in months",
+            "key_benefits": ["benefit1", "benefit2", "benefit3"],
+            "considerations": ["consideration1", "consideration2"],
+            "market_price_range": "price range per unit"
+        }}
+    ],
+    "general_advice": "Overall farming advice for the given conditions",
+    "seasonal_notes": "Important seasonal considerations"
+}}
+
+Provide 3-5 crop recommendations ranked by profitability potential.
+Keep every text field to one short sentence.
+"""
+
+CONTINUATION = ("Your previous answer was cut off. Continue exactly where it stopped, without repeating "
+                "anything and without code fences, so that both parts together form the complete JSON.")
+
+# How each language answers the organic farming question inside the prompt
+YES_NO = {"en": ("Yes", "No"), "hi": ("हाँ", "नहीं"), "or": ("ହଁ", "ନା")}
+
+
+class PromptTemplate:
+    """A str.format template parsed once, with a version derived from its text"""
+
+    def __init__(self, language, feature, text, variant=DEFAULT_VARIANT):
+        self.language = language
+        self.feature = feature
+        self.variant = variant
+        self.text = text
+        # Any edit to the wording gives a new version, and with it new cache keys
+        self.version = f"{feature}-{language}-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]}"
+        self._segments = [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+        self.fields = {field for _, field in self._segments if field}
+
+    def render(self, **values):
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt {self.version} needs {', '.join(sorted(missing))}")
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._segments)
+
+
+_registry = {}
+
+
+def register(language, feature, text, variant=DEFAULT_VARIANT):
+    """Add a template; variants of one feature can be switched with CROP_PROMPT_VARIANTS"""
+    template = PromptTemplate(language, feature, text, variant)
+    _registry.setdefault((language, feature), {})[variant] = template
+    return template
+
+
+def get(language, feature):
+    """Active template for a language and feature"""
+    variants = _registry[(language, feature)]
+    return variants.get(ACTIVE_VARIANTS.get(feature, DEFAULT_VARIANT)) or variants[DEFAULT_VARIANT]
+
+
+def version(language, feature="recommendation"):
+    return get(language, feature).version
+
+
+def versions():
+    """Active version of every registered template, keyed by 'language/feature'"""
+    return {f"{language}/{feature}": get(language, feature).version for language, feature in sorted(_registry)}
+
+
+register("en", "recommendation", RECOMMENDATION_EN)
+register("hi", "recommendation", RECOMMENDATION_HI)
+register("or", "recommendation", RECOMMENDATION_OR)
+register("en", "detailed_recommendation", DETAILED_RECOMMENDATION_EN)
+for _language in YES_NO:
+    register(_language, "continuation", CONTINUATION)
+
+
+def variant_report(log_path=telemetry.TELEMETRY_LOG):
+    """Latency and token use of model calls per prompt version, from the telemetry log"""
+    report = {}
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get("event") != "stage" or event.get("stage") != "llm_call" or event.get("error"):
+                continue
+            entry = report.setdefault(event.get("prompt_version"), {"calls": 0, "durations": [],
+                                                                    "input_tokens": 0, "output_tokens": 0})
+            entry["calls"] += 1
+            entry["durations"].append(event["duration_ms"])
+            entry["input_tokens"] += event.get("input_tokens") or 0
+            entry["output_tokens"] += event.get("output_tokens") or 0
+    return report
+
+
+if __name__ == "__main__":
+    # Active prompt versions, then a per-version comparison: python prompts.py [telemetry.jsonl]
+    for name, prompt_version in versions().items():
+        print(f"{name:32} {prompt_version}")
+    log_path = sys.argv[1] if len(sys.argv) > 1 else telemetry.TELEMETRY_LOG
+    if os.path.exists(log_path):
+        print(f"\n{'prompt version':32} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'in tok':>8} {'out tok':>8}")
+        for prompt_version, entry in sorted(variant_report(log_path).items(), key=lambda item: str(item[0])):
+            durations = sorted(entry["durations"])
+            p50 = durations[len(durations) // 2]
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            print(f"{str(prompt_version):32} {entry['calls']:>6} {p50:>8.0f} {p95:>8.0f} "
+                  f"{entry['input_tokens'] / entry['calls']:>8.0f} {entry['output_tokens'] / entry['calls']:>8.0f}")
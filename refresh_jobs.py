@@ -0,0 +1,59 @@
+import threading
+import time
+
+import crop_core
+import scheduler
+import telemetry
+
+# Background regeneration of stored results; no Streamlit here, so the API server shares it
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+FINISHED_REFRESH_TTL = 10 * 60
+
+_inflight = {}
+_lock = threading.Lock()
+
+
+def is_stale(age_seconds):
+    """Whether a stored result this old is due to be regenerated"""
+    return age_seconds > crop_core.FRESHNESS_WINDOW
+
+
+def _run_refresh(key, generate, on_result):
+    start = time.perf_counter()
+    result = None
+    try:
+        result = generate()
+        # A fallback card or salvaged answer would overwrite a good stored result with a worse one
+        if not crop_core.is_complete(result):
+            result = None
+        if result:
+            on_result(result)
+    finally:
+        telemetry.record("stage", stage="background_refresh",
+                         duration_ms=round((time.perf_counter() - start) * 1000, 2), error=not result)
+    return result
+
+
+def schedule_refresh(key, generate, on_result):
+    """Regenerate a result in the scheduler's refresh class unless a refresh is already queued or running"""
+    now = time.monotonic()
+    with _lock:
+        # Forget refreshes that finished long ago
+        for old_key in [k for k, (f, t) in _inflight.items() if f.done() and now - t > FINISHED_REFRESH_TTL]:
+            del _inflight[old_key]
+        running = _inflight.get(key)
+        if running is not None and not running[0].done():
+            return running[0]
+        future = scheduler.get_scheduler().submit(scheduler.REFRESH, _run_refresh, key, generate, on_result)
+        _inflight[key] = (future, now)
+        return future
+
+
+def refresh_future(key):
+    """Future of the latest refresh scheduled for key, or None when none is remembered"""
+    with _lock:
+        entry = _inflight.get(key)
+    return entry and entry[0]
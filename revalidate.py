@@ -0,0 +1,87 @@
+import time
+
+import streamlit as st
+
+import crop_core
+import refresh_jobs
+import session_store
+import telemetry
+
+REFRESH_POLL_SECONDS = 3
+
+
+def format_age(seconds):
+    """Compact age such as '5m', '3h' or '2d'"""
+    if seconds < refresh_jobs.HOUR:
+        return f"{max(1, int(seconds // 60))}m"
+    if seconds < refresh_jobs.DAY:
+        return f"{int(seconds // refresh_jobs.HOUR)}h"
+    return f"{int(seconds // refresh_jobs.DAY)}d"
+
+
+def serve_cached(history, key, generate, on_result, find_similar=None):
+    """Serve the newest stored result for these inputs and refresh it in the background if stale.
+
+    When nothing was stored for exactly these inputs, find_similar() may
+    supply the closest near-identical request from the same agro-climatic
+    zone instead. Returns the cached
+    result, or None when nothing matching has been stored yet.
+    """
+    row = history.latest_for_request(key)
+    shared_from = None
+    if row is None and find_similar is not None:
+        row = find_similar()
+        shared_from = row and {"district": row["district"], "budget": row["budget"]}
+    if row is None:
+        return None
+
+    age = time.time() - row["created_at"]
+    stale = refresh_jobs.is_stale(age)
+    session_store.save_recommendations(row["result"])
+    st.session_state.served_age = age
+    st.session_state.served_similar = shared_from
+    st.session_state.pending_refresh = None
+    if stale:
+        refresh_jobs.schedule_refresh(key, generate, on_result)
+        st.session_state.pending_refresh = key
+    telemetry.record("cache", layer="history", outcome="stale" if stale else "hit",
+                     age_seconds=round(age), similar=bool(shared_from))
+    return row["result"]
+
+
+def clear_served():
+    """Forget the served-from-cache label after a fresh result was generated"""
+    st.session_state.served_age = None
+    st.session_state.served_similar = None
+    st.session_state.pending_refresh = None
+
+
+def apply_refresh():
+    """Swap in the refreshed result for this session once the background job is done"""
+    key = st.session_state.get("pending_refresh")
+    if not key:
+        return
+    future = refresh_jobs.refresh_future(key)
+    if future is None:
+        st.session_state.pending_refresh = None
+        return
+    if not future.done():
+        return
+    st.session_state.pending_refresh = None
+    # A refresh preempted by interactive work is simply dropped; the next stale serve schedules another
+    result = None if future.cancelled() or future.exception() else future.result()
+    if crop_core.is_complete(result):
+        session_store.save_recommendations(result)
+        st.session_state.served_age = None
+        st.session_state.served_similar = None
+
+
+@st.fragment(run_every=REFRESH_POLL_SECONDS)
+def watch_refresh():
+    """Rerun the page as soon as this session's background refresh has finished"""
+    key = st.session_state.get("pending_refresh")
+    if not key:
+        return
+    future = refresh_jobs.refresh_future(key)
+    if future is None or future.done():
+        st.rerun()
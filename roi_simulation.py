@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+import cache_backends
+import mandi_prices
+import price_trends
+
+ECONOMICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crop_economics.json")
+TRIALS = int(os.getenv("CROP_ROI_TRIALS", "20000"))
+PERCENTILES = (5, 25, 50, 75, 95)
+# Results only depend on their inputs, so they can be kept for as long as the price data is unchanged
+ROI_CACHE_TTL = 24 * 3600
+# Part of the cache key; bump when simulate_inputs returns different fields
+RESULT_VERSION = 2
+# When the model's price range is all there is, treat it as covering about 80% of outcomes
+PRICE_RANGE_WIDENING = 1.25
+
+with open(ECONOMICS_PATH, encoding="utf-8") as f:
+    CROP_ECONOMICS = json.load(f)["crops"]
+
+# Price units as written in English, Hindi and Odia answers, and how many of each make a quintal
+_UNITS = [
+    (r"kgs?|kilos?|kilograms?|किलो(?:ग्राम)?|किग्रा|कि\.\s?ग्रा\.?|କିଲୋ(?:ଗ୍ରାମ)?|କିଗ୍ରା|କି\.\s?ଗ୍ରା\.?", 100),
+    (r"quintals?|qtls?|q|क्विंटल|क्विन्टल|कुंतल|कुन्तल|କ୍ୱିଣ୍ଟାଲ|କ୍ୱିଣ୍ଟଲ|କ୍ଵିଣ୍ଟାଲ|କୁଇଣ୍ଟାଲ", 1),
+    (r"tons?|tonnes?|टन|ଟନ", 0.1),
+]
+# \b does not work around Devanagari and Odia vowel signs, so a unit must stand apart from other letters
+_UNIT_PATTERN = re.compile(
+    r"(?<![^\s/(\d₹-])(?:" + "|".join(f"(?P<u{i}>{pattern})" for i, (pattern, _) in enumerate(_UNITS)) + r")(?![^\s/).,;:-])",
+    re.IGNORECASE)
+
+
+# Multipliers written after an amount, as in '25k', '20 हजार' or '1.5 lakh'
+_MULTIPLIERS = [
+    (r"k|thousands?|हज़ार|हजार|ହଜାର", 1000),
+    (r"lakhs?|lacs?|लाख|ଲକ୍ଷ", 100000),
+    (r"crores?|करोड़|करोड|କୋଟି", 10000000),
+]
+_AMOUNT_PATTERN = re.compile(
+    r"(?P<number>\d[\d,]*(?:\.\d+)?)(?:\s*(?:"
+    + "|".join(f"(?P<m{i}>{pattern})" for i, (pattern, _) in enumerate(_MULTIPLIERS)) + r")(?![^\s/).,;:-]))?",
+    re.IGNORECASE)
+_ACRE = r"acres?|एकड़|ଏକର"
+# Numbers that count land, time or a share rather than rupees, as in 'for 2 acres' or '4 months'
+_QUANTITY_PATTERN = re.compile(
+    rf"\s*(?:{_ACRE}|hectares?|ha|हेक्टेयर|ହେକ୍ଟର|bighas?|बीघा|months?|महीने|महीना|माह|ମାସ|days?|दिन|ଦିନ|years?|साल|वर्ष|ବର୍ଷ|%)"
+    r"(?![^\s/).,;:-])", re.IGNORECASE)
+# What may stand between the two ends of a range
+_RANGE_JOIN = re.compile(r"\s*(?:-|–|—|to|से|ରୁ)\s*₹?\s*", re.IGNORECASE)
+
+
+def _amounts(text):
+    """Rupee amounts in text as (number, multiplier or None, start, end)"""
+    amounts = []
+    for match in _AMOUNT_PATTERN.finditer(text):
+        if _QUANTITY_PATTERN.match(text, match.end()):
+            continue
+        multiplier = next((_MULTIPLIERS[int(name[1:])][1] for name, value in match.groupdict().items()
+                           if name != "number" and value), None)
+        amounts.append((float(match.group("number").replace(",", "")), multiplier, match.start(), match.end()))
+    return amounts
+
+
+def parse_range(text):
+    """Low and high rupee amounts in text like '₹20,000-30,000 per acre' or '₹1.5-2 lakh', or None.
+
+    Only the first amount is read, together with a second one when the
+    two form a range; numbers of acres, months or percent are skipped, so
+    '₹40,000 for 2 acres' reads as 40,000. A multiplier after the second
+    end of a range applies to both ends.
+    """
+    amounts = _amounts(text or "")
+    if not amounts:
+        return None
+    first, multiplier, _, end = amounts[0]
+    values = [first * (multiplier or 1)]
+    if len(amounts) > 1 and _RANGE_JOIN.fullmatch(text, end, amounts[1][2]):
+        second, second_multiplier, _, _ = amounts[1]
+        values = [first * (multiplier or second_multiplier or 1), second * (second_multiplier or 1)]
+    return min(values), max(values)
+
+
+def _per_acre(text, low, high):
+    """Cost range converted to rupees per acre, or None when the text does not say what area it covers"""
+    area = re.search(rf"(\d+(?:\.\d+)?)\s*(?:{_ACRE})", text, re.IGNORECASE)
+    if area and float(area.group(1)) > 0:
+        return low / float(area.group(1)), high / float(area.group(1))
+    if re.search(_ACRE, text, re.IGNORECASE):
+        return low, high
+    return None
+
+
+def _per_quintal(text, low, high):
+    """Price range converted to rupees per quintal from the first unit named in the text, or None without one"""
+    match = _UNIT_PATTERN.search(text)
+    if match is None:
+        return None
+    factor = _UNITS[int(match.lastgroup[1:])][1]
+    return low * factor, high * factor
+
+
+def crop_inputs(crop, location, month, budget):
+    """Distribution parameters for one crop card, or None if there is nothing to simulate with.
+
+    Yields come from data/crop_economics.json. Costs come from the card's
+    investment_required when it reads as a per-acre amount within that
+    file's range for the crop, else from the file. Prices come from the local price trends, else from the
+    card's market_price_range.
+    """
+    commodity = mandi_prices.commodity_for(crop.get("crop_name"))
+    economics = CROP_ECONOMICS.get(commodity)
+    if economics is None:
+        return None
+    cost = economics["cost_per_acre"]
+    stated_cost = parse_range(crop.get("investment_required"))
+    stated_cost = stated_cost and _per_acre(crop["investment_required"], *stated_cost)
+    # An amount outside the table's range is more likely misread (a total, another unit) than local
+    if stated_cost and cost[0] <= stated_cost[0] and stated_cost[1] <= cost[1]:
+        cost = list(stated_cost)
+
+    expectation = price_trends.harvest_expectation(crop, location, month)
+    if expectation:
+        # Lognormal around the expected harvest price with the historical volatility
+        price = {"kind": "lognormal", "median": expectation["expected"],
+                 "sigma": max(expectation["volatility"] * np.sqrt(expectation["months_ahead"]), 0.02)}
+    else:
+        stated_price = parse_range(crop.get("market_price_range"))
+        if stated_price is None:
+            return None
+        # Guessing the unit would put the price off by a factor of 100 either way
+        per_quintal = _per_quintal(crop["market_price_range"], *stated_price)
+        if per_quintal is None:
+            return None
+        low, high = per_quintal
+        middle, half = (low + high) / 2, max((high - low) / 2, 0.05 * (low + high) / 2) * PRICE_RANGE_WIDENING
+        price = {"kind": "uniform", "low": middle - half, "high": middle + half}
+    return {"commodity": commodity, "yield": economics["yield_quintals_per_acre"], "cost": cost,
+            "price": price, "budget": budget}
+
+
+def simulate_inputs(inputs, trials=TRIALS, seed=0):
+    """ROI percentiles, loss probability and profit at the budget for one crop's inputs.
+
+    Every trial draws a yield (triangular: poor, typical, good season), a
+    cost per acre (uniform over the range) and a harvest price. The
+    budget sets the area sown, so profit scales with it while ROI does
+    not; a budget below one acre's cost sows a fraction of an acre.
+    """
+    rng = np.random.default_rng(seed)
+    low, mode, high = inputs["yield"]
+    yields = rng.triangular(low, mode, high, trials)
+    costs = rng.uniform(*inputs["cost"], trials)
+    price = inputs["price"]
+    if price["kind"] == "lognormal":
+        prices = price["median"] * np.exp(rng.normal(0.0, price["sigma"], trials))
+    else:
+        prices = rng.uniform(price["low"], price["high"], trials)
+    profit_per_acre = yields * prices - costs
+    roi = profit_per_acre / costs * 100
+    acres = inputs["budget"] / np.mean(inputs["cost"])
+    profit = profit_per_acre * acres
+    return {
+        "roi_percentiles": {f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, np.percentile(roi, PERCENTILES))},
+        "loss_probability": round(float(np.mean(roi < 0)), 3),
+        "median_profit": round(float(np.median(profit))),
+        "acres": round(float(acres), 2),
+        "cost_per_acre": round(float(np.mean(costs))),
+        "mean_profit_per_acre": round(float(np.mean(profit_per_acre))),
+        "p5_profit_per_acre": round(float(np.percentile(profit_per_acre, 5))),
+        "price_source": "mandi" if price["kind"] == "lognormal" else "model",
+    }
+
+
+def format_rupees(amount):
+    """'₹12,500' or '-₹7,300'"""
+    return f"{'-' if amount < 0 else ''}₹{abs(amount):,}"
+
+
+def simulate(recommendations, location, month, budget, trials=TRIALS):
+    """Simulation results for every crop card that has yield and price data, keyed by crop name.
+
+    Cached per input set, so reruns and other sessions asking the same
+    question do not simulate again.
+    """
+    results = {}
+    cache = cache_backends.get_cache()
+    for crop in recommendations["recommendations"]:
+        inputs = crop_inputs(crop, location, month, budget)
+        if inputs is None:
+            continue
+        canonical = json.dumps([RESULT_VERSION, inputs, trials], sort_keys=True, default=float)
+        key = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+        result = cache.get_json("roi", key)
+        if result is None:
+            # Seeded from the inputs, so the same question always gets the same answer
+            result = simulate_inputs(inputs, trials, seed=int(key[:8], 16))
+            cache.set_json("roi", key, result, ROI_CACHE_TTL)
+        results[crop["crop_name"]] = result
+    return results
+
+
+if __name__ == "__main__":
+    # Simulation speed: python roi_simulation.py [trials] [crops]
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    crops = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    names = list(CROP_ECONOMICS)[:crops]
+    cards = [{"crop_name": name.split("(")[0], "market_price_range": "₹2,000-2,600 per quintal",
+              "growing_period": "4 months"} for name in names]
+    inputs = [crop_inputs(card, "Ludhiana, Punjab", "November", 50000) for card in cards]
+    start = time.perf_counter()
+    results = [simulate_inputs(i, trials, seed=n) for n, i in enumerate(inputs)]
+    elapsed = time.perf_counter() - start
+    print(f"{crops} crops x {trials:,} trials in {elapsed * 1000:.0f} ms ({crops * trials / elapsed:,.0f} trials/s)")
+    for card, result in zip(cards, results):
+        p = result["roi_percentiles"]
+        print(f"{card['crop_name']:>12}: ROI p5 {p['p5']:6.1f}%  p50 {p['p50']:6.1f}%  p95 {p['p95']:6.1f}%  "
+              f"P(loss) {result['loss_probability']:.1%}")
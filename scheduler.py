@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import telemetry
+
+INTERACTIVE = "interactive"
+REFRESH = "refresh"
+BATCH = "batch"
+
+# Model calls running at once across all classes, i.e. the share of the Gemini quota this process may use
+WORKERS = int(os.getenv("CROP_SCHEDULER_WORKERS", "8"))
+# Weight sets each class's share of dispatches under contention; cap limits how many of its
+# items run at once, so bulk work can never take the slots a farmer's request needs. Beyond
+# max_queued waiting items a class's arrivals fail at once with QueueFull: an interactive
+# request behind four rounds of every worker would time out in the queue anyway
+CLASSES = {
+    INTERACTIVE: {"weight": 16, "cap": WORKERS, "max_queued": 4 * WORKERS},
+    REFRESH: {"weight": 4, "cap": int(os.getenv("CROP_REFRESH_WORKERS", "2")), "max_queued": 8 * WORKERS},
+    BATCH: {"weight": 1, "cap": 2, "max_queued": 8 * WORKERS},
+}
+# e.g. CROP_SCHEDULER_CLASSES='{"batch": {"weight": 1, "cap": 4, "max_queued": 200}}'
+for _name, _overrides in json.loads(os.getenv("CROP_SCHEDULER_CLASSES", "{}")).items():
+    CLASSES[_name].update(_overrides)
+# Lower classes, cheapest to drop first
+PREEMPTION_ORDER = (BATCH, REFRESH)
+# Queued items across all classes before higher-priority arrivals start cancelling queued lower-priority work
+MAX_QUEUED = int(os.getenv("CROP_SCHEDULER_MAX_QUEUED", str(8 * WORKERS)))
+WAIT_SAMPLES = 1000
+
+_local = threading.local()
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class WorkItem:
+    __slots__ = ("work_class", "fn", "args", "kwargs", "future", "start_tag", "finish_tag", "queued_at")
+
+    def __init__(self, work_class, fn, args, kwargs, start_tag, finish_tag):
+        self.work_class = work_class
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.queued_at = time.perf_counter()
+
+
+class Scheduler:
+    """Shared worker pool that orders model calls by priority class.
+
+    Classes are served by weighted fair queuing: every item gets a
+    virtual finish tag of max(virtual time, the class's last tag) plus
+    cost / weight, and the worker takes the smallest tag among classes
+    below their concurrency cap. A busy class therefore gets its weighted
+    share without starving the others, and an idle class earns no credit.
+    When the queue is full, arrivals of a higher class cancel the newest
+    queued items of a lower class, whose futures raise CancelledError.
+    Coroutines take a slot through run_async: they count against the
+    limits while they run but hold no worker thread.
+    """
+
+    def __init__(self, workers=WORKERS, classes=None):
+        self.classes = {name: dict(config) for name, config in (classes or CLASSES).items()}
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._queues = {name: deque() for name in self.classes}
+        self._running = dict.fromkeys(self.classes, 0)
+        self._last_tag = dict.fromkeys(self.classes, 0.0)
+        self._virtual_time = 0.0
+        self._counts = {name: {"submitted": 0, "completed": 0, "failed": 0, "preempted": 0, "rejected": 0}
+                        for name in self.classes}
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in self.classes}
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True).start()
+
+    def submit(self, work_class, fn, *args, cost=1.0, **kwargs):
+        """Queue fn(*args, **kwargs) in a priority class and return its Future; it raises QueueFull if the class is full"""
+        config = self.classes[work_class]
+        with self._cond:
+            waiting = sum(not item.future.cancelled() for item in self._queues[work_class])
+            if waiting >= config["max_queued"]:
+                self._counts[work_class]["rejected"] += 1
+                telemetry.record("scheduler_rejected", work_class=work_class, queued=waiting)
+                future = Future()
+                future.set_exception(QueueFull(f"{waiting} {work_class} items already waiting"))
+                return future
+            start_tag = max(self._virtual_time, self._last_tag[work_class])
+            item = WorkItem(work_class, fn, args, kwargs, start_tag, start_tag + cost / config["weight"])
+            self._last_tag[work_class] = item.finish_tag
+            self._queues[work_class].append(item)
+            self._counts[work_class]["submitted"] += 1
+            if self._depth() > MAX_QUEUED:
+                self._shed(work_class)
+            self._cond.notify()
+        return item.future
+
+    def run(self, work_class, fn, *args, **kwargs):
+        """Run fn in a priority class and wait for it; nested calls from a worker run inline"""
+        if getattr(_local, "work_class", None) is not None:
+            return fn(*args, **kwargs)
+        future = self.submit(work_class, fn, *args, **kwargs)
+        try:
+            return future.result()
+        except BaseException:
+            # The caller gave up, so do not spend a model call on it if it is still queued
+            future.cancel()
+            raise
+
+    def acquire(self, work_class, cost=1.0):
+        """Queue for a slot in a priority class; the Future resolves once it is held, and release() frees it"""
+        return self.submit(work_class, None, cost=cost)
+
+    def release(self, work_class, failed=False):
+        with self._cond:
+            self._running[work_class] -= 1
+            self._counts[work_class]["failed" if failed else "completed"] += 1
+            self._cond.notify_all()
+
+    async def run_async(self, work_class, coro, cost=1.0):
+        """Await coro in a slot of a priority class, without tying up a worker thread while it runs"""
+        grant = self.acquire(work_class, cost)
+        try:
+            await asyncio.wrap_future(grant)
+        except BaseException:
+            # Cancelled while queued, or just as the slot was being granted: then give it straight back
+            grant.add_done_callback(lambda g: g.cancelled() or g.exception() or self.release(work_class, failed=True))
+            coro.close()
+            raise
+        failed = True
+        try:
+            result = await coro
+            failed = False
+            return result
+        finally:
+            self.release(work_class, failed)
+
+    def preempt(self, work_class, keep=0):
+        """Cancel queued items of a class, newest first, leaving `keep`; returns how many were cancelled"""
+        with self._cond:
+            return self._cancel(work_class, keep)
+
+    def _depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _shed(self, arriving_class):
+        """Cancel one queued item of the lowest class below the arriving one"""
+        rank = list(self.classes)
+        for work_class in PREEMPTION_ORDER:
+            if rank.index(work_class) > rank.index(arriving_class) and self._queues[work_class]:
+                self._cancel(work_class, len(self._queues[work_class]) - 1)
+                return
+
+    def _cancel(self, work_class, keep):
+        queue = self._queues[work_class]
+        cancelled = 0
+        while len(queue) > keep:
+            item = queue.pop()
+            if item.future.cancel():
+                cancelled += 1
+        if cancelled:
+            self._counts[work_class]["preempted"] += cancelled
+            telemetry.record("scheduler_preempted", work_class=work_class, items=cancelled, queued=self._depth())
+        return cancelled
+
+    def _next(self):
+        """Item with the smallest finish tag among classes under their cap, or None"""
+        # Slots held by coroutines count too, though their worker threads are free
+        if sum(self._running.values()) >= self.workers:
+            return None
+        best = None
+        for work_class, queue in self._queues.items():
+            # Items cancelled by their caller stay queued until they reach the head
+            while queue and queue[0].future.cancelled():
+                queue.popleft()
+            if queue and self._running[work_class] < self.classes[work_class]["cap"]:
+                if best is None or queue[0].finish_tag < best.finish_tag:
+                    best = queue[0]
+        if best is not None:
+            self._queues[best.work_class].popleft()
+            self._running[best.work_class] += 1
+            self._virtual_time = max(self._virtual_time, best.start_tag)
+        return best
+
+    def _work(self):
+        while True:
+            with self._cond:
+                item = self._next()
+                while item is None:
+                    self._cond.wait()
+                    item = self._next()
+                wait_ms = (time.perf_counter() - item.queued_at) * 1000
+                self._waits[item.work_class].append(wait_ms)
+                queued = len(self._queues[item.work_class])
+            if item.future.set_running_or_notify_cancel():
+                telemetry.record("stage", stage="scheduler_wait", work_class=item.work_class,
+                                 duration_ms=round(wait_ms, 2), queued=queued)
+                if item.fn is None:
+                    # A slot for run_async: it stays taken until release()
+                    item.future.set_result(True)
+                    continue
+                _local.work_class = item.work_class
+                try:
+                    item.future.set_result(item.fn(*item.args, **item.kwargs))
+                    outcome = "completed"
+                except BaseException as e:
+                    item.future.set_exception(e)
+                    outcome = "failed"
+                finally:
+                    _local.work_class = None
+            else:
+                outcome = None
+            with self._cond:
+                self._running[item.work_class] -= 1
+                if outcome:
+                    self._counts[item.work_class][outcome] += 1
+                # A freed slot may make any class eligible again
+                self._cond.notify_all()
+
+    def metrics(self):
+        """Queue depth, running items, counts and wait-time percentiles per class"""
+        with self._cond:
+            report = {}
+            for work_class in self.classes:
+                waits = sorted(self._waits[work_class])
+                report[work_class] = dict(
+                    self._counts[work_class],
+                    queued=sum(not item.future.cancelled() for item in self._queues[work_class]),
+                    running=self._running[work_class],
+                    wait_p50_ms=round(waits[len(waits) // 2], 2) if waits else None,
+                    wait_p95_ms=round(waits[int(len(waits) * 0.95)], 2) if waits else None,
+                    wait_max_ms=round(waits[-1], 2) if waits else None,
+                )
+            return report
+
+
+def current_class():
+    """Class of the scheduler item running on this thread, or None outside a worker"""
+    return getattr(_local, "work_class", None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler, created on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+    return _scheduler
+
+
+if __name__ == "__main__":
+    # Interactive wait while a bulk job keeps the pool busy: python scheduler.py [seconds per call] [backlog]
+    from concurrent.futures import ThreadPoolExecutor
+
+    call_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    backlog = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    workers, interactive_items = 4, 40
+
+    def model_call():
+        time.sleep(call_seconds)
+
+    def measure(submit_batch, submit_interactive):
+        """Interactive waits while a feeder keeps `backlog` batch items queued"""
+        done = threading.Event()
+        batch = []
+
+        def feed():
+            while not done.is_set():
+                if sum(not f.done() for f in batch[-backlog * 2:]) < backlog:
+                    batch.append(submit_batch(model_call))
+                else:
+                    time.sleep(call_seconds / 10)
+
+        feeder = threading.Thread(target=feed)
+        feeder.start()
+        time.sleep(call_seconds * 2)
+        waits = []
+        for _ in range(interactive_items):
+            start = time.perf_counter()
+            submit_interactive(model_call).result()
+            waits.append((time.perf_counter() - start - call_seconds) * 1000)
+            time.sleep(call_seconds)
+        done.set()
+        feeder.join()
+        for future in batch:
+            future.cancel()
+        return sorted(waits), sum(f.done() and not f.cancelled() for f in batch)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fifo, fifo_batch = measure(pool.submit, pool.submit)
+    scheduler = Scheduler(workers=workers)
+    prioritized, scheduled_batch = measure(lambda fn: scheduler.submit(BATCH, fn),
+                                           lambda fn: scheduler.submit(INTERACTIVE, fn))
+
+    for label, (waits, batch_done) in (("shared FIFO pool", (fifo, fifo_batch)), ("scheduler", (prioritized, scheduled_batch))):
+        print(f"{label:>16}: interactive wait p50 {waits[len(waits) // 2]:7.1f} ms, "
+              f"p95 {waits[int(len(waits) * 0.95)]:7.1f} ms; {batch_done} batch calls done meanwhile")
+    for work_class, row in scheduler.metrics().items():
+        print(f"{work_class:>12}: {row}")
@@ -0,0 +1,168 @@
+import os
+import sys
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import crop_core
+import telemetry
+
+IDLE_TIMEOUT_SECONDS = float(os.getenv("CROP_SESSION_IDLE_SECONDS", "1800"))
+EVICTION_INTERVAL_SECONDS = 30
+
+
+class SessionRef:
+    """What a session keeps: a key into the shared store and when it was last used"""
+    __slots__ = ("key", "last_seen", "nbytes")
+
+    def __init__(self, key, nbytes):
+        self.key = key
+        self.nbytes = nbytes
+        self.last_seen = time.monotonic()
+
+
+def _intern(value):
+    """Intern every string so identical crop names and advice share memory"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {sys.intern(k): _intern(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_intern(v) for v in value]
+    return value
+
+
+class ResultStore:
+    """Process-wide store of recommendation results shared by all sessions.
+
+    Identical answers are stored once and reference counted. Results handed
+    out are shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT_SECONDS):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._results = {}
+        self._refcounts = {}
+        self._sessions = {}
+        self._last_eviction = time.monotonic()
+
+    def put(self, session_id, result):
+        """Store a result for a session and return its key"""
+        key, nbytes = crop_core.result_key(result)
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = (_intern(result), nbytes)
+                self._refcounts[key] = 0
+            # Take the new reference before dropping the old one, which may be the same key
+            self._refcounts[key] += 1
+            old = self._sessions.get(session_id)
+            if old is not None:
+                self._release(old.key)
+            self._sessions[session_id] = SessionRef(key, nbytes)
+        self._maybe_evict()
+        return key
+
+    def get(self, key, session_id):
+        """Return the stored result for a key, refreshing the session's idle timer"""
+        with self._lock:
+            entry = self._results.get(key)
+            ref = self._sessions.get(session_id)
+            if entry is not None:
+                if ref is not None and ref.key == key:
+                    ref.last_seen = time.monotonic()
+                else:
+                    # Session was evicted but another session still holds the result
+                    if ref is not None:
+                        self._release(ref.key)
+                    self._sessions[session_id] = SessionRef(key, entry[1])
+                    self._refcounts[key] += 1
+        self._maybe_evict()
+        return entry[0] if entry else None
+
+    def drop(self, session_id):
+        """Forget a session's result"""
+        with self._lock:
+            ref = self._sessions.pop(session_id, None)
+            if ref is not None:
+                self._release(ref.key)
+
+    def _release(self, key):
+        self._refcounts[key] -= 1
+        if self._refcounts[key] <= 0:
+            del self._refcounts[key]
+            del self._results[key]
+
+    def _maybe_evict(self):
+        if time.monotonic() - self._last_eviction >= EVICTION_INTERVAL_SECONDS:
+            self.evict_idle()
+
+    def evict_idle(self):
+        """Drop sessions that have been idle longer than the timeout"""
+        now = time.monotonic()
+        with self._lock:
+            self._last_eviction = now
+            idle = [sid for sid, ref in self._sessions.items() if now - ref.last_seen > self.idle_timeout]
+            for session_id in idle:
+                self._release(self._sessions.pop(session_id).key)
+            remaining = len(self._sessions)
+        if idle:
+            telemetry.record("session_eviction", evicted=len(idle), sessions=remaining)
+        return len(idle)
+
+    def memory_report(self):
+        """Per-session and total byte accounting of stored results"""
+        with self._lock:
+            per_session = {sid: ref.nbytes for sid, ref in self._sessions.items()}
+            stored_bytes = sum(nbytes for _, nbytes in self._results.values())
+            return {
+                "sessions": len(self._sessions),
+                "unique_results": len(self._results),
+                "stored_bytes": stored_bytes,
+                "referenced_bytes": sum(per_session.values()),
+                "per_session": per_session,
+            }
+
+
+@st.cache_resource
+def get_result_store():
+    """Single result store shared by every session of this server"""
+    return ResultStore()
+
+
+def current_session_id():
+    """Streamlit session id of the running script, or a fixed id outside Streamlit"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+
+def save_recommendations(result):
+    """Keep the result in the shared store and only its key in session state"""
+    st.session_state.recommendations = get_result_store().put(current_session_id(), result)
+
+
+def load_recommendations():
+    """Fetch this session's result from the shared store, or None if evicted"""
+    key = st.session_state.get("recommendations")
+    if not key:
+        return None
+    result = get_result_store().get(key, current_session_id())
+    if result is None:
+        st.session_state.recommendations = None
+    return result
+
+
+if __name__ == "__main__":
+    # Simulate many sessions sharing a handful of answers: python session_store.py 5000
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    store = ResultStore(idle_timeout=0)
+    sample = {"recommendations": [{"crop_name": "Wheat", "key_benefits": ["MSP support"] * 3}],
+              "general_advice": "Sow on time. " * 20, "seasonal_notes": "Rabi season."}
+    for i in range(sessions):
+        store.put(f"session-{i}", dict(sample, seasonal_notes=f"Rabi season, variant {i % 20}"))
+    report = store.memory_report()
+    print(f"{report['sessions']} sessions -> {report['unique_results']} unique results, "
+          f"{report['stored_bytes'] / 1024:.1f} KiB stored for {report['referenced_bytes'] / 1024:.1f} KiB referenced")
+    print(f"Evicted {store.evict_idle()} idle sessions; {store.memory_report()['unique_results']} results left")
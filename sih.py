@@ -10,6 +10,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 import os
 from dotenv import load_dotenv
+import cassettes
+import knowledge_base
+import model_router
+import price_trends
+import prompts
+import roi_simulation
+import scheduler
+import session_store
 
 # Load .env file
 load_dotenv()
@@ -56,84 +64,39 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state (holds only a key into the shared result store)
 if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
 
 def setup_gemini_api():
     """Setup Gemini API configuration"""
     try:
+        if cassettes.MODE == "replay":
+            return cassettes.ReplayModel()
         if not GEMINI_API_KEY:
             st.error("❌ Gemini API Key not found. Please set it in your .env file.")
             return None
 
         genai.configure(api_key=GEMINI_API_KEY)
-        model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-        
-        for model_name in model_names:
-            try:
-                model = genai.GenerativeModel(model_name)
-                test_response = model.generate_content("Test")
-                return model
-            except:
-                continue
-        return None
+        return model_router.get_router(lambda model_name: cassettes.wrap_model(genai.GenerativeModel(model_name)))
     except Exception as e:
         st.error(f"Gemini setup error: {e}")
         return None
 
 
-def create_crop_recommendation_prompt():
-    """Create a detailed prompt template for crop recommendations"""
-    template = """
-    You are an expert agricultural consultant with deep knowledge of crop profitability, seasonal patterns, and regional farming conditions.
-    
-    Given the following information:
-    - Month: {month}
-    - Location: {location}
-    - Budget: ${budget}
-    
-    Please provide crop recommendations that would be most profitable for this situation. Consider:
-    1. Seasonal suitability for the given month
-    2. Climate and soil conditions typical for the location
-    3. Initial investment requirements within the budget
-    4. Expected profit margins and ROI
-    5. Market demand and pricing trends
-    6. Growing duration and harvest timing
-    
-    Format your response as a JSON with the following structure:
-    {{
-        "recommendations": [
-            {{
-                "crop_name": "Crop Name",
-                "profit_potential": "High/Medium/Low",
-                "estimated_roi": "percentage",
-                "investment_required": "amount",
-                "growing_period": "duration in months",
-                "key_benefits": ["benefit1", "benefit2", "benefit3"],
-                "considerations": ["consideration1", "consideration2"],
-                "market_price_range": "price range per unit"
-            }}
-        ],
-        "general_advice": "Overall farming advice for the given conditions",
-        "seasonal_notes": "Important seasonal considerations"
-    }}
-    
-    Provide 3-5 crop recommendations ranked by profitability potential.
-    """
-    return template
-
 def get_crop_recommendations(model, month, location, budget):
     """Get crop recommendations using Gemini API"""
     try:
-        prompt_template = create_crop_recommendation_prompt()
-        prompt = prompt_template.format(
+        prompt = prompts.get("en", "detailed_recommendation").render(
             month=month,
             location=location,
-            budget=budget
+            budget=budget,
+            reference_notes=knowledge_base.format_context(knowledge_base.retrieve(location, month))
         )
         
-        response = model.generate_content(prompt)
+        # The detailed template weighs six factors per crop, so it goes to the stronger model
+        route = model_router.for_request(model, model_router.COMPLEX)
+        response = scheduler.get_scheduler().run(scheduler.INTERACTIVE, route.generate_content, prompt)
         
         # Try to extract JSON from the response
         response_text = response.text
@@ -230,6 +193,24 @@ def create_profit_visualization(recommendations):
     
     return fig
 
+def create_harvest_price_visualization(harvest):
+    """Chart the expected mandi price in each crop's harvest month against today's price"""
+    fig = px.bar(
+        harvest,
+        x='crop',
+        y='expected',
+        title="Expected Price at Harvest",
+        labels={'crop': 'Crops', 'expected': 'Rupees per quintal'},
+        error_y=harvest['high'] - harvest['expected'],
+        error_y_minus=harvest['expected'] - harvest['low'],
+        color_discrete_sequence=['#228B22']
+    )
+    fig.data[0].name = "At harvest"
+    fig.add_trace(go.Scatter(x=harvest['crop'], y=harvest['current'], mode='markers', name="Now",
+                             marker=dict(color='#FFB347', size=12, symbol='diamond')))
+    fig.update_layout(showlegend=True)
+    return fig
+
 # Main App
 def main():
     # Header
@@ -305,14 +286,14 @@ def main():
             recommendations = get_crop_recommendations(model, selected_month, location, budget)
             
             if recommendations:
-                st.session_state.recommendations = recommendations
+                session_store.save_recommendations(recommendations)
                 st.success("✅ Recommendations generated successfully!")
             else:
                 st.error("❌ Failed to generate recommendations. Please try again.")
     
     # Display recommendations
-    if st.session_state.recommendations:
-        recommendations = st.session_state.recommendations
+    recommendations = session_store.load_recommendations()
+    if recommendations:
         
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -358,6 +339,23 @@ def main():
                 fig = create_profit_visualization(recommendations)
                 st.plotly_chart(fig, use_container_width=True)
             
+            # Price outlook from the local mandi price history
+            harvest = price_trends.harvest_frame(recommendations, location, selected_month)
+            if not harvest.empty:
+                st.plotly_chart(create_harvest_price_visualization(harvest), use_container_width=True)
+            
+            # Simulated ROI spread and chance of a loss per crop
+            risk = roi_simulation.simulate(recommendations, location, selected_month, budget)
+            if risk:
+                st.subheader("🎲 Profit Risk")
+                st.dataframe(pd.DataFrame([{
+                    'Crop': name,
+                    'ROI (worst 5%)': f"{result['roi_percentiles']['p5']:.0f}%",
+                    'ROI (median)': f"{result['roi_percentiles']['p50']:.0f}%",
+                    'ROI (best 5%)': f"{result['roi_percentiles']['p95']:.0f}%",
+                    'Chance of loss': f"{result['loss_probability']:.0%}",
+                } for name, result in risk.items()]), hide_index=True, use_container_width=True)
+            
             # Investment breakdown
             st.subheader("💰 Investment Breakdown")
             investment_data = []
@@ -0,0 +1,132 @@
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import history_store
+import prompts
+import telemetry
+
+# Budgets in the same band get essentially the same advice; e.g. CROP_BUDGET_BANDS='[0, 20000, 60000]'
+BUDGET_BANDS = json.loads(os.getenv("CROP_BUDGET_BANDS", "[0, 25000, 50000, 100000, 250000, 500000]"))
+# Largest relative budget difference still treated as the same request
+BUDGET_TOLERANCE = float(os.getenv("CROP_BUDGET_TOLERANCE", "0.2"))
+ADJUST_REUSED = os.getenv("CROP_ADJUST_REUSED", "1") == "1"
+# Older answers are not reused; a fresh call is due for them anyway (the market price freshness window)
+MAX_AGE_SECONDS = int(os.getenv("CROP_SIMILAR_MAX_AGE", str(24 * 3600)))
+
+stats = {"lookups": 0, "district": 0, "zone": 0}
+_stats_lock = threading.Lock()
+
+
+def budget_band(budget):
+    """Lower and upper bound of the band a budget falls in"""
+    index = bisect.bisect_right(BUDGET_BANDS, budget) - 1
+    low = BUDGET_BANDS[max(index, 0)]
+    high = BUDGET_BANDS[index + 1] - 1 if index + 1 < len(BUDGET_BANDS) else float("inf")
+    return low, high
+
+
+def budget_window(budget, tolerance=BUDGET_TOLERANCE):
+    """Budgets that may share an answer: same band and within the tolerance"""
+    low, high = budget_band(budget)
+    return max(low, int(budget * (1 - tolerance))), min(high, int(budget * (1 + tolerance)))
+
+
+def format_rupees(amount, indian=False):
+    """Amount with Western (1,000,000) or Indian (10,00,000) digit grouping"""
+    if not indian or amount < 100000:
+        return f"{amount:,}"
+    head, tail = str(amount)[:-3], str(amount)[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ",".join([head] + groups + [tail])
+
+
+def _rewrite_budget(match, to_budget):
+    """Replacement for one mention of the budget, grouped the way the mention was"""
+    groups = re.split(r"[,\s]", match.group(1))
+    if len(groups) == 1:
+        return f"₹{to_budget}"
+    # Two-digit groups in the middle, as in ₹1,00,000, mean lakh-crore grouping
+    return f"₹{format_rupees(to_budget, indian=any(len(g) == 2 for g in groups[1:-1]))}"
+
+
+def adjust_result(result, from_budget, to_budget, from_district=None, to_district=None):
+    """Copy of a result with mentions of the original budget, and district if given, rewritten"""
+    # Separators may sit between any digits: ₹100000, ₹100,000 and ₹1,00,000 are all the same budget
+    budget_pattern = re.compile(r"₹\s?(" + r"[,\s]?".join(str(from_budget)) + r")(?!\d|,\d)")
+    district_pattern = re.compile(rf"\b{re.escape(from_district)}\b", re.IGNORECASE) if from_district else None
+
+    def rewrite(value):
+        if isinstance(value, str):
+            value = budget_pattern.sub(lambda m: _rewrite_budget(m, to_budget), value)
+            # A function replacement keeps backslashes in the typed district from reading as group references
+            return district_pattern.sub(lambda _: to_district, value) if district_pattern else value
+        if isinstance(value, dict):
+            return {k: rewrite(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [rewrite(v) for v in value]
+        return value
+
+    return rewrite(result)
+
+
+def find_similar(history, language, location, month, budget, experience, farm_size, organic):
+    """Closest stored result for a near-identical request, or None.
+
+    Results are shared across the requester's agro-climatic zone (or only
+    the district when the zone is unknown) for the same month, language,
+    farmer profile and budget window, and must be younger than
+    MAX_AGE_SECONDS so every reuse replaces a model call. Unless
+    CROP_ADJUST_REUSED=0 the result is adjusted to the requested budget and
+    district; row["budget"] and row["district"] keep the originals.
+    """
+    low, high = budget_window(budget)
+    profile = history_store.profile_key(experience, farm_size, organic)
+    row = history.nearest_similar(language, location, month, profile, low, high, budget,
+                                  since=time.time() - MAX_AGE_SECONDS)
+    district = history_store.normalize_district(location)
+    scope = None if row is None else "district" if row["district"] == district else "zone"
+    with _stats_lock:
+        stats["lookups"] += 1
+        if scope:
+            stats[scope] += 1
+    telemetry.record("cache", layer="similar", outcome="hit" if row else "miss", scope=scope, language=language,
+                     prompt_version=prompts.version(language), zone=row and row["zone"], budget_delta=row and row["budget"] - budget)
+    if row is not None and ADJUST_REUSED and (scope == "zone" or row["budget"] != budget):
+        from_district = row["district"] if scope == "zone" else None
+        row = dict(row, result=adjust_result(row["result"], row["budget"], budget,
+                                             from_district, location.split(",")[0].strip()))
+    return row
+
+
+def reuse_report(log_path=telemetry.TELEMETRY_LOG):
+    """Similar-request lookups, hits by scope and model calls, counted from the telemetry log"""
+    report = {"lookups": 0, "district": 0, "zone": 0, "model_calls": 0}
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get("event") == "cache" and event.get("layer") == "similar":
+                report["lookups"] += 1
+                if event.get("outcome") == "hit":
+                    report[event.get("scope") or "district"] += 1
+            elif event.get("event") == "stage" and event.get("stage") == "llm_call":
+                report["model_calls"] += 1
+    return report
+
+
+if __name__ == "__main__":
+    # Report reuse from the telemetry log: python similar_requests.py [telemetry.jsonl]
+    report = reuse_report(sys.argv[1] if len(sys.argv) > 1 else telemetry.TELEMETRY_LOG)
+    hits = report["district"] + report["zone"]
+    hit_rate = hits / report["lookups"] * 100 if report["lookups"] else 0
+    saved = hits / (hits + report["model_calls"]) * 100 if hits + report["model_calls"] else 0
+    print(f"{report['lookups']} lookups, {hits} hits ({hit_rate:.1f}% hit rate): "
+          f"{report['district']} from the same district, {report['zone']} from elsewhere in the zone")
+    print(f"{report['model_calls']} model calls made; reuse saved {saved:.1f}% of model calls")
@@ -0,0 +1,351 @@
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from gtts import gTTS
+from gtts.lang import tts_langs
+
+import cache_backends
+import cassettes
+import telemetry
+
+# Sentence ends in English, Hindi (danda) and Odia text
+SENTENCE_END = re.compile(r"(?<=[.!?।॥|])\s+")
+MAX_CHUNK_CHARS = 200
+JOB_CACHE_SIZE = 64
+SYNTHESIS_TIMEOUT_SECONDS = 30
+AUDIO_CACHE_TTL = 30 * 24 * 3600
+
+# Engines to try per language, best first; e.g. CROP_TTS_ENGINES='{"hi": ["espeak", "gtts"]}'
+ENGINE_PREFERENCES = {
+    "en": ["gtts", "piper", "espeak"],
+    "hi": ["gtts", "piper", "espeak"],
+    "or": ["piper", "espeak", "gtts"],
+}
+ENGINE_PREFERENCES.update(json.loads(os.getenv("CROP_TTS_ENGINES", "{}")))
+if os.getenv("CROP_STUB_TTS") == "1":
+    ENGINE_PREFERENCES = {lang: ["silent"] for lang in ENGINE_PREFERENCES}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CROP_TTS_WORKERS", "6")), thread_name_prefix="tts")
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_stats_lock = threading.Lock()
+engine_stats = {}
+
+
+def split_sentences(text, max_chars=MAX_CHUNK_CHARS):
+    """Split text at sentence boundaries into chunks of at most max_chars.
+
+    The first chunk is kept to a single sentence so playback can start early.
+    """
+    sentences = [s.strip() for s in SENTENCE_END.split(text or "") if s.strip()]
+    chunks = []
+    for sentence in sentences:
+        # Very long sentences are cut at the last space before the limit
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if len(chunks) > 1 and len(chunks[-1]) + len(sentence) + 1 <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {sentence}"
+        elif sentence:
+            chunks.append(sentence)
+    return chunks
+
+
+class TTSEngine:
+    """Turns one chunk of text into audio bytes"""
+    name = "base"
+    audio_format = "audio/mp3"
+
+    def supports(self, lang):
+        return False
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+    def join(self, segments):
+        """Stitch the audio of consecutive chunks into one track"""
+        return b"".join(segments)
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS; needs the network"""
+    name = "gtts"
+    audio_format = "audio/mp3"
+
+    def __init__(self):
+        self.languages = set(tts_langs())
+
+    def supports(self, lang):
+        return lang in self.languages
+
+    def synthesize(self, text, lang):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        # MP3 frames can simply be concatenated, so the default join works
+        return buffer.getvalue()
+
+
+class WavEngine(TTSEngine):
+    """Base for local engines that produce WAV audio"""
+    audio_format = "audio/wav"
+
+    def join(self, segments):
+        output = io.BytesIO()
+        with wave.open(output, "wb") as writer:
+            for index, segment in enumerate(segments):
+                with wave.open(io.BytesIO(segment), "rb") as reader:
+                    if index == 0:
+                        writer.setparams(reader.getparams())
+                    writer.writeframes(reader.readframes(reader.getnframes()))
+        return output.getvalue()
+
+
+class EspeakEngine(WavEngine):
+    """Offline espeak-ng synthesis; robotic but works everywhere, including Odia"""
+    name = "espeak"
+    voices = {"en": "en-us", "hi": "hi", "or": "or"}
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def supports(self, lang):
+        return self.binary is not None and lang in self.voices
+
+    def synthesize(self, text, lang):
+        result = subprocess.run(
+            [self.binary, "-v", self.voices[lang], "--stdout", text],
+            capture_output=True, timeout=SYNTHESIS_TIMEOUT_SECONDS, check=True
+        )
+        return result.stdout
+
+
+class PiperEngine(WavEngine):
+    """Offline neural Piper voices; CROP_PIPER_VOICES='{"or": "/models/or_IN-voice.onnx"}'"""
+    name = "piper"
+
+    def __init__(self):
+        self.binary = shutil.which("piper")
+        self.voices = json.loads(os.getenv("CROP_PIPER_VOICES", "{}"))
+
+    def supports(self, lang):
+        return self.binary is not None and lang in self.voices
+
+    def synthesize(self, text, lang):
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            subprocess.run(
+                [self.binary, "--model", self.voices[lang], "--output_file", path],
+                input=text.encode("utf-8"), capture_output=True, timeout=SYNTHESIS_TIMEOUT_SECONDS, check=True
+            )
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class SilentEngine(WavEngine):
+    """Silence after a network-like delay, for load tests: CROP_STUB_TTS=1 CROP_STUB_TTS_LATENCY=0.2"""
+    name = "silent"
+
+    def __init__(self):
+        self.enabled = os.getenv("CROP_STUB_TTS") == "1"
+        self.latency = float(os.getenv("CROP_STUB_TTS_LATENCY", "0.2"))
+
+    def supports(self, lang):
+        return self.enabled
+
+    def synthesize(self, text, lang):
+        time.sleep(self.latency)
+        output = io.BytesIO()
+        with wave.open(output, "wb") as writer:
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(8000)
+            # Roughly as long as the text would take to speak
+            writer.writeframes(b"\0\0" * int(8000 * 0.06 * len(text)))
+        return output.getvalue()
+
+
+class CassetteEngine(TTSEngine):
+    """Audio recorded in the cassette, after its recorded latency: CROP_CASSETTE_MODE=replay"""
+
+    def __init__(self, audio_format):
+        self.audio_format = audio_format
+        self.name = f"cassette-{audio_format.split('/')[1]}"
+
+    def supports(self, lang):
+        return cassettes.MODE == "replay" and self.audio_format in cassettes.get_cassette().audio_formats(lang)
+
+    def synthesize(self, text, lang):
+        header, audio = cassettes.get_cassette().audio_for(text, lang, self.audio_format)
+        time.sleep(header["latency_ms"] / 1000 * cassettes.LATENCY_SCALE)
+        return audio
+
+    def join(self, segments):
+        if self.audio_format == WavEngine.audio_format:
+            return WavEngine.join(self, segments)
+        return super().join(segments)
+
+
+ENGINES = {engine.name: engine for engine in (GTTSEngine(), PiperEngine(), EspeakEngine(), SilentEngine(),
+                                              CassetteEngine("audio/mp3"), CassetteEngine("audio/wav"))}
+if cassettes.MODE == "replay":
+    ENGINE_PREFERENCES = {lang: ["cassette-mp3", "cassette-wav"] for lang in ENGINE_PREFERENCES}
+
+
+def engines_for(lang):
+    """Engines that can speak a language, in order of preference"""
+    preferred = ENGINE_PREFERENCES.get(lang, list(ENGINES))
+    return [ENGINES[name] for name in preferred if name in ENGINES and ENGINES[name].supports(lang)]
+
+
+def _record_latency(engine, lang, duration_ms, error):
+    with _stats_lock:
+        stats = engine_stats.setdefault(engine.name, {"calls": 0, "errors": 0, "ewma_ms": None})
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        if not error:
+            previous = stats["ewma_ms"]
+            stats["ewma_ms"] = duration_ms if previous is None else 0.8 * previous + 0.2 * duration_ms
+    telemetry.record("stage", stage="tts_chunk", engine=engine.name, language=lang,
+                     duration_ms=round(duration_ms, 2), error=error)
+
+
+def _synthesize(engine, chunk, lang):
+    """Audio bytes for one chunk of text, from the shared cache or the engine"""
+    cache = cache_backends.get_cache()
+    cache_key = f"{engine.name}|{lang}|{chunk}"
+    audio = cache.get("audio", cache_key)
+    if audio is not None:
+        return audio
+
+    start = time.perf_counter()
+    error = True
+    try:
+        audio = engine.synthesize(chunk, lang)
+        error = False
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _record_latency(engine, lang, duration_ms, error)
+    if cassettes.MODE == "record":
+        cassettes.get_cassette().record_audio(engine, chunk, lang, audio, duration_ms)
+    cache.set("audio", cache_key, audio, AUDIO_CACHE_TTL)
+    return audio
+
+
+class SpeechJob:
+    """Synthesizes the chunks of a text concurrently on the TTS thread pool.
+
+    Uses the first available engine for the language and falls back to the
+    next one for the whole job if any chunk fails, so segments always share
+    one audio format.
+    """
+
+    def __init__(self, text, lang="en"):
+        self.lang = lang
+        self.started = time.perf_counter()
+        self.chunks = split_sentences(text)
+        self.engines = engines_for(lang)
+        self.first_audio_ms = None
+        self.full_track_ms = None
+        self.futures = []
+        self.engine = None
+        self._engine_index = -1
+        self._lock = threading.Lock()
+        if self.engines and self.chunks:
+            self._start(0)
+
+    @property
+    def audio_format(self):
+        return self.engine.audio_format if self.engine else "audio/mp3"
+
+    def _start(self, engine_index):
+        self._engine_index = engine_index
+        self.engine = self.engines[engine_index]
+        self.futures = [_executor.submit(_synthesize, self.engine, chunk, self.lang) for chunk in self.chunks]
+
+    def _with_fallback(self, fetch):
+        while True:
+            engine = self.engine
+            try:
+                return fetch()
+            except Exception as e:
+                with self._lock:
+                    # Another session sharing this job may already have switched engines
+                    if self.engine is engine:
+                        if self._engine_index + 1 >= len(self.engines):
+                            raise
+                        telemetry.record("tts_fallback", engine=engine.name, language=self.lang, error=str(e))
+                        self._start(self._engine_index + 1)
+
+    def first_segment(self, timeout=None):
+        """Audio of the first chunk, as soon as it is ready"""
+        if not self.futures:
+            return None
+        audio = self._with_fallback(lambda: self.futures[0].result(timeout))
+        if self.first_audio_ms is None:
+            self.first_audio_ms = (time.perf_counter() - self.started) * 1000
+            telemetry.record("stage", stage="tts_first_audio", duration_ms=round(self.first_audio_ms, 2),
+                             language=self.lang, engine=self.engine.name, chunks=len(self.chunks))
+        return audio
+
+    def full_track(self, timeout=None):
+        """All chunks stitched together in the engine's audio format"""
+        if not self.futures:
+            return None
+        audio = self._with_fallback(lambda: self.engine.join([f.result(timeout) for f in self.futures]))
+        if self.full_track_ms is None:
+            self.full_track_ms = (time.perf_counter() - self.started) * 1000
+            telemetry.record("stage", stage="tts_full_track", duration_ms=round(self.full_track_ms, 2),
+                             language=self.lang, engine=self.engine.name, chunks=len(self.chunks),
+                             characters=sum(map(len, self.chunks)))
+        return audio
+
+    def failed(self):
+        """True if any chunk finished with an error"""
+        return any(future.done() and future.exception() is not None for future in self.futures)
+
+
+def prepare(text, lang="en"):
+    """Start synthesizing text in the background, reusing a job for text already seen"""
+    key = (lang, hashlib.sha1(text.encode("utf-8")).hexdigest())
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None and not job.failed():
+            _jobs.move_to_end(key)
+            return job
+        job = _jobs[key] = SpeechJob(text, lang)
+        while len(_jobs) > JOB_CACHE_SIZE:
+            _jobs.popitem(last=False)
+    return job
+
+
+if __name__ == "__main__":
+    # Compare engines on the same text: python speech.py or "ଧାନ ଚାଷ ପାଇଁ ଏହା ଉପଯୁକ୍ତ ସମୟ |"
+    lang = sys.argv[1] if len(sys.argv) > 1 else "en"
+    text = sys.argv[2] if len(sys.argv) > 2 else "Sow wheat in November. Irrigate at crown root initiation."
+    for name, engine in ENGINES.items():
+        if not engine.supports(lang):
+            print(f"{name:>7}: not available for '{lang}'")
+            continue
+        start = time.perf_counter()
+        try:
+            audio = engine.join([engine.synthesize(chunk, lang) for chunk in split_sentences(text)])
+            print(f"{name:>7}: {(time.perf_counter() - start) * 1000:8.1f} ms, {len(audio)} bytes {engine.audio_format}")
+        except Exception as e:
+            print(f"{name:>7}: failed ({e})")
@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+import time
+
+# Folder for everything the apps generate at runtime (indexes, logs, databases)
+RUNTIME_DIR = os.getenv(
+    "CROP_ADVISOR_RUNTIME_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".runtime")
+)
+TELEMETRY_LOG = os.getenv("CROP_ADVISOR_TELEMETRY_LOG", os.path.join(RUNTIME_DIR, "telemetry.jsonl"))
+
+_lock = threading.Lock()
+
+
+def record(event, **fields):
+    """Append one telemetry record to the local JSON-lines log"""
+    entry = {"ts": round(time.time(), 3), "event": event}
+    entry.update(fields)
+    try:
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with _lock:
+            os.makedirs(os.path.dirname(TELEMETRY_LOG), exist_ok=True)
+            with open(TELEMETRY_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        # Telemetry must never break the app
+        pass
+
+
+class timed:
+    """Context manager that records how long a stage took"""
+
+    def __init__(self, stage, **fields):
+        self.stage = stage
+        self.fields = fields
+        self.duration_ms = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        record("stage", stage=self.stage, duration_ms=round(self.duration_ms, 2),
+               error=exc_type is not None, **self.fields)
+        return False
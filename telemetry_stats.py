@@ -0,0 +1,342 @@
+import io
+import json
+import math
+import os
+import pickle
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import telemetry
+
+# Latency histogram buckets grow by 5%, so percentiles read from them are within 2.5% of the exact value
+BUCKET_GROWTH = 1.05
+# New log bytes parsed per pass; bounds memory however far behind the aggregates are
+READ_CHUNK_BYTES = 32 * 1024 * 1024
+STATE_PATH = os.path.join(telemetry.RUNTIME_DIR, "telemetry_stats.pkl")
+STATE_VERSION = 1
+COLUMNS = ("ts", "event", "stage", "duration_ms", "error", "language", "model", "engine", "layer", "outcome",
+           "input_tokens", "output_tokens", "extra_input_tokens", "continuation_output_tokens", "count")
+AGGREGATES = ("latency", "stage_errors", "cache", "tokens", "continuation_tokens", "events", "hourly")
+
+
+def _merge(total, new):
+    """Add counts from one chunk to the running totals, aligning on the index"""
+    if new is None or len(new) == 0:
+        return total
+    if total is None:
+        return new
+    return total.add(new, fill_value=0)
+
+
+def _bucket(duration_ms):
+    return np.floor(np.log(np.maximum(duration_ms.astype(float), 1e-3)) / math.log(BUCKET_GROWTH)).astype(int)
+
+
+def _bucket_value(bucket):
+    """Geometric middle of a histogram bucket, in ms"""
+    return BUCKET_GROWTH ** (bucket + 0.5)
+
+
+def _parse(chunk):
+    """Records of a block of complete lines; a damaged line is skipped rather than failing the block"""
+    try:
+        frame = pd.read_json(io.BytesIO(chunk), lines=True, dtype=False, convert_dates=False)
+    except ValueError:
+        rows = []
+        for line in chunk.splitlines():
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue
+        frame = pd.DataFrame(rows)
+    for column in COLUMNS:
+        if column not in frame:
+            frame[column] = None
+    return frame
+
+
+class TelemetryStats:
+    """Running aggregates of the telemetry log, kept up to date by reading only what was appended.
+
+    Latencies are kept as log-bucketed histogram counts per stage, language
+    and model, so percentiles for any grouping come from a few thousand
+    counters instead of every duration. The aggregates and the byte offset
+    they cover are saved to STATE_PATH, so a restart resumes where it
+    stopped; a log that shrank or was replaced is read again from the start.
+    """
+
+    def __init__(self, log_path=telemetry.TELEMETRY_LOG, state_path=STATE_PATH):
+        self.log_path = log_path
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._reset()
+        self._load_state()
+
+    def _reset(self):
+        self.offset = 0
+        self.file_id = None
+        self.records = 0
+        self.updated_at = None
+        self.last_refresh_ms = None
+        for name in AGGREGATES:
+            setattr(self, name, None)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if state.get("version") == STATE_VERSION and state.get("log_path") == self.log_path:
+            for name in ("offset", "file_id", "records", "updated_at") + AGGREGATES:
+                setattr(self, name, state[name])
+
+    def _save_state(self):
+        state = {name: getattr(self, name) for name in ("offset", "file_id", "records", "updated_at") + AGGREGATES}
+        state.update(version=STATE_VERSION, log_path=self.log_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.state_path)
+
+    def refresh(self):
+        """Fold records appended since the last call into the aggregates; returns how many were read"""
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                info = os.stat(self.log_path)
+            except FileNotFoundError:
+                return 0
+            file_id = (info.st_dev, info.st_ino)
+            if file_id != self.file_id or info.st_size < self.offset:
+                # Rotated or truncated: the counts no longer describe this file
+                self._reset()
+                self.file_id = file_id
+            read = 0
+            with open(self.log_path, "rb") as f:
+                f.seek(self.offset)
+                while True:
+                    block = f.read(READ_CHUNK_BYTES)
+                    end = block.rfind(b"\n") + 1
+                    if not end:
+                        # Nothing new, or a line still being written
+                        break
+                    frame = _parse(block[:end])
+                    self._fold(frame)
+                    self.offset += end
+                    read += len(frame)
+                    f.seek(self.offset)
+            if read:
+                self.records += read
+                self.updated_at = time.time()
+                self._save_state()
+            self.last_refresh_ms = (time.perf_counter() - start) * 1000
+            return read
+
+    def _fold(self, frame):
+        is_stage = frame["event"] == "stage"
+        # Cache lookups are logged in batches, with the number of lookups each record stands for
+        weight = pd.to_numeric(frame["count"], errors="coerce").fillna(1)
+        stages = frame[is_stage & frame["duration_ms"].notna()]
+        if len(stages):
+            # TTS stages name an engine instead of a model
+            keys = pd.DataFrame({
+                "stage": stages["stage"].fillna("-"),
+                "language": stages["language"].fillna("-"),
+                "model": stages["model"].fillna(stages["engine"]).fillna("-"),
+                "bucket": _bucket(stages["duration_ms"]),
+            })
+            self.latency = _merge(self.latency, keys.groupby(list(keys.columns)).size())
+            errors = stages["error"].fillna(False).astype(bool)
+            self.stage_errors = _merge(self.stage_errors, errors.groupby(keys["stage"]).agg(["size", "sum"]))
+
+        cache = frame[frame["event"] == "cache"]
+        if len(cache):
+            self.cache = _merge(self.cache, weight[cache.index].groupby([cache["layer"].fillna("-"),
+                                                                         cache["outcome"].fillna("-")]).sum())
+
+        calls = stages[(stages["stage"] == "llm_call") & ~stages["error"].fillna(False).astype(bool)]
+        if len(calls):
+            tokens = pd.DataFrame({
+                "calls": 1,
+                "input_tokens": pd.to_numeric(calls["input_tokens"], errors="coerce").fillna(0),
+                "output_tokens": pd.to_numeric(calls["output_tokens"], errors="coerce").fillna(0),
+            })
+            self.tokens = _merge(self.tokens, tokens.groupby([calls["language"].fillna("-"), calls["model"].fillna("-")]).sum())
+
+        truncations = frame[frame["event"] == "truncation"]
+        if len(truncations):
+            extra = (pd.to_numeric(truncations["extra_input_tokens"], errors="coerce").fillna(0)
+                     + pd.to_numeric(truncations["continuation_output_tokens"], errors="coerce").fillna(0))
+            self.continuation_tokens = _merge(self.continuation_tokens,
+                                              extra.groupby(truncations["language"].fillna("-")).sum())
+
+        others = frame[~is_stage]
+        if len(others):
+            self.events = _merge(self.events, weight[others.index].groupby([others["event"],
+                                                                            others["language"].fillna("-")]).sum())
+
+        kind = frame["stage"].where(is_stage, frame["event"]).fillna("-")
+        hour = (pd.to_numeric(frame["ts"], errors="coerce") // 3600 * 3600)
+        self.hourly = _merge(self.hourly, weight.groupby([hour.rename("hour"), kind.rename("kind")]).sum())
+
+    def latency_percentiles(self, by=("stage",), quantiles=(0.5, 0.95)):
+        """Call count and latency percentiles in ms for each group of the given stage/language/model columns"""
+        if self.latency is None:
+            return pd.DataFrame(columns=list(by) + ["calls"] + [f"p{int(q * 100)}_ms" for q in quantiles])
+        histogram = self.latency.groupby(level=list(by) + ["bucket"]).sum().sort_index()
+        rows = []
+        for group, counts in histogram.groupby(level=list(by)):
+            cumulative = counts.to_numpy().cumsum()
+            buckets = counts.index.get_level_values("bucket").to_numpy()
+            row = dict(zip(by, group if isinstance(group, tuple) else (group,)), calls=int(cumulative[-1]))
+            for q in quantiles:
+                position = min(np.searchsorted(cumulative, q * cumulative[-1]), len(buckets) - 1)
+                row[f"p{int(q * 100)}_ms"] = round(_bucket_value(buckets[position]), 2)
+            rows.append(row)
+        return pd.DataFrame(rows).sort_values("calls", ascending=False, ignore_index=True)
+
+    def cache_hit_rates(self):
+        """Lookups and hit, stale and miss rates per cache layer"""
+        if self.cache is None:
+            return pd.DataFrame(columns=["layer", "lookups", "hit_rate", "stale_rate", "miss_rate"])
+        table = self.cache.unstack(fill_value=0)
+        lookups = table.sum(axis=1)
+        report = pd.DataFrame({"lookups": lookups.astype(int)})
+        for outcome in ("hit", "stale", "miss"):
+            report[f"{outcome}_rate"] = (table[outcome] / lookups).round(3) if outcome in table else 0.0
+        return report.reset_index(names="layer").sort_values("lookups", ascending=False, ignore_index=True)
+
+    def tokens_per_request(self):
+        """Model calls and average input, output and continuation tokens per request, by language and model"""
+        if self.tokens is None:
+            return pd.DataFrame(columns=["language", "model", "calls", "input_tokens", "output_tokens", "continuation_tokens"])
+        report = self.tokens.copy()
+        report.index.names = ["language", "model"]
+        report["input_tokens"] = (report["input_tokens"] / report["calls"]).round(0)
+        report["output_tokens"] = (report["output_tokens"] / report["calls"]).round(0)
+        # Continuations are only logged per language, so each model's requests share them by call count
+        extra = self.continuation_tokens if self.continuation_tokens is not None else pd.Series(dtype=float)
+        calls_per_language = report["calls"].groupby(level="language").transform("sum")
+        report["continuation_tokens"] = (report.index.get_level_values("language").map(extra).fillna(0).to_numpy()
+                                         / calls_per_language).round(1)
+        report["calls"] = report["calls"].astype(int)
+        return report.reset_index().sort_values("calls", ascending=False, ignore_index=True)
+
+    def error_rates(self):
+        """Share of each stage's records that ended in an error"""
+        if self.stage_errors is None:
+            return pd.DataFrame(columns=["stage", "records", "errors", "error_rate"])
+        report = self.stage_errors.rename(columns={"size": "records", "sum": "errors"}).astype(int)
+        report["error_rate"] = (report["errors"] / report["records"]).round(4)
+        return report.reset_index().sort_values("errors", ascending=False, ignore_index=True)
+
+    def fallback_rates(self):
+        """How often the no-JSON fallback card ("Consult Local Expert") and model timeouts hit, per language"""
+        columns = ["language", "model_calls", "fallbacks", "fallback_rate", "timeouts", "timeout_rate"]
+        if self.tokens is None and self.events is None:
+            return pd.DataFrame(columns=columns)
+        calls = self.tokens["calls"].groupby(level=0).sum() if self.tokens is not None else pd.Series(dtype=float)
+        events = self.events.unstack(level=0, fill_value=0) if self.events is not None else pd.DataFrame()
+        report = pd.DataFrame({"model_calls": calls})
+        for event, column in (("fallback", "fallbacks"), ("llm_timeout", "timeouts")):
+            report[column] = events[event] if event in events else 0
+        report = report.fillna(0).astype(int)
+        report["fallback_rate"] = (report["fallbacks"] / report["model_calls"].where(report["model_calls"] > 0)).round(4)
+        report["timeout_rate"] = (report["timeouts"] / (report["model_calls"] + report["timeouts"]).where(
+            report["model_calls"] + report["timeouts"] > 0)).round(4)
+        return report.reset_index(names="language")[columns]
+
+    def event_counts(self):
+        """Records of every non-stage event (fallbacks, TTS engine switches, cache errors, ...)"""
+        if self.events is None:
+            return pd.DataFrame(columns=["event", "records"])
+        counts = self.events.groupby(level=0).sum().astype(int)
+        return counts.rename_axis("event").reset_index(name="records").sort_values("records", ascending=False,
+                                                                                     ignore_index=True)
+
+    def hourly_load(self, kinds=None, hours=None):
+        """Records per hour (rows) and stage or event (columns), optionally only the `hours` up to the latest"""
+        if self.hourly is None:
+            return pd.DataFrame()
+        table = self.hourly.unstack(fill_value=0).astype(int)
+        if kinds is not None:
+            table = table[[kind for kind in kinds if kind in table]]
+        last = table.index.max()
+        first = last - (hours - 1) * 3600 if hours else table.index.min()
+        # Quiet hours have no records but still belong on the time axis
+        table = table.reindex(np.arange(first, last + 1, 3600), fill_value=0)
+        table.index = pd.to_datetime(table.index, unit="s")
+        return table
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    """Process-wide aggregates of the telemetry log, created on first use"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = TelemetryStats()
+    return _stats
+
+
+if __name__ == "__main__":
+    # Incremental refresh vs re-reading the whole log: python telemetry_stats.py [records]
+    import tempfile
+
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(7)
+    folder = tempfile.mkdtemp(prefix="telemetry-stats-")
+    log_path = os.path.join(folder, "telemetry.jsonl")
+
+    def write_records(count, start_ts):
+        events = rng.choice(["llm_call", "tts_chunk", "retrieval", "cache", "fallback"], count, p=[0.2, 0.3, 0.2, 0.28, 0.02])
+        durations = rng.lognormal(7.5, 0.6, count)
+        with open(log_path, "a", encoding="utf-8") as f:
+            for i, (kind, duration) in enumerate(zip(events, durations)):
+                entry = {"ts": start_ts + i * 0.5, "language": ["en", "hi", "or"][i % 3]}
+                if kind == "cache":
+                    entry.update(event="cache", layer="sqlite", outcome="hit" if i % 4 else "miss")
+                elif kind == "fallback":
+                    entry.update(event="fallback", reason="no_json")
+                else:
+                    entry.update(event="stage", stage=kind, duration_ms=round(float(duration), 2), error=i % 97 == 0)
+                    if kind == "llm_call":
+                        entry.update(model="gemini-1.5-flash", input_tokens=500, output_tokens=800)
+                f.write(json.dumps(entry) + "\n")
+        return durations[events == "llm_call"]
+
+    llm_durations = write_records(records, 1.7e9)
+    stats = TelemetryStats(log_path, os.path.join(folder, "state.pkl"))
+    start = time.perf_counter()
+    stats.refresh()
+    first_pass = time.perf_counter() - start
+    extra = max(records // 100, 1)
+    llm_durations = np.concatenate([llm_durations, write_records(extra, 1.7e9 + records)])
+    start = time.perf_counter()
+    stats.refresh()
+    incremental = time.perf_counter() - start
+    start = time.perf_counter()
+    TelemetryStats(log_path, os.path.join(folder, "state.pkl")).refresh()
+    restart = time.perf_counter() - start
+    start = time.perf_counter()
+    frame = pd.read_json(log_path, lines=True, dtype=False, convert_dates=False)
+    exact = frame[frame["stage"] == "llm_call"].groupby("language")["duration_ms"].quantile([0.5, 0.95])
+    full_reread = time.perf_counter() - start
+
+    print(f"{os.path.getsize(log_path) / 1e6:.0f} MB log, {records + extra:,} records")
+    print(f"first pass {first_pass:.2f} s; +{extra:,} records: incremental {incremental * 1000:.0f} ms, "
+          f"after restart {restart * 1000:.0f} ms, full re-read and exact percentiles {full_reread:.2f} s")
+    histogram = stats.latency_percentiles(("stage", "language")).set_index(["stage", "language"])
+    for language in ("en", "hi", "or"):
+        row = histogram.loc[("llm_call", language)]
+        print(f"llm_call {language}: p50 {row['p50_ms']:.0f} ms (exact {exact[language][0.5]:.0f}), "
+              f"p95 {row['p95_ms']:.0f} ms (exact {exact[language][0.95]:.0f})")
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Modules read their paths from the environment at import time, so point them at a scratch folder first
+os.environ.setdefault("CROP_ADVISOR_RUNTIME_DIR", tempfile.mkdtemp(prefix="crop-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
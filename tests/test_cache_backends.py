@@ -0,0 +1,29 @@
+import cache_backends
+
+
+def _accessed_at(backend, key):
+    return backend._conn().execute("SELECT accessed_at FROM cache WHERE key = ?",
+                                   (cache_backends.versioned_key("test", key),)).fetchone()[0]
+
+
+def test_sqlite_hits_touch_entries_at_most_once_per_interval(tmp_path, monkeypatch):
+    backend = cache_backends.SQLiteBackend(str(tmp_path / "cache.db"))
+    now = [1000.0]
+    monkeypatch.setattr(cache_backends.time, "time", lambda: now[0])
+    backend.set("test", "key", b"value")
+    now[0] += 30
+    assert backend.get("test", "key") == b"value"
+    assert _accessed_at(backend, "key") == 1000.0
+    now[0] += backend.TOUCH_INTERVAL
+    assert backend.get("test", "key") == b"value"
+    assert _accessed_at(backend, "key") == now[0]
+
+
+def test_sqlite_drops_expired_entries(tmp_path, monkeypatch):
+    backend = cache_backends.SQLiteBackend(str(tmp_path / "cache.db"))
+    now = [1000.0]
+    monkeypatch.setattr(cache_backends.time, "time", lambda: now[0])
+    backend.set("test", "key", b"value", ttl=10)
+    now[0] += 11
+    assert backend.get("test", "key") is None
+    assert backend.stats["misses"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+import cache_backends
+import cassettes
+import crop_core
+import prompts
+
+INPUTS = dict(month="November", location="Ludhiana, Punjab", budget=50000, experience="New Farmer",
+              farm_size="Small (Less than 5 acres)", organic=False)
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """Cassette file holding one stub answer for the INPUTS prompt"""
+    path = str(tmp_path / "test.cassette")
+    recorder = cassettes.RecordingModel(crop_core.StubModel(0), cassettes.Cassette(path))
+    prompt = crop_core.build_prompt("en", **INPUTS)
+    asyncio.run(recorder.generate_content_async(prompt))
+    recorder.cassette.flush()
+    return path, prompt, recorder.model.response.text
+
+
+def test_answers_replay_as_recorded(recorded):
+    path, prompt, text = recorded
+    replay = cassettes.ReplayModel(cassettes.Cassette(path), latency_scale=0)
+    response = asyncio.run(replay.generate_content_async(prompt))
+    assert response.text == text
+    assert response.cassette_substitute is False
+    assert response.candidates[0].finish_reason.name == "STOP"
+    assert replay.cassette.stats == {"recorded": 0, "replayed": 1, "misses": 0}
+
+
+def test_records_from_several_flushes_read_back(tmp_path):
+    path = str(tmp_path / "test.cassette")
+    cassette = cassettes.Cassette(path)
+    cassette.record_answer("first prompt", "first answer", 10, "stub")
+    cassette.flush()
+    cassette.record_answer("first prompt", "second answer", 10, "stub")
+    cassette.record_audio(type("Engine", (), {"name": "gtts", "audio_format": "audio/mp3"}), "hello", "en", b"ID3", 5)
+    cassette.flush()
+    replayed = cassettes.Cassette(path)
+    # Repeats of a prompt cycle through its recorded answers
+    assert [replayed.answer("first prompt")[1] for _ in range(3)] == ["first answer", "second answer", "first answer"]
+    assert replayed.audio_for("hello", "en", "audio/mp3")[1] == b"ID3"
+    assert replayed.summary()["prompts"] == 1
+
+
+def test_unrecorded_prompt_raises_when_strict(recorded):
+    path, prompt, _ = recorded
+    with pytest.raises(cassettes.CassetteMiss):
+        cassettes.Cassette(path).answer(prompt + " and more", strict=True)
+
+
+def test_unrecorded_prompt_gets_a_marked_stand_in(recorded):
+    path, prompt, text = recorded
+    header, answer = cassettes.Cassette(path).answer(prompt + " and more", strict=False)
+    assert answer == text
+    assert header["substitute"] is True
+
+
+def test_substitute_answers_are_not_cached(recorded, monkeypatch):
+    path, prompt, _ = recorded
+    monkeypatch.setattr(cassettes, "STRICT", False)
+    replay = cassettes.ReplayModel(cassettes.Cassette(path), latency_scale=0)
+    inputs = dict(INPUTS, budget=60000)
+    result = asyncio.run(crop_core.generate_recommendations_async(replay, "en", **inputs))
+    assert result["incomplete"] == "substitute"
+    assert not crop_core.is_complete(result)
+    cache_key = f"cassette|{prompts.version('en')}|{crop_core.build_prompt('en', **inputs)}"
+    assert cache_backends.get_cache().get_json("recommendation", cache_key) is None
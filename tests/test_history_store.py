@@ -0,0 +1,68 @@
+import hashlib
+
+import pytest
+
+import history_store
+
+INPUTS = dict(month="November", budget=50000, experience="New Farmer", farm_size="Small (Less than 5 acres)",
+              organic=False)
+
+
+def _result(crop):
+    return {"recommendations": [{"crop_name": crop}], "general_advice": "", "seasonal_notes": ""}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return history_store.HistoryStore(str(tmp_path / "history.db"))
+
+
+def test_farmer_ids_are_hashed_with_the_server_key():
+    hashed = history_store.hash_farmer_id(" 9876543210 ")
+    assert hashed == history_store.hash_farmer_id("9876543210")
+    assert hashed != hashlib.sha256(b"9876543210").hexdigest()[:24]
+    assert history_store.hash_farmer_id("  ") is None
+
+
+def test_key_file_is_created_once(tmp_path):
+    path = str(tmp_path / "keys" / "farmer_id.key")
+    key = history_store._load_key(path)
+    assert len(key) == 64
+    assert history_store._load_key(path) == key
+
+
+def test_recent_for_farmer_stays_in_one_language(store):
+    store.append(_result("Wheat"), "en", "Ludhiana, Punjab", farmer_id="9876543210", **INPUTS)
+    store.append(_result("गेहूं"), "hi", "Ludhiana, Punjab", farmer_id="9876543210", **INPUTS)
+    store.append(_result("Mustard"), "en", "Ludhiana, Punjab", farmer_id="9000000000", **INPUTS)
+    store.flush()
+    rows = store.recent_for_farmer("9876543210", "en")
+    assert [row["result"]["recommendations"][0]["crop_name"] for row in rows] == ["Wheat"]
+    assert [row["language"] for row in store.recent("hi", "Ludhiana, Punjab", "9876543210")] == ["hi"]
+
+
+def test_recent_without_a_farmer_id_uses_the_district(store):
+    store.append(_result("Wheat"), "en", "Ludhiana, Punjab", farmer_id="9876543210", **INPUTS)
+    store.append(_result("Rice"), "en", "Cuttack, Odisha", **INPUTS)
+    store.flush()
+    assert [row["district"] for row in store.recent("en", "ludhiana")] == ["ludhiana"]
+    assert store.recent("en", "") == []
+
+
+def test_latest_for_request_returns_the_newest_answer(store):
+    store.append(_result("Wheat"), "en", "Ludhiana, Punjab", **INPUTS)
+    store.append(_result("Mustard"), "en", "Ludhiana, Punjab", **INPUTS)
+    store.flush()
+    key = history_store.request_key("en", "Ludhiana, Punjab", **INPUTS)
+    assert store.latest_for_request(key)["result"] == _result("Mustard")
+    assert store.latest_for_request(history_store.request_key("hi", "Ludhiana, Punjab", **INPUTS)) is None
+
+
+def test_nearest_similar_prefers_the_closest_budget(store):
+    for budget in (45000, 58000, 52000):
+        store.append(_result(f"Budget {budget}"), "en", "Ludhiana, Punjab", **dict(INPUTS, budget=budget))
+    store.flush()
+    profile = history_store.profile_key(INPUTS["experience"], INPUTS["farm_size"], INPUTS["organic"])
+    row = store.nearest_similar("en", "Ludhiana, Punjab", "November", profile, 40000, 60000, 50000)
+    assert row["budget"] == 52000
+    assert store.nearest_similar("en", "Ludhiana, Punjab", "November", profile, 59000, 60000, 60000) is None
@@ -0,0 +1,40 @@
+import pytest
+
+import knowledge_base
+
+
+@pytest.mark.parametrize("location, state", [
+    ("Ludhiana, Punjab", "punjab"),
+    ("Bengaluru, Karnataka", "karnataka"),
+    ("Goalpara, Assam", "assam"),
+    ("Bardhaman, West Bengal", "west bengal"),
+    ("Cuttack, Odisha", "odisha"),
+    ("Panaji, Goa", "goa"),
+    ("Lucknow, U.P.", "uttar pradesh"),
+    ("कटक, ओडिशा", "odisha"),
+    ("ଲୁଧିଆନା, ପଞ୍ଜାବ", "punjab"),
+    ("पटना बिहार", "bihar"),
+    # A district named after a state still goes by the state written last
+    ("Punjab Road, Nashik, Maharashtra", "maharashtra"),
+])
+def test_detect_state(location, state):
+    assert knowledge_base.detect_state(location) == state
+
+
+@pytest.mark.parametrize("location", ["Bengaluru", "Goalpara", "Bengaluru Rural", "", None, "Somewhere"])
+def test_detect_state_needs_a_whole_word(location):
+    assert knowledge_base.detect_state(location) is None
+
+
+def test_month_number_in_every_language():
+    assert knowledge_base.month_number("November") == 11
+    assert knowledge_base.month_number("नवंबर") == 11
+    assert knowledge_base.month_number("ନଭେମ୍ବର") == 11
+    assert knowledge_base.month_number("Brumaire") is None
+
+
+def test_retrieve_prefers_the_detected_state():
+    passages = knowledge_base.retrieve("Bengaluru, Karnataka", "November")
+    assert passages
+    states = {state.lower() for passage in passages for state in passage["states"]}
+    assert not states & {"west bengal", "bihar", "odisha"}
@@ -0,0 +1,60 @@
+import pytest
+
+import roi_simulation
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("₹20,000-30,000 per acre", (20000, 30000)),
+    ("₹20,000 - ₹30,000 per acre", (20000, 30000)),
+    ("₹2,000 to 2,600 per quintal", (2000, 2600)),
+    ("₹1.5 lakh", (150000, 150000)),
+    ("₹1.5-2 lakh", (150000, 200000)),
+    ("₹25k-30k per acre", (25000, 30000)),
+    ("₹20-25 thousand per acre", (20000, 25000)),
+    ("20 से 25 हजार रुपये प्रति एकड़", (20000, 25000)),
+    ("₹1,50,000 (about 1.5 lakh)", (150000, 150000)),
+    # Odia digits are digits too
+    ("୨୫ ହଜାର", (25000, 25000)),
+    # The acres are not an end of the range
+    ("₹40,000 for 2 acres", (40000, 40000)),
+    ("2 एकड़ के लिए ₹40,000", (40000, 40000)),
+    # A second amount that is not joined to the first is another figure, not the top of a range
+    ("₹30,000 per acre, ₹90,000 for the farm", (30000, 30000)),
+    ("Returns in 4 months", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_range(text, expected):
+    assert roi_simulation.parse_range(text) == expected
+
+
+def _wheat(investment):
+    return {"crop_name": "Wheat", "investment_required": investment, "market_price_range": "₹2,000-2,400 per quintal"}
+
+
+@pytest.mark.parametrize("investment, cost", [
+    ("₹25,000-30,000 per acre", [25000, 30000]),
+    ("₹25,000/acre", [25000, 25000]),
+    ("₹50,000 for 2 acres", [25000, 25000]),
+    # Outside the table's 22,000-32,000 for wheat: the table is used
+    ("₹40,000 for 2 acres", [22000, 32000]),
+    ("₹2 lakh per acre", [22000, 32000]),
+    # No area given, so the amount may be for the whole farm
+    ("₹25,000", [22000, 32000]),
+])
+def test_crop_inputs_cost_per_acre(investment, cost):
+    inputs = roi_simulation.crop_inputs(_wheat(investment), "Nowhere", "November", 50000)
+    assert inputs["cost"] == cost
+
+
+def test_crop_inputs_needs_a_price_unit():
+    card = dict(_wheat("₹25,000 per acre"), market_price_range="₹2,000-2,400")
+    assert roi_simulation.crop_inputs(card, "Nowhere", "November", 50000) is None
+
+
+def test_simulate_inputs_is_seeded():
+    inputs = roi_simulation.crop_inputs(_wheat("₹25,000 per acre"), "Nowhere", "November", 50000)
+    first = roi_simulation.simulate_inputs(inputs, trials=2000, seed=7)
+    assert first == roi_simulation.simulate_inputs(inputs, trials=2000, seed=7)
+    assert first["price_source"] == "model"
+    assert first["acres"] == 2.0
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+import scheduler
+
+CLASSES = {
+    scheduler.INTERACTIVE: {"weight": 16, "cap": 1, "max_queued": 100},
+    scheduler.REFRESH: {"weight": 4, "cap": 1, "max_queued": 100},
+    scheduler.BATCH: {"weight": 1, "cap": 1, "max_queued": 3},
+}
+
+
+@pytest.fixture
+def blocked():
+    """One-worker scheduler whose worker is held by a running item until the test releases it"""
+    pool = scheduler.Scheduler(workers=1, classes=CLASSES)
+    gate, started = threading.Event(), threading.Event()
+    pool.submit(scheduler.INTERACTIVE, lambda: started.set() or gate.wait(5))
+    assert started.wait(5)
+    yield pool, gate
+    gate.set()
+
+
+def test_classes_share_dispatches_by_weight(blocked):
+    pool, gate = blocked
+    order = []
+    counts = {scheduler.INTERACTIVE: 20, scheduler.REFRESH: 8, scheduler.BATCH: 3}
+    futures = [pool.submit(work_class, order.append, work_class) for work_class, count in counts.items()
+               for _ in range(count)]
+    gate.set()
+    for future in futures:
+        future.result(timeout=5)
+    # Every class gets a turn within the first round, in proportion to its weight
+    assert Counter(order[:20]) == {scheduler.INTERACTIVE: 15, scheduler.REFRESH: 4, scheduler.BATCH: 1}
+    assert order[-1] == scheduler.BATCH
+
+
+def test_full_class_rejects_arrivals(blocked):
+    pool, gate = blocked
+    queued = [pool.submit(scheduler.BATCH, lambda: "done") for _ in range(3)]
+    rejected = pool.submit(scheduler.BATCH, lambda: "done")
+    with pytest.raises(scheduler.QueueFull):
+        rejected.result(timeout=5)
+    # Other classes still get in
+    interactive = pool.submit(scheduler.INTERACTIVE, lambda: "done")
+    gate.set()
+    assert [f.result(timeout=5) for f in queued + [interactive]] == ["done"] * 4
+    assert pool.metrics()[scheduler.BATCH]["rejected"] == 1
+
+
+def test_full_queue_sheds_newest_lower_class_work(blocked, monkeypatch):
+    pool, gate = blocked
+    monkeypatch.setattr(scheduler, "MAX_QUEUED", 3)
+    refresh = pool.submit(scheduler.REFRESH, lambda: "refresh")
+    batch = [pool.submit(scheduler.BATCH, lambda: "batch") for _ in range(2)]
+    interactive = pool.submit(scheduler.INTERACTIVE, lambda: "interactive")
+    assert batch[1].cancelled() and not batch[0].cancelled()
+    gate.set()
+    assert interactive.result(timeout=5) == "interactive"
+    assert refresh.result(timeout=5) == "refresh"
+    assert batch[0].result(timeout=5) == "batch"
+    assert pool.metrics()[scheduler.BATCH]["preempted"] == 1
+
+
+def test_run_async_frees_its_slot(blocked):
+    pool, gate = blocked
+    gate.set()
+
+    async def answer():
+        return 42
+
+    assert asyncio.run(pool.run_async(scheduler.REFRESH, answer())) == 42
+    metrics = pool.metrics()[scheduler.REFRESH]
+    assert metrics["running"] == 0 and metrics["completed"] == 1
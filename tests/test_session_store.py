@@ -0,0 +1,49 @@
+import session_store
+
+
+def _result(crop):
+    return {"recommendations": [{"crop_name": crop}], "general_advice": "Sow on time", "seasonal_notes": ""}
+
+
+def test_identical_results_are_stored_once():
+    store = session_store.ResultStore()
+    first = store.put("a", _result("Wheat"))
+    assert store.put("b", _result("Wheat")) == first
+    report = store.memory_report()
+    assert report["sessions"] == 2 and report["unique_results"] == 1
+    assert store.get(first, "a") is store.get(first, "b")
+
+
+def test_result_lives_until_its_last_session_lets_go():
+    store = session_store.ResultStore()
+    key = store.put("a", _result("Wheat"))
+    store.put("b", _result("Wheat"))
+    store.drop("a")
+    assert store.get(key, "b") == _result("Wheat")
+    store.put("b", _result("Rice"))
+    assert store.memory_report()["unique_results"] == 1
+    assert store.get(key, "c") is None
+
+
+def test_storing_the_same_result_again_keeps_it():
+    store = session_store.ResultStore()
+    key = store.put("a", _result("Wheat"))
+    assert store.put("a", _result("Wheat")) == key
+    assert store.get(key, "a") == _result("Wheat")
+    store.drop("a")
+    assert store.memory_report()["unique_results"] == 0
+
+
+def test_evicted_session_rejoins_a_result_another_session_holds():
+    store = session_store.ResultStore(idle_timeout=60)
+    key = store.put("a", _result("Wheat"))
+    store.put("b", _result("Wheat"))
+    store._sessions["a"].last_seen -= 61
+    assert store.evict_idle() == 1
+    # "a" was evicted, but "b" still holds the result, so "a" takes a new reference
+    assert store.get(key, "a") == _result("Wheat")
+    store.drop("b")
+    assert store.get(key, "a") == _result("Wheat")
+    store.drop("a")
+    assert store.memory_report() == {"sessions": 0, "unique_results": 0, "stored_bytes": 0,
+                                     "referenced_bytes": 0, "per_session": {}}
@@ -0,0 +1,51 @@
+import pytest
+
+import similar_requests
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Fits your ₹50000 budget", "Fits your ₹60000 budget"),
+    ("Fits your ₹50,000 budget", "Fits your ₹60,000 budget"),
+    ("Fits your ₹ 50,000 budget", "Fits your ₹60,000 budget"),
+    # A longer amount that merely starts with the budget is left alone
+    ("Needs ₹50,0000 upfront", "Needs ₹50,0000 upfront"),
+    ("Needs ₹500,000 upfront", "Needs ₹500,000 upfront"),
+])
+def test_adjust_result_rewrites_budget_mentions(text, expected):
+    assert similar_requests.adjust_result({"note": text}, 50000, 60000) == {"note": expected}
+
+
+def test_adjust_result_keeps_indian_grouping():
+    result = similar_requests.adjust_result(["Budget ₹1,00,000 covers seed"], 100000, 120000)
+    assert result == ["Budget ₹1,20,000 covers seed"]
+
+
+def test_adjust_result_rewrites_district_in_nested_fields():
+    result = {"recommendations": [{"seasonal_notes": "Sow early in ludhiana", "budget": 50000}]}
+    adjusted = similar_requests.adjust_result(result, 50000, 50000, "Ludhiana", "Moga")
+    assert adjusted == {"recommendations": [{"seasonal_notes": "Sow early in Moga", "budget": 50000}]}
+    assert result["recommendations"][0]["seasonal_notes"] == "Sow early in ludhiana"
+
+
+def test_adjust_result_takes_district_literally():
+    adjusted = similar_requests.adjust_result("Mandis near Ludhiana", 1, 1, "Ludhiana", r"Moga\1 \g<0>")
+    assert adjusted == r"Mandis near Moga\1 \g<0>"
+
+
+def test_adjust_result_matches_district_as_a_word():
+    assert similar_requests.adjust_result("Mogari and Moga", 1, 1, "Moga", "Patiala") == "Mogari and Patiala"
+
+
+def test_budget_window_stays_inside_the_band():
+    assert similar_requests.budget_window(50000) == (50000, 60000)
+    assert similar_requests.budget_window(40000) == (32000, 48000)
+
+
+@pytest.mark.parametrize("amount, indian, text", [
+    (50000, True, "50,000"),
+    (1500000, False, "1,500,000"),
+    (1500000, True, "15,00,000"),
+    (123456789, True, "12,34,56,789"),
+])
+def test_format_rupees(amount, indian, text):
+    assert similar_requests.format_rupees(amount, indian) == text